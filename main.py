@@ -2,82 +2,199 @@
 # Author: Julien Devol
 
 import pygame
-import math
+import os
 from src.camera import Camera
+from src.background import GradientBackground
 from src.game import Board
+from src.rules import Move
+from src.worker import EngineWorker
+from src.frametimes import FrameHistogram
+from src.counters import COUNTERS
+from src.hud import Hud
+from src.profiling import captureFromEnvironment, keyCapture
+from src.pacing import FramePacer
+from src.database import PositionDatabase
+from src.archive import GameWriter, readGames
 
 def main():
 	SCREEN_WIDTH = 1280
 	SCREEN_HEIGHT = 720
+	COMPUTER_TIME_LIMIT = 1.0 # Seconds the computer opponent may think per move
+	COMPUTER_WORKERS = 1 # Processes the computer opponent searches with, more than one uses a process pool
+	TABLEBASE_DIRECTORY = "tablebases" # Endgame tables made by 'py -m src.tablebase', used if they exist
+	BOOK_PATH = "book.bin" # Opening book made by 'py -m src.book build', used if it exists
+	SEEK_STEP = 10 # Turns jumped by Page Up/Page Down
+	DATABASE_PATH = "games.db" # Games with moves are stored here when the window closes, 'py -m src.database ingest' adds self-play records
+	ARCHIVE_PATH = "saved.lag" # F5 adds the game to this archive, F6 loads the last game saved in it
 
 	pygame.init()
 	screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-	clock = pygame.time.Clock()
+	pacer = FramePacer() # Full frame rate only while something moves, LOS_ALAMOS_PACING=fixed for always
 	running: bool = True
-	delta: float = 0
 	time_elapsed: float = 0
+	drawn_rects = [] # Screen rects drawn over the background last frame
+	active: bool = True # Whether the next frame is due at the full frame rate
 
 	pygame.display.set_caption("Los Alamos Chess")
 	camera = Camera(screen)
-	board = Board(screen, camera)
+	background = GradientBackground(SCREEN_WIDTH, SCREEN_HEIGHT)
+	# Move statistics come from the database if there is one; it's only created once a game with moves needs saving
+	database = PositionDatabase(DATABASE_PATH) if os.path.isfile(DATABASE_PATH) else None
+	board = Board(screen, camera, database = database)
+	# The computer opponent searches in a background process, the frame loop only polls it for its move
+	worker = EngineWorker(COMPUTER_WORKERS,
+						  tablebase_directory = TABLEBASE_DIRECTORY if os.path.isdir(TABLEBASE_DIRECTORY) else None,
+						  book_path = BOOK_PATH if os.path.isfile(BOOK_PATH) else None)
+	computer_color: str = 'b' # The computer plays Black, press C to toggle it on or off
+	frame_times = {False: FrameHistogram("frames while idle"), True: FrameHistogram("frames while the computer thinks")}
+	hud = Hud() # F3 shows frame time percentiles and counters, LOS_ALAMOS_HUD=1 from the start
+	capture = captureFromEnvironment() # F9 profiles the next frames, LOS_ALAMOS_PROFILE=cprofile:N or sample:N from the start
 
 	# Initialize the camera position to the center
 	camera.position_xy[0] = (SCREEN_WIDTH / 2) - (board.board_size / 2)
 	camera.position_xy[1] = (SCREEN_HEIGHT / 2) - (board.board_size / 2)
 	
 	while running:
-		screen.fill((0, 0, 0)) # Clear the last frame
-
+		# Wait for the next frame; when nothing moves that's input or the background's next step, whichever comes first
+		delta = pacer.wait(active)
 		time_elapsed += delta
-		
-		# Moving gradient background;
-		for y in range(SCREEN_HEIGHT):
-			wave_offset = math.sin(time_elapsed * 0.5 + y * 0.01) * 25
-
-			red_component = 40 + wave_offset * 0.6
-			green_component = 20 + wave_offset * 0.5
-			blue_component = 10
-			
-			red_component = max(0, min(255, red_component))
-			green_component = max(0, min(255, green_component))
-			blue_component = max(0, min(255, blue_component))
-			
-			color = (int(red_component), int(green_component), int(blue_component))
-			pygame.draw.line(screen, color, (0, y), (SCREEN_WIDTH, y))
-
-		for event in pygame.event.get():
-			match(event.type):
-				case pygame.QUIT:
-					running = False
-
-				case pygame.MOUSEBUTTONDOWN:
-					pos = pygame.mouse.get_pos()
-					clicked_square = board.getSquareAt(pos)
-					if clicked_square:
-						clicked_square.select(board)
+		if pacer.active:
+			frame_times[worker.thinking].add(delta * 1000) # Idle frames are slow on purpose, they'd only hide the real frame times
+			hud.frameDone(delta * 1000)
+		if capture is not None and capture.frameDone():
+			print(f"Profile written to {', '.join(capture.paths)}")
+			capture = None
+
+		# Moving gradient background. When it has moved it covers the whole screen and the whole display is updated;
+		# otherwise only what was drawn over it last frame is erased, and only the rects drawn over are sent to the display.
+		with hud.section("background"):
+			full_redraw = background.needsRedraw(time_elapsed)
+			if full_redraw:
+				background.draw(screen, time_elapsed)
+			else:
+				for rect in drawn_rects:
+					background.restore(screen, rect)
+
+		with hud.section("events"):
+			events = pacer.events()
+			for event in events:
+				match(event.type):
+					case pygame.QUIT:
+						running = False
+
+					# Mouse wheel to zoom in and out around the pointer
+					case pygame.MOUSEWHEEL:
+						camera.zoomAt(event.y, pygame.mouse.get_pos())
+
+					case pygame.MOUSEBUTTONDOWN if event.button not in (4, 5): # Buttons 4 and 5 are the wheel's notches, already zooming
+						pos = pygame.mouse.get_pos()
+						clicked_square = board.getSquareAt(pos)
+						if clicked_square and not worker.thinking: # The computer's pieces are its own while it thinks
+							clicked_square.select(board)
 						
-				case pygame.KEYDOWN:
-					# Left arrow to UNDO a move
-					if event.key == pygame.K_LEFT:
-						board.undoMove()
-						board.squares[0][0].__class__.unhighlight_all()
-						board.squares[0][0].__class__.current_selected = None
-					# Right arrow to REDO a move
-					elif event.key == pygame.K_RIGHT:
-						board.redoMove()
-						board.squares[0][0].__class__.unhighlight_all()
-						board.squares[0][0].__class__.current_selected = None
+					case pygame.KEYDOWN:
+						# Left arrow to UNDO a move, which also cancels the computer's search
+						if event.key == pygame.K_LEFT:
+							worker.cancel()
+							board.undoMove()
+							board.clearSelection()
+						# Right arrow to REDO a move
+						elif event.key == pygame.K_RIGHT:
+							worker.cancel()
+							board.redoMove()
+							board.clearSelection()
+						# Home/End to jump to the start/end of the line, Page Up/Page Down to jump SEEK_STEP turns at a time
+						elif event.key in (pygame.K_HOME, pygame.K_END, pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+							worker.cancel()
+							targets = {pygame.K_HOME: 0, pygame.K_END: board.game.lineLength(),
+									   pygame.K_PAGEUP: board.game.ply - SEEK_STEP, pygame.K_PAGEDOWN: board.game.ply + SEEK_STEP}
+							board.seek(targets[event.key])
+							board.clearSelection()
+						# C to toggle the computer opponent
+						elif event.key == pygame.K_c:
+							worker.cancel()
+							computer_color = None if computer_color else 'b'
+						# F3 to show or hide the performance overlay
+						elif event.key == pygame.K_F3:
+							hud.toggle()
+						# F5 to save the game at the end of the archive
+						elif event.key == pygame.K_F5:
+							with GameWriter(ARCHIVE_PATH, append = True) as writer:
+								writer.writeGame(board.game)
+							print(f"Game saved to {ARCHIVE_PATH}")
+						# F6 to load the last game saved, at its last move
+						elif event.key == pygame.K_F6 and os.path.isfile(ARCHIVE_PATH):
+							worker.cancel()
+							try:
+								last = None
+								for last in readGames(ARCHIVE_PATH):
+									pass
+								if last is not None:
+									board.setGame(last.toGame())
+							except ValueError as error: # A damaged archive or a stored move that doesn't fit the position
+								print(f"Can't load the last game of {ARCHIVE_PATH}: {error}")
+						# F9 to profile the next frames, the same way LOS_ALAMOS_PROFILE does
+						elif event.key == pygame.K_F9 and capture is None:
+							capture = keyCapture()
+							print(f"Profiling the next {capture.frames_left} frames with {capture.mode}")
 
 		keys = pygame.key.get_pressed()
 		dir_x = keys[pygame.K_d] - keys[pygame.K_a]
 		dir_y = keys[pygame.K_s] - keys[pygame.K_w]
 
-		delta = clock.tick(60) / 1000
-		camera.move(dir_x, dir_y, delta)
-		board.draw(camera)
+		camera.move(dir_x, dir_y, pacer.cameraDelta(delta))
+		camera.updateZoom(pacer.cameraDelta(delta))
+		with hud.section("board"):
+			rects = board.draw(camera)
+		rects += hud.draw(screen)
+
+		with hud.section("flip"):
+			if full_redraw:
+				pygame.display.flip()
+			else:
+				pygame.display.update(drawn_rects + rects)
+		drawn_rects = rects
+
+		# Let the computer start thinking once the frame showing the player's move is on screen.
+		# Only at the end of the move history, so stepping back through turns doesn't trigger it.
+		current_color = board.game.currentColor()
+		at_latest_move = board.game.isAtEnd()
+		if computer_color == current_color and at_latest_move and not board.game.game_over and not worker.thinking:
+			worker.search(board.position, time_limit = COMPUTER_TIME_LIMIT)
+		elif worker.pondering and board.game.game_over:
+			worker.cancel() # The player's move ended the game, there's nothing left to ponder
+
+		# Play the computer's move once it's found, then ponder on the reply it expects while the player thinks
+		outcome = worker.poll()
+		if outcome is not None:
+			result, reply = outcome
+			hud.searchDone(str(result)) # Shown with F3 rather than printed every move
+			COUNTERS.searches += 1 # The worker counts in its own process
+			COUNTERS.search_nodes += result.nodes
+			if result.best_move is not None:
+				board.makeMove(Move(*result.best_move))
+			if reply is not None and not board.game.game_over:
+				expected = board.position.copy()
+				expected.makeMove(*reply)
+				worker.ponder(expected)
 
-		pygame.display.flip()
+		# Keep the full frame rate while there's input, the camera moves or zooms, the computer's move is awaited or has just been played,
+		# or the overlay or a profile is measuring frames
+		active = bool(events or dir_x or dir_y or camera.isZooming() or worker.thinking or outcome is not None or hud.enabled or capture is not None)
 
+	worker.close()
+	if database is None and board.game.move_history:
+		database = PositionDatabase(DATABASE_PATH)
+	if database is not None:
+		if database.addGame(board.game):
+			print(f"Game saved to {DATABASE_PATH}, {database.gameCount()} games stored")
+		database.close()
+	if capture is not None:
+		capture.finish()
+		print(f"Profile written to {', '.join(capture.paths)}")
+	print(frame_times[False].report())
+	print(frame_times[True].report())
+	print(f"Ponder hits: {worker.ponder_hits}, misses: {worker.ponder_misses}")
 	pygame.quit()
 
 if __name__ == "__main__":
@@ -0,0 +1,228 @@
+# archive.py: Reads and writes game archives, a compact binary file of games that's read one game at a time, so archives of any size stream.
+# Usage: py -m src.archive convert RECORDS... --out games.lag   converts self-play records into an archive
+#        py -m src.archive replay ARCHIVE [--check]              replays every game through the rules as fast as it can, for regression benchmarks
+# Author: Julien Devol
+#
+# Format, little-endian: a file header of the magic "LAGF" and a u16 version, then every game back to back:
+#   u16 plies, i8 result (1 White won, 0 draw, -1 Black won, 2 unfinished), u8 flags
+#   19 bytes of Position.pack() setup, only if flags has SETUP; games without it start from the initial position
+#   u16 per ply, the packed moves of position.py, capture flag included
+# A typical 60 ply game takes 124 bytes.
+
+import argparse
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Iterator, Optional, Sequence
+from src.position import Position, SQUARE_COUNT, EMPTY, parseMove, unpackMove, moveName
+from src.rules import Game, Move
+from src.perft import START_FEN
+from src.selfplay import readRecords
+
+MAGIC: bytes = b"LAGF"
+VERSION: int = 1
+FILE_HEADER = struct.Struct("<4sH") # Magic, version
+GAME_HEADER = struct.Struct("<HbB") # Plies, result, flags
+SETUP_SIZE: int = SQUARE_COUNT // 2 + 1 # Position.pack()
+SETUP: int = 1 # Flag of games that start from a stored position
+READ_BUFFER: int = 1 << 20
+MAX_PLIES: int = 0xFFFF # The most a game's u16 ply count holds
+
+WHITE_WIN: int = 1
+DRAW: int = 0
+BLACK_WIN: int = -1
+UNFINISHED: int = 2
+RESULT_CODES = {"1-0": WHITE_WIN, "1/2-1/2": DRAW, "0-1": BLACK_WIN, None: UNFINISHED}
+RESULT_NAMES = {code: name for name, code in RESULT_CODES.items()}
+
+class ArchivedGame:
+	__slots__ = ("setup", "moves", "result")
+
+	# __init__(): Constructor, one game as stored: its packed starting position or None for the initial one, packed moves and result code
+	def __init__(self, setup: Optional[bytes], moves: Sequence[int], result: int) -> None:
+		self.setup: Optional[bytes] = setup
+		self.moves: Sequence[int] = moves
+		self.result: int = result
+
+	# startPosition(): A new position the game starts from
+	def startPosition(self) -> Position:
+		return Position.unpack(self.setup) if self.setup is not None else Position.initial()
+
+	# toGame(): Replays the game into a Game, ending at its last move. Raises ValueError on a move storedMove() turns down.
+	def toGame(self) -> Game:
+		game = Game(self.startPosition())
+		for packed in self.moves:
+			game.makeMove(storedMove(game, packed))
+		return game
+
+# storedMove(): Unpacks a stored move to be played next in game. Raises ValueError if it doesn't move a piece of the side to move
+# onto a square without one of its own, since Position.makeMove() trusts its moves and would quietly corrupt the position.
+# Whether the piece can actually go there is only checked by replay --check.
+def storedMove(game: Game, packed: int) -> Move:
+	from_sq, to_sq = unpackMove(packed)
+	if from_sq >= SQUARE_COUNT or to_sq >= SQUARE_COUNT:
+		raise ValueError(f"Bad move {packed:#06x} at ply {game.ply + 1}: off the board")
+	position = game.position
+	moving, captured = position.mailbox[from_sq], position.mailbox[to_sq]
+	if moving == EMPTY or moving >> 3 != position.side:
+		raise ValueError(f"Bad move {moveName((from_sq, to_sq))} at ply {game.ply + 1}: no piece of the side to move on its origin")
+	if captured != EMPTY and captured >> 3 == position.side:
+		raise ValueError(f"Bad move {moveName((from_sq, to_sq))} at ply {game.ply + 1}: it lands on a piece of the side to move")
+	return Move(from_sq, to_sq)
+
+class GameWriter:
+	# __init__(): Constructor, creates the archive, or adds to the end of it with append
+	def __init__(self, path: str, append: bool = False) -> None:
+		if append and os.path.isfile(path) and os.path.getsize(path) > 0:
+			with open(path, "rb") as existing:
+				checkHeader(existing, path)
+			self.file = open(path, "ab")
+		else:
+			self.file = open(path, "wb")
+			self.file.write(FILE_HEADER.pack(MAGIC, VERSION))
+		self.games: int = 0
+
+	# write(): Adds one game; setup is a packed starting position, None for the initial one.
+	# Raises ValueError for a game longer than MAX_PLIES, before anything of it is written.
+	def write(self, moves: Sequence[int], result: int = UNFINISHED, setup: Optional[bytes] = None) -> None:
+		if len(moves) > MAX_PLIES:
+			raise ValueError(f"Game of {len(moves)} plies is too long for an archive, which holds at most {MAX_PLIES}")
+		self.file.write(GAME_HEADER.pack(len(moves), result, SETUP if setup is not None else 0))
+		if setup is not None:
+			self.file.write(setup)
+		packed = array('H', moves)
+		if sys.byteorder == "big":
+			packed.byteswap()
+		self.file.write(packed.tobytes())
+		self.games += 1
+
+	# writeGame(): Adds the line being viewed in a Game, from its start to its last move
+	def writeGame(self, game: Game) -> None:
+		setup = game.root.checkpoint
+		self.write([node.move for node in game.line[1:]], RESULT_CODES[game.lineResult()],
+				   None if setup == Position.initial().pack() else setup)
+
+	# close(): Closes the file
+	def close(self) -> None:
+		self.file.close()
+
+	def __enter__(self) -> 'GameWriter':
+		return self
+
+	def __exit__(self, *exception) -> None:
+		self.close()
+
+# checkHeader(): Reads the file header, raising ValueError if it isn't a game archive of this version
+def checkHeader(archive_file, path: str) -> None:
+	header = archive_file.read(FILE_HEADER.size)
+	if len(header) < FILE_HEADER.size:
+		raise ValueError(f"Not a game archive: {path}")
+	magic, version = FILE_HEADER.unpack(header)
+	if magic != MAGIC or version != VERSION:
+		raise ValueError(f"Not a version {VERSION} game archive: {path}")
+
+# readGames(): Yields the games of an archive one at a time, reading no more of the file than the game being yielded
+def readGames(path: str) -> Iterator[ArchivedGame]:
+	with open(path, "rb", buffering = READ_BUFFER) as archive_file:
+		checkHeader(archive_file, path)
+		while True:
+			header = archive_file.read(GAME_HEADER.size)
+			if not header:
+				return
+			if len(header) < GAME_HEADER.size:
+				raise ValueError(f"Truncated game archive: {path}")
+			plies, result, flags = GAME_HEADER.unpack(header)
+
+			setup = None
+			if flags & SETUP:
+				setup = archive_file.read(SETUP_SIZE)
+			data = archive_file.read(plies * 2)
+			if len(data) < plies * 2 or (setup is not None and len(setup) < SETUP_SIZE):
+				raise ValueError(f"Truncated game archive: {path}")
+			moves = array('H', data)
+			if sys.byteorder == "big":
+				moves.byteswap()
+			yield ArchivedGame(setup, moves, result)
+
+# convertRecords(): Writes the games of self-play record files into an archive, returns how many
+def convertRecords(paths: Sequence[str], writer: GameWriter) -> int:
+	initial = Position.initial().pack()
+	count = 0
+	for path in paths:
+		for record in readRecords(path):
+			position = Position.fromFen(record.get("start", START_FEN))
+			setup = position.pack()
+			moves = []
+			for text in record["moves"]:
+				from_sq, to_sq = parseMove(text)
+				moves.append(position.packedMove(from_sq, to_sq))
+				position.makeMove(from_sq, to_sq)
+			writer.write(moves, RESULT_CODES.get(record.get("result"), UNFINISHED), None if setup == initial else setup)
+			count += 1
+	return count
+
+# replayArchive(): Plays every game of an archive through Game.makeMove(), the path the window's moves take, and prints the throughput.
+# Moves that don't move a piece of the side to move end their game as an error either way.
+# With check, every move is also checked to be legal and every stored result to match how the replay ends; a draw may also
+# end a game the rules haven't, since self-play adjudicates repetitions and overlong games as draws.
+# The printed checksum of the final positions' keys should stay the same from one version of the rules to the next.
+def replayArchive(path: str, check: bool = False) -> bool:
+	games = 0
+	plies = 0
+	checksum = 0
+	errors = 0
+	start = time.perf_counter()
+	for archived in readGames(path):
+		game = Game(archived.startPosition())
+		legal = True
+		for packed in archived.moves:
+			try:
+				move = storedMove(game, packed)
+			except ValueError as error:
+				print(f"game {games}: {error}")
+				errors += 1
+				legal = False
+				break
+			if check and (move.from_index, move.to_index) not in game.position.generateMoves():
+				print(f"game {games}: illegal move {move} at ply {game.ply + 1}")
+				errors += 1
+				legal = False
+				break
+			game.makeMove(move)
+		if check and legal and archived.result != UNFINISHED: # A game cut short by an illegal move can't be held to its result
+			result = RESULT_CODES[game.lineResult()]
+			if result != archived.result and not (result == UNFINISHED and archived.result == DRAW): # Draws by repetition or length are adjudicated
+				print(f"game {games}: stored result {RESULT_NAMES[archived.result]}, replay ends {RESULT_NAMES[result]}")
+				errors += 1
+		games += 1
+		plies += len(archived.moves)
+		checksum ^= game.position.key
+	elapsed = time.perf_counter() - start
+
+	print(f"{games} games, {plies} plies in {elapsed:.2f}s: {games / max(elapsed, 1e-9):.0f} games/s, {plies / max(elapsed, 1e-9):.0f} plies/s")
+	print(f"final position checksum {checksum:016x}" + (f", {errors} errors" if check or errors else ""))
+	return errors == 0
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description = "Los Alamos game archives")
+	subcommands = parser.add_subparsers(dest = "command", required = True)
+	convert = subcommands.add_parser("convert", help = "convert self-play records into an archive")
+	convert.add_argument("records", nargs = "+")
+	convert.add_argument("--out", required = True)
+	convert.add_argument("--append", action = "store_true", help = "add to the end of an existing archive")
+	replay = subcommands.add_parser("replay", help = "replay an archive headless and report its speed")
+	replay.add_argument("archive")
+	replay.add_argument("--check", action = "store_true", help = "check every move's legality and every stored result")
+	args = parser.parse_args()
+
+	if args.command == "convert":
+		with GameWriter(args.out, args.append) as writer:
+			count = convertRecords(args.records, writer)
+		print(f"{count} games written to {args.out}, {os.path.getsize(args.out)} bytes")
+		return 0
+	return 0 if replayArchive(args.archive, args.check) else 1
+
+if __name__ == "__main__":
+	sys.exit(main())
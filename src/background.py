@@ -0,0 +1,98 @@
+# background.py: Draws the scrolling gradient background from a pre-rendered surface instead of one line per screen row.
+# Usage: py -m src.background [frames] compares the frame time of both ways of drawing it.
+# Author: Julien Devol
+
+import math
+import os
+import sys
+import time
+import pygame
+from typing import Tuple
+
+WAVE_SPEED: float = 0.5 # Radians per second
+WAVE_FREQUENCY: float = 0.01 # Radians per screen row
+WAVE_AMPLITUDE: float = 25
+
+# gradientColor(): The background color of one screen row at a point in time
+def gradientColor(y: float, time_elapsed: float) -> Tuple[int, int, int]:
+	wave_offset = math.sin(time_elapsed * WAVE_SPEED + y * WAVE_FREQUENCY) * WAVE_AMPLITUDE
+
+	red_component = 40 + wave_offset * 0.6
+	green_component = 20 + wave_offset * 0.5
+	blue_component = 10
+
+	red_component = max(0, min(255, red_component))
+	green_component = max(0, min(255, green_component))
+	blue_component = max(0, min(255, blue_component))
+
+	return (int(red_component), int(green_component), int(blue_component))
+
+# drawGradientLines(): The original way of drawing the background, one line per screen row every frame. Kept for comparison.
+def drawGradientLines(screen, time_elapsed: float) -> None:
+	width = screen.get_width()
+	for y in range(screen.get_height()):
+		pygame.draw.line(screen, gradientColor(y, time_elapsed), (0, y), (width, y))
+
+class GradientBackground:
+	# __init__(): Constructor, renders one full wave period beyond the screen height into a cached surface.
+	# Time only shifts the wave along the rows, so every frame is a window into this surface.
+	def __init__(self, width: int, height: int) -> None:
+		self.width = width
+		self.height = height
+		self.period: float = 2 * math.pi / WAVE_FREQUENCY # Rows in one full wave
+		self.rows_per_second: float = WAVE_SPEED / WAVE_FREQUENCY
+
+		strip_height = height + math.ceil(self.period) + 1
+		column = pygame.Surface((1, strip_height))
+		for y in range(strip_height):
+			column.set_at((0, y), gradientColor(y, 0))
+
+		self.surface = pygame.transform.scale(column, (width, strip_height))
+		if pygame.display.get_surface() is not None:
+			self.surface = self.surface.convert() # Match the screen's pixel format so blits are plain copies
+
+		self.drawn_offset: int = -1 # Row of the strip at the top of the screen when the background was last drawn
+
+	# offsetAt(): The row of the strip at the top of the screen at the given time
+	def offsetAt(self, time_elapsed: float) -> int:
+		return int((time_elapsed * self.rows_per_second) % self.period)
+
+	# needsRedraw(): Whether the background at the given time differs from the one last drawn
+	def needsRedraw(self, time_elapsed: float) -> bool:
+		return self.offsetAt(time_elapsed) != self.drawn_offset
+
+	# draw(): Draws the background for the given time, a single blit
+	def draw(self, screen, time_elapsed: float) -> None:
+		self.drawn_offset = self.offsetAt(time_elapsed)
+		screen.blit(self.surface, (0, 0), (0, self.drawn_offset, self.width, self.height))
+
+	# restore(): Draws the last drawn background over just one rect of the screen, erasing whatever was drawn there since
+	def restore(self, screen, rect) -> None:
+		rect = rect.clip(screen.get_rect())
+		if rect.width and rect.height:
+			screen.blit(self.surface, rect.topleft, (rect.x, self.drawn_offset + rect.y, rect.width, rect.height))
+
+# compareFrameTimes(): Times both ways of drawing the background over the same frames and prints the average frame time of each
+def compareFrameTimes(frames: int = 300, width: int = 1280, height: int = 720) -> None:
+	pygame.init()
+	screen = pygame.display.set_mode((width, height))
+	background = GradientBackground(width, height)
+	frame_times = [i / 60 for i in range(frames)]
+
+	start = time.perf_counter()
+	for time_elapsed in frame_times:
+		drawGradientLines(screen, time_elapsed)
+	lines_ms = (time.perf_counter() - start) / frames * 1000
+
+	start = time.perf_counter()
+	for time_elapsed in frame_times:
+		background.draw(screen, time_elapsed)
+	cached_ms = (time.perf_counter() - start) / frames * 1000
+
+	pygame.quit()
+	print(f"draw.line per row: {lines_ms:.3f} ms/frame")
+	print(f"cached surface:    {cached_ms:.3f} ms/frame ({lines_ms / cached_ms:.1f}x faster)")
+
+if __name__ == "__main__":
+	os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # Doesn't need a window to benchmark
+	compareFrameTimes(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -0,0 +1,137 @@
+# book.py: Builds and probes the opening book, a sorted file of (position hash, move, weight) records made from game records.
+# Usage: py -m src.book build RECORDS... [--out book.bin] [--min-count N] [--max-depth N]
+#        py -m src.book probe [--fen FEN]
+# Author: Julien Devol
+
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.position import Position, moveName, parseMove, packMove, unpackMove
+from src.perft import START_FEN
+from src.selfplay import readRecords
+
+MAGIC: bytes = b"LABK"
+VERSION: int = 1
+HEADER = struct.Struct("<4sHI") # Magic, version, record count
+RECORD = struct.Struct("<QHH") # Zobrist key, move (packMove() without flags, from * 64 + to), weight
+MAX_WEIGHT: int = 0xFFFF
+
+class OpeningBook:
+	# __init__(): Constructor, memory-maps a book file; records are found by binary search over the mapping
+	def __init__(self, path: str, seed: Optional[int] = None) -> None:
+		self.path = path
+		with open(path, "rb") as book_file:
+			self.mapping = mmap.mmap(book_file.fileno(), 0, access = mmap.ACCESS_READ)
+
+		magic, version, self.count = HEADER.unpack_from(self.mapping, 0)
+		if magic != MAGIC or version != VERSION:
+			self.mapping.close()
+			raise ValueError(f"Not a version {VERSION} opening book: {path}")
+		if HEADER.size + self.count * RECORD.size > len(self.mapping):
+			self.mapping.close()
+			raise ValueError(f"Truncated opening book: {path}")
+
+		self.randomizer = random.Random(seed)
+		self.hits: int = 0
+
+	# close(): Unmaps the file
+	def close(self) -> None:
+		self.mapping.close()
+
+	# keyAt(): Returns the key of the record at an index
+	def keyAt(self, index: int) -> int:
+		return RECORD.unpack_from(self.mapping, HEADER.size + index * RECORD.size)[0]
+
+	# probe(): Returns every book move for the position as ((from, to), weight), heaviest first
+	def probe(self, position: Position) -> List[Tuple[Tuple[int, int], int]]:
+		key = position.key
+
+		# Binary search for the first record with this key
+		low, high = 0, self.count
+		while low < high:
+			middle = (low + high) // 2
+			if self.keyAt(middle) < key:
+				low = middle + 1
+			else:
+				high = middle
+
+		moves = []
+		index = low
+		while index < self.count:
+			record_key, move, weight = RECORD.unpack_from(self.mapping, HEADER.size + index * RECORD.size)
+			if record_key != key:
+				break
+			moves.append((unpackMove(move), weight))
+			index += 1
+
+		if moves:
+			self.hits += 1
+		return moves
+
+	# pickMove(): Picks one of the position's book moves at random, in proportion to its weight; None if the position isn't in the book
+	def pickMove(self, position: Position) -> Optional[Tuple[int, int]]:
+		moves = self.probe(position)
+		if not moves:
+			return None
+		return self.randomizer.choices([move for move, _ in moves], weights = [weight for _, weight in moves])[0]
+
+# buildBook(): Counts the moves played in the first max_depth plies of every game and writes the ones played at least min_count times.
+# A move's weight is its count, plus one more for every game its side went on to win.
+def buildBook(records: Iterable[Dict], out_path: str, min_count: int = 2, max_depth: int = 12) -> int:
+	counts: Dict[Tuple[int, int], List[int]] = {}
+
+	for record in records:
+		position = Position.fromFen(record["start"])
+		winner = {"1-0": 0, "0-1": 1}.get(record["result"])
+
+		for move_text in record["moves"][:max_depth]:
+			from_sq, to_sq = parseMove(move_text)
+			entry = counts.setdefault((position.key, packMove(from_sq, to_sq)), [0, 0])
+			entry[0] += 1
+			if winner == position.side:
+				entry[1] += 1
+			position.makeMove(from_sq, to_sq)
+			if position.isGameOver():
+				break
+
+	entries = sorted(((key, move, min(count + wins, MAX_WEIGHT)) for (key, move), (count, wins) in counts.items() if count >= min_count),
+					 key = lambda entry: (entry[0], -entry[2]))
+
+	temporary_path = out_path + ".tmp"
+	with open(temporary_path, "wb") as book_file:
+		book_file.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+		for entry in entries:
+			book_file.write(RECORD.pack(*entry))
+	os.replace(temporary_path, out_path)
+	return len(entries)
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description = "Los Alamos opening book")
+	commands = parser.add_subparsers(dest = "command", required = True)
+	build = commands.add_parser("build", help = "build a book from self-play record files")
+	build.add_argument("records", nargs = "+")
+	build.add_argument("--out", default = "book.bin")
+	build.add_argument("--min-count", type = int, default = 2, help = "leave out moves played fewer times than this")
+	build.add_argument("--max-depth", type = int, default = 12, help = "only use the first plies of every game")
+	probe = commands.add_parser("probe", help = "list the book moves for a position")
+	probe.add_argument("--book", default = "book.bin")
+	probe.add_argument("--fen", default = START_FEN)
+	args = parser.parse_args()
+
+	if args.command == "build":
+		records = (record for path in args.records for record in readRecords(path))
+		written = buildBook(records, args.out, args.min_count, args.max_depth)
+		print(f"wrote {written} book moves to {args.out}")
+	else:
+		book = OpeningBook(args.book)
+		for move, weight in book.probe(Position.fromFen(args.fen)):
+			print(f"{moveName(move)}: {weight}")
+		book.close()
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
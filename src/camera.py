@@ -1,48 +1,128 @@
-# camera.py: Handles the camera's position which can be used by other scripts to calculate where on the screen to draw objects.
+# camera.py: Handles the camera's position and zoom which can be used by other scripts to calculate where on the screen to draw objects.
+# Usage: py -m src.camera [frames] compares frame times while panning and while zooming, with and without the zoom level caches.
 # Author: Julien Devol
 
+import math
+import os
+import sys
+import time
 import pygame
 
+# Zoom is drawn at quantized levels, ZOOM_LEVELS_PER_DOUBLING of them for every doubling, so the board and sprites at each level
+# can be cached; a level is 2^(1/12), under 6% bigger than the one before, so the steps look smooth while the zoom eases along
+ZOOM_LEVELS_PER_DOUBLING: int = 12
+MIN_ZOOM_LEVEL: int = -12 # Half size
+MAX_ZOOM_LEVEL: int = 18 # 2.8 times the size
+
+# zoomScale(): The scale a zoom level is drawn at
+def zoomScale(level: int) -> float:
+    return 2 ** (level / ZOOM_LEVELS_PER_DOUBLING)
+
 class Camera:
     SPEED: float = 300
-    position_xy = [0, 0]
+    ZOOM_STEP: int = 2 # Zoom levels per mouse wheel notch
+    ZOOM_RATE: float = 14 # How fast the zoom eases towards its target, higher is snappier
 
-    # __init__(): Constructor
+    # __init__(): Constructor, every camera has its own screen and position
     def __init__(self, screen) -> None:
-        Camera.screen = screen
-        Camera.position_xy[0] = Camera.getWidth() / 2
-        Camera.position_xy[1] = Camera.getHeight() / 2
+        self.screen = screen
+        self.position_xy = [self.getWidth() / 2, self.getHeight() / 2]
+        self.zoom_level: float = 0 # Eases towards target_level; drawn at the nearest whole level
+        self.target_level: int = 0
+        self.zoom_anchor_xy = (0, 0) # Screen point that stays put while zooming, the mouse when the wheel turned
 
     # move(): Moves the camera in the passed directions.
     def move(self, dir_x: int = 0, dir_y: int = 0, delta_time: float = 0) -> None:
-        Camera.position_xy[0] -= (dir_x * Camera.SPEED * delta_time)
-        Camera.position_xy[1] -= (dir_y * Camera.SPEED * delta_time)
+        self.position_xy[0] -= (dir_x * Camera.SPEED * delta_time)
+        self.position_xy[1] -= (dir_y * Camera.SPEED * delta_time)
+
+    # zoomAt(): Starts zooming in by the passed mouse wheel notches, out if negative, around a screen point
+    def zoomAt(self, notches: int, anchor_xy) -> None:
+        self.target_level = max(MIN_ZOOM_LEVEL, min(MAX_ZOOM_LEVEL, self.target_level + notches * Camera.ZOOM_STEP))
+        self.zoom_anchor_xy = (anchor_xy[0], anchor_xy[1])
+
+    # updateZoom(): Eases the zoom towards its target. When the drawn level changes, the camera moves so the point under the anchor stays under it.
+    def updateZoom(self, delta_time: float) -> None:
+        if not self.isZooming():
+            return
+        old_scale = self.getScale()
+        self.zoom_level = self.target_level + (self.zoom_level - self.target_level) * math.exp(-Camera.ZOOM_RATE * delta_time)
+        if abs(self.zoom_level - self.target_level) < 0.05:
+            self.zoom_level = self.target_level
+
+        ratio = self.getScale() / old_scale
+        if ratio != 1:
+            anchor_x, anchor_y = self.zoom_anchor_xy
+            self.position_xy[0] = anchor_x - (anchor_x - self.position_xy[0]) * ratio
+            self.position_xy[1] = anchor_y - (anchor_y - self.position_xy[1]) * ratio
+
+    # isZooming(): Whether the zoom is still easing towards its target
+    def isZooming(self) -> bool:
+        return self.zoom_level != self.target_level
+
+    # getLevel(): Returns the whole zoom level things are drawn at.
+    def getLevel(self) -> int:
+        return round(self.zoom_level)
+
+    # getScale(): Returns the scale things are drawn at, 1 unzoomed.
+    def getScale(self) -> float:
+        return zoomScale(self.getLevel())
 
     # getScreen(): Returns the current screen.
-    @staticmethod
-    def getScreen():
-        return Camera.screen
+    def getScreen(self):
+        return self.screen
 
     # getWidth(): Returns the width of the current screen.
-    @staticmethod
-    def getWidth():
-        return Camera.screen.get_width()
-    
+    def getWidth(self):
+        return self.screen.get_width()
+
     # getHeight(): Returns the height of the current screen.
-    @staticmethod
-    def getHeight():
-        return Camera.screen.get_height()
-    
+    def getHeight(self):
+        return self.screen.get_height()
+
     # getX(): Returns the current x-coordinate of the camera.
-    @staticmethod
-    def getX():
-        return Camera.position_xy[0]
-    
+    def getX(self):
+        return self.position_xy[0]
+
     # getY(): Returns the current y-coordinate of the camera.
-    @staticmethod
-    def getY():
-        return Camera.position_xy[1]
-    
+    def getY(self):
+        return self.position_xy[1]
+
+# compareZoomFrames(): Draws the board while panning, while zooming in and out with the zoom level caches, and while zooming with them
+# emptied every frame, which is what rescaling every sprite and the board for every frame costs, and prints the frame times of each
+def compareZoomFrames(frames: int = 300, width: int = 1280, height: int = 720) -> None:
+    from src.game import Board
+    from src.sprites import SPRITES
+    from src.frametimes import FrameWindow
 
+    pygame.init()
+    screen = pygame.display.set_mode((width, height))
+    camera = Camera(screen)
+    board = Board(screen, camera)
+    delta = 1 / 60
 
+    for label, zooming, cached in (("panning", False, True), ("zooming, cached", True, True), ("zooming, uncached", True, False)):
+        camera.position_xy = [(width - board.board_size) / 2, (height - board.board_size) / 2]
+        camera.zoom_level = camera.target_level = 0
+        window = FrameWindow(frames)
+        for frame in range(frames):
+            start = time.perf_counter()
+            if zooming and not camera.isZooming():
+                camera.zoomAt(-4 if camera.target_level > 0 else 4, (width / 2, height / 2)) # Back and forth, 8 levels at a time
+            camera.move(1 if frame % 120 < 60 else -1, 0, delta)
+            camera.updateZoom(delta)
+            if not cached:
+                SPRITES.clearScaled()
+                board.clearLevels()
+            screen.fill((0, 0, 0))
+            board.draw(camera)
+            pygame.display.flip()
+            window.add((time.perf_counter() - start) * 1000)
+        median, p99, worst = window.percentiles(50, 99, 100)
+        print(f"{label:>18}: median {median:.2f} ms, 99th percentile {p99:.2f} ms, worst {worst:.2f} ms")
+    print(SPRITES.report())
+    pygame.quit()
 
+if __name__ == "__main__":
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # Doesn't need a window to benchmark
+    compareZoomFrames(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
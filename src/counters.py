@@ -0,0 +1,29 @@
+# counters.py: Process-wide counters of the hot paths, bumped where the work happens and read by the HUD and the tools.
+# Imports nothing, so the move generator and the engine can count without loading anything else.
+# Author: Julien Devol
+
+from typing import Dict
+
+class Counters:
+	__slots__ = ("move_generations", "legal_move_queries", "search_nodes", "searches", "board_draws", "square_draws", "piece_draws")
+
+	# __init__(): Constructor, every counter starts at zero
+	def __init__(self) -> None:
+		self.reset()
+
+	# reset(): Sets every counter back to zero
+	def reset(self) -> None:
+		self.move_generations: int = 0 # Position.generateMoves() and countMoves() calls
+		self.legal_move_queries: int = 0 # Square.show_legal_moves() calls, one per piece selected
+		self.search_nodes: int = 0 # Nodes of finished searches, the background worker's included once their results arrive
+		self.searches: int = 0
+		self.board_draws: int = 0
+		self.square_draws: int = 0
+		self.piece_draws: int = 0
+
+	# snapshot(): Every counter by name, for working out rates between two points in time
+	def snapshot(self) -> Dict[str, int]:
+		return {name: getattr(self, name) for name in self.__slots__}
+
+# The counters of this process
+COUNTERS: Counters = Counters()
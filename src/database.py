@@ -0,0 +1,222 @@
+# database.py: Keeps every game played, self-play records and the games played in the window alike, in a local SQLite database,
+# with win/draw/loss statistics for every move played from every position, looked up by the position's Zobrist key.
+# Usage: py -m src.database ingest RECORDS... [--db games.db] [--batch N]
+#        py -m src.database explore [--db games.db] [--fen FEN]
+# Author: Julien Devol
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.position import Position, WHITE, EMPTY, SQUARE_COUNT, ZOBRIST_PIECES, ZOBRIST_BLACK_TO_MOVE, moveName, packMove, unpackMove, MOVE_SQUARES_MASK
+from src.perft import START_FEN
+from src.selfplay import readRecords
+
+DEFAULT_PATH: str = "games.db"
+DEFAULT_BATCH: int = 1000 # Games per ingest transaction
+SCHEMA_VERSION: int = 1
+
+# Game results, stored from White's point of view; unfinished games count towards a move's games but not its results
+WHITE_WIN: int = 1
+DRAW: int = 0
+BLACK_WIN: int = -1
+RESULT_CODES: Dict[str, int] = {"1-0": WHITE_WIN, "1/2-1/2": DRAW, "0-1": BLACK_WIN}
+
+SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS games (
+	id INTEGER PRIMARY KEY,
+	source TEXT NOT NULL,
+	source_id TEXT NOT NULL,
+	white TEXT,
+	black TEXT,
+	result INTEGER,
+	start TEXT NOT NULL,
+	moves TEXT NOT NULL,
+	UNIQUE (source, source_id)
+);
+CREATE TABLE IF NOT EXISTS moves (
+	key INTEGER NOT NULL,
+	move INTEGER NOT NULL,
+	games INTEGER NOT NULL,
+	white_wins INTEGER NOT NULL,
+	draws INTEGER NOT NULL,
+	black_wins INTEGER NOT NULL,
+	PRIMARY KEY (key, move)
+) WITHOUT ROWID;
+"""
+
+# The statistics of every (position, move) pair are stored once, clustered by key so a position's moves are one B-tree range
+UPSERT_MOVE: str = """
+INSERT INTO moves (key, move, games, white_wins, draws, black_wins) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (key, move) DO UPDATE SET games = games + excluded.games, white_wins = white_wins + excluded.white_wins,
+	draws = draws + excluded.draws, black_wins = black_wins + excluded.black_wins
+"""
+
+# Every move's coordinate notation both ways, since ingesting spends much of its time converting them
+MOVE_NAMES: Dict[Tuple[int, int], str] = {(from_sq, to_sq): moveName((from_sq, to_sq)) for from_sq in range(SQUARE_COUNT) for to_sq in range(SQUARE_COUNT)}
+NAMED_MOVES: Dict[str, Tuple[int, int]] = {name: move for move, name in MOVE_NAMES.items()}
+
+# _signedKey(): SQLite integers are signed 64-bit, so Zobrist keys at or above 2^63 are stored wrapped around to negative
+def _signedKey(key: int) -> int:
+	return key - (1 << 64) if key >= 1 << 63 else key
+
+# _lineKeys(): The Zobrist key of the position before every move of a game. Only the mailbox and the key are updated along the way,
+# a full Position would also maintain attack maps that nothing here needs.
+def _lineKeys(start: Position, moves: List[Tuple[int, int]]) -> List[int]:
+	mailbox = start.mailbox[:]
+	key = start.key
+	keys = []
+	for from_sq, to_sq in moves:
+		keys.append(key)
+		code = mailbox[from_sq]
+		captured = mailbox[to_sq]
+		key ^= ZOBRIST_PIECES[code][from_sq] ^ ZOBRIST_PIECES[code][to_sq] ^ ZOBRIST_BLACK_TO_MOVE
+		if captured != EMPTY:
+			key ^= ZOBRIST_PIECES[captured][to_sq]
+		mailbox[to_sq] = code
+		mailbox[from_sq] = EMPTY
+	return keys
+
+class MoveStats:
+	__slots__ = ("move", "games", "white_wins", "draws", "black_wins")
+
+	# __init__(): Constructor, how often a move was played from a position and how those games ended
+	def __init__(self, move: Tuple[int, int], games: int, white_wins: int, draws: int, black_wins: int) -> None:
+		self.move: Tuple[int, int] = move
+		self.games: int = games
+		self.white_wins: int = white_wins
+		self.draws: int = draws
+		self.black_wins: int = black_wins
+
+	# score(): The mean result for the given color, a win 1 and a draw 0.5, over the finished games; None if none finished
+	def score(self, color: int) -> Optional[float]:
+		finished = self.white_wins + self.draws + self.black_wins
+		if not finished:
+			return None
+		wins = self.white_wins if color == WHITE else self.black_wins
+		return (wins + self.draws / 2) / finished
+
+	# __str__(): Summarizes the move on one line
+	def __str__(self) -> str:
+		return f"{moveName(self.move)} games {self.games} +{self.white_wins} ={self.draws} -{self.black_wins}"
+
+class PositionDatabase:
+	# __init__(): Constructor, opens or creates the database file
+	def __init__(self, path: str = DEFAULT_PATH) -> None:
+		self.path: str = path
+		self.connection = sqlite3.connect(path)
+		self.connection.execute("PRAGMA journal_mode = WAL") # Readers aren't blocked by an ingest running in another process
+		self.connection.execute("PRAGMA synchronous = NORMAL")
+		version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+		if version not in (0, SCHEMA_VERSION):
+			self.connection.close()
+			raise ValueError(f"Not a version {SCHEMA_VERSION} game database: {path}")
+		with self.connection:
+			self.connection.executescript(SCHEMA)
+			self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+	# close(): Closes the database
+	def close(self) -> None:
+		self.connection.close()
+
+	# gameCount(): Number of games stored
+	def gameCount(self) -> int:
+		return self.connection.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+	# explore(): Every move played from the position, most played first
+	def explore(self, position: Position) -> List[MoveStats]:
+		rows = self.connection.execute("SELECT move, games, white_wins, draws, black_wins FROM moves WHERE key = ? ORDER BY games DESC",
+									   (_signedKey(position.key),)).fetchall()
+		return [MoveStats(unpackMove(move), games, white_wins, draws, black_wins) for move, games, white_wins, draws, black_wins in rows]
+
+	# addGames(): Stores games given as (source, source_id, white, black, result, start FEN, [(from, to), ...]), all in one transaction.
+	# A game already stored under the same source and id is skipped, so ingesting a record file again only adds its new games.
+	# Moves are counted once per game even if a position repeats. Returns how many games were new.
+	def addGames(self, games: Iterable[Tuple[str, str, Optional[str], Optional[str], Optional[int], str, List[Tuple[int, int]]]]) -> int:
+		totals: Dict[Tuple[int, int], List[int]] = {} # The batch's counts, so each (position, move) is written once per batch
+		starts: Dict[str, Position] = {}
+		added = 0
+		with self.connection:
+			for source, source_id, white, black, result, start, moves in games:
+				cursor = self.connection.execute("INSERT OR IGNORE INTO games (source, source_id, white, black, result, start, moves) VALUES (?, ?, ?, ?, ?, ?, ?)",
+												 (source, source_id, white, black, result, start, ' '.join([MOVE_NAMES[move] for move in moves])))
+				if not cursor.rowcount:
+					continue
+				added += 1
+
+				if start not in starts:
+					starts[start] = Position.fromFen(start)
+				counts = (1, int(result == WHITE_WIN), int(result == DRAW), int(result == BLACK_WIN))
+				for entry in {(_signedKey(key), packMove(*move) & MOVE_SQUARES_MASK) for key, move in zip(_lineKeys(starts[start], moves), moves)}:
+					total = totals.get(entry)
+					if total is None:
+						totals[entry] = list(counts)
+					else:
+						total[0] += 1
+						total[1] += counts[1]
+						total[2] += counts[2]
+						total[3] += counts[3]
+
+			# In key order, so the upserts walk the table's B-tree from one end to the other rather than jumping around it
+			self.connection.executemany(UPSERT_MOVE, ((key, move, *totals[key, move]) for key, move in sorted(totals)))
+		return added
+
+	# addGame(): Stores a game played in the window, the line being viewed from its start to its last move
+	def addGame(self, game, source: str = "window") -> bool:
+		moves = [unpackMove(node.move) for node in game.line[1:]]
+		if not moves:
+			return False
+		start = Position.unpack(game.root.checkpoint).toFen()
+		return self.addGames([(source, uuid.uuid4().hex, None, None, # Every game played is its own, even if an earlier one had the same moves
+							   RESULT_CODES.get(game.lineResult()), start, moves)]) == 1
+
+	# ingestRecords(): Stores the games of self-play record files, batch games per transaction. Returns how many were new.
+	def ingestRecords(self, paths: Iterable[str], batch: int = DEFAULT_BATCH) -> int:
+		added = 0
+		pending = []
+		for path in paths:
+			source = os.path.abspath(path)
+			for record in readRecords(path):
+				moves = [NAMED_MOVES[text] for text in record["moves"]]
+				pending.append((source, str(record["id"]), record.get("white"), record.get("black"), RESULT_CODES.get(record.get("result")),
+								record.get("start", START_FEN), moves))
+				if len(pending) >= batch:
+					added += self.addGames(pending)
+					pending.clear()
+		return added + self.addGames(pending)
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description = "Los Alamos game database")
+	subcommands = parser.add_subparsers(dest = "command", required = True)
+	ingest = subcommands.add_parser("ingest", help = "store self-play record files")
+	ingest.add_argument("records", nargs = "+")
+	ingest.add_argument("--db", default = DEFAULT_PATH)
+	ingest.add_argument("--batch", type = int, default = DEFAULT_BATCH, help = "games per transaction")
+	explore = subcommands.add_parser("explore", help = "list the moves played from a position")
+	explore.add_argument("--db", default = DEFAULT_PATH)
+	explore.add_argument("--fen", default = START_FEN)
+	args = parser.parse_args()
+
+	database = PositionDatabase(args.db)
+	if args.command == "ingest":
+		start = time.perf_counter()
+		added = database.ingestRecords(args.records, args.batch)
+		elapsed = time.perf_counter() - start
+		print(f"{added} new games in {elapsed:.2f}s ({added / max(elapsed, 1e-9):.0f} games/s), {database.gameCount()} in {args.db}")
+	else:
+		position = Position.fromFen(args.fen)
+		start = time.perf_counter()
+		moves = database.explore(position)
+		elapsed = time.perf_counter() - start
+		for stats in moves:
+			score = stats.score(position.side)
+			print(f"{stats}" + (f" score {score:.3f}" if score is not None else ""))
+		print(f"{len(moves)} moves in {elapsed * 1000:.2f} ms")
+	database.close()
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,347 @@
+# dataset.py: Exports positions from game records as NumPy training data, in memory-mapped .npy shards.
+# Games are replayed on the bitboard Position only to get each position's piece bitboards; everything else is worked out
+# a batch at a time from those bitboards with NumPy: the attack planes, and the legal move masks, from the same attack and line
+# tables Position uses, indexed by square over the whole batch. The masks double as the check that a record's moves are legal.
+# Needs NumPy, which nothing else in the project does.
+# Usage: py -m src.dataset RECORDS... [--out dataset] [--shard-size N] [--batch-size N]
+# Author: Julien Devol
+#
+# Every shard is three arrays of the same length, loaded with np.load(path, mmap_mode = "r"):
+#   shard-NNNNN-planes.npy  uint8 (N, PLANES, 6, 6), indexed [position, plane, row, col] with row 0 at Black's back rank
+#   shard-NNNNN-moves.npy   uint8 (N, MOVE_BYTES), the legal move masks packed 8 moves to a byte with np.packbits();
+#                           np.unpackbits(moves, axis = 1) gives (N, MOVE_INDEXES) with a 1 for every legal move, at from * 36 + to
+#   shard-NNNNN-values.npy  int8 (N,), the game's result for the side to move: 1 won, 0 drawn, -1 lost
+# manifest.json lists the shards and their lengths.
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from src.position import (Position, WHITE, BLACK, PAWN, KNIGHT, ROOK, QUEEN, KING, EMPTY, SQUARE_COUNT, DIMENSIONS, FULL_BOARD,
+						  KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, PAWN_PUSHES, RAYS, POSITIVE_DIRECTIONS, STRAIGHT_DIRECTIONS,
+						  DIAGONAL_DIRECTIONS, ROOK_TABLES, DIAGONAL_TABLES, BETWEEN, LINE, pieceCode, parseMove)
+from src.perft import START_FEN
+from src.selfplay import readRecords
+
+# Planes 0-4 are White's pawns, knights, rooks, queens and king, 5-9 Black's, 10-11 the squares White and Black attack,
+# and 12 is all ones when Black is to move
+PIECE_CODES: Tuple[int, ...] = tuple(pieceCode(color, piece_type) for color in (WHITE, BLACK) for piece_type in range(PAWN, KING + 1))
+PIECE_TYPES: int = KING + 1
+BITBOARD_PLANES: int = len(PIECE_CODES) + 2
+SIDE_PLANE: int = BITBOARD_PLANES
+PLANES: int = BITBOARD_PLANES + 1
+MOVE_INDEXES: int = SQUARE_COUNT * SQUARE_COUNT
+MOVE_BYTES: int = MOVE_INDEXES // 8
+RESULT_VALUES: Dict[str, int] = {"1-0": 1, "0-1": -1, "1/2-1/2": 0} # From White's point of view
+
+DEFAULT_SHARD_SIZE: int = 1 << 20 # Positions per shard, 47 MiB of planes and 162 MiB of packed move masks
+DEFAULT_BATCH_SIZE: int = 4096 # Positions encoded at once
+
+_SQUARE_SHIFTS = np.arange(SQUARE_COUNT, dtype = np.int64)
+
+# _padded(): A per-square table as a NumPy array, with a 37th all-zero entry for the square of a piece that isn't there
+def _padded(table: Sequence[int]) -> np.ndarray:
+	return np.array(list(table) + [0], dtype = np.int64)
+
+# The Position tables, indexed by square over a whole batch at once
+_KNIGHT_ATTACKS = _padded(KNIGHT_ATTACKS)
+_KING_ATTACKS = _padded(KING_ATTACKS)
+_PAWN_ATTACKS = np.stack([_padded(PAWN_ATTACKS[color]) for color in (WHITE, BLACK)])
+_PAWN_PUSHES = np.stack([_padded(PAWN_PUSHES[color]) for color in (WHITE, BLACK)])
+_RAYS = np.stack([_padded(ray) for ray in RAYS])
+_ROOK_LINES = _padded([ROOK_TABLES[sq][0] for sq in range(SQUARE_COUNT)]) # Every square a rook on sq sees on an empty board
+_DIAGONAL_LINES = _padded([DIAGONAL_TABLES[sq][0] for sq in range(SQUARE_COUNT)])
+_BETWEEN = np.stack([_padded(row) for row in BETWEEN] + [_padded([0] * SQUARE_COUNT)])
+_LINE = np.stack([_padded(row) for row in LINE] + [_padded([0] * SQUARE_COUNT)])
+
+# _squareBits(): Splits a batch of bitboards into one bool per square, (..., 36)
+def _squareBits(bitboards: np.ndarray) -> np.ndarray:
+	return ((bitboards[..., None] >> _SQUARE_SHIFTS) & 1).astype(bool)
+
+# _highestBit(): The index of the highest set bit of every bitboard, SQUARE_COUNT for empty ones so it indexes the padding.
+# The float log2 is exact here, every bitboard fits in 36 bits.
+def _highestBit(bitboards: np.ndarray) -> np.ndarray:
+	index = np.full(bitboards.shape, SQUARE_COUNT, dtype = np.int64)
+	nonzero = bitboards != 0
+	index[nonzero] = np.log2(bitboards[nonzero]).astype(np.int64)
+	return index
+
+# _slidingAttacks(): What a slider on every square attacks in the given directions, (N, 36), stopping at the first blocker.
+# Each ray is cut at its nearest blocker by taking away the ray that starts beyond it.
+def _slidingAttacks(occupied: np.ndarray, directions: Sequence[int]) -> np.ndarray:
+	attacks = np.zeros((len(occupied), SQUARE_COUNT), dtype = np.int64)
+	for direction in directions:
+		ray = _RAYS[direction, :SQUARE_COUNT]
+		blockers = ray & occupied[:, None]
+		nearest = _highestBit(blockers & -blockers) if POSITIVE_DIRECTIONS[direction] else _highestBit(blockers)
+		attacks |= ray ^ _RAYS[direction][nearest]
+	return attacks
+
+# _orSquares(): ORs the per-square bitboards of the squares that are set in on, (N, 36) down to (N,)
+def _orSquares(bitboards: np.ndarray, on: np.ndarray) -> np.ndarray:
+	return np.bitwise_or.reduce(np.where(on, bitboards, 0), axis = 1)
+
+# legalTargets(): For a batch of positions given as their (N, 10) piece bitboards in PIECE_CODES order and sides to move,
+# the (N, 2) squares White and Black attack and the (N, 36) legal targets of the piece on every square.
+# The same masks as Position.legalityMasks(): the king avoids every attacked square, with its own square left out of the
+# occupancy so it can't step back along a checking line, pinned pieces stay on their pin line, and in check every other
+# piece has to block or capture.
+def legalTargets(pieces: np.ndarray, sides: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+	count = len(sides)
+	batch = np.arange(count)
+	color_pieces = pieces.reshape(count, 2, PIECE_TYPES)
+	own_pieces = color_pieces[batch, sides]
+	enemy_pieces = color_pieces[batch, sides ^ 1]
+	occupancy = np.bitwise_or.reduce(color_pieces, axis = 2)
+	own = occupancy[batch, sides]
+	enemy = occupancy[batch, sides ^ 1]
+	occupied = own | enemy
+	on = _squareBits(color_pieces) # (N, 2, PIECE_TYPES, 36)
+	own_on = on[batch, sides]
+	enemy_on = on[batch, sides ^ 1]
+
+	# What the piece on every square attacks, own pieces included, like Position.attacks_from
+	straight = _slidingAttacks(occupied, STRAIGHT_DIRECTIONS)
+	diagonal = _slidingAttacks(occupied, DIAGONAL_DIRECTIONS)
+	attacks = np.zeros((count, SQUARE_COUNT), dtype = np.int64)
+	for color in (WHITE, BLACK):
+		color_on = on[:, color]
+		attacks |= np.where(color_on[:, PAWN], _PAWN_ATTACKS[color, :SQUARE_COUNT], 0)
+		attacks |= np.where(color_on[:, KNIGHT], _KNIGHT_ATTACKS[:SQUARE_COUNT], 0)
+		attacks |= np.where(color_on[:, ROOK] | color_on[:, QUEEN], straight, 0)
+		attacks |= np.where(color_on[:, QUEEN], diagonal, 0)
+		attacks |= np.where(color_on[:, KING], _KING_ATTACKS[:SQUARE_COUNT], 0)
+	attacked = np.stack([_orSquares(attacks, on[:, color].any(axis = 1)) for color in (WHITE, BLACK)], axis = 1)
+
+	# The king's targets, against the enemy's attacks with the king itself taken off the board
+	king = own_pieces[:, KING]
+	king_sq = _highestBit(king)
+	cleared = occupied & ~king
+	enemy_sliders = enemy_on[:, ROOK] | enemy_on[:, QUEEN]
+	king_danger = (_orSquares(attacks, enemy_on.any(axis = 1) & ~enemy_sliders) |
+				   _orSquares(_slidingAttacks(cleared, STRAIGHT_DIRECTIONS), enemy_sliders) |
+				   _orSquares(_slidingAttacks(cleared, DIAGONAL_DIRECTIONS), enemy_on[:, QUEEN]))
+	king_targets = _KING_ATTACKS[king_sq] & ~own & ~king_danger
+
+	# In check everything else has to capture the checker or block its line; in double check nothing else can move
+	checking = enemy_on.any(axis = 1) & ((attacks & king[:, None]) != 0)
+	checkers = checking.sum(axis = 1)
+	checker_sq = np.where(checkers == 1, np.argmax(checking, axis = 1), SQUARE_COUNT)
+	block = np.where(checkers == 0, FULL_BOARD, np.where(checkers == 1, (1 << checker_sq) | _BETWEEN[king_sq, checker_sq], 0))
+
+	# A piece alone between its king and an enemy rook or queen on the same line is pinned to that line
+	snipers = ((enemy_sliders & _squareBits(_ROOK_LINES[king_sq])) | (enemy_on[:, QUEEN] & _squareBits(_DIAGONAL_LINES[king_sq])))
+	blockers = _BETWEEN[king_sq[:, None], _SQUARE_SHIFTS] & occupied[:, None]
+	pinning = snipers & (blockers != 0) & ((blockers & (blockers - 1)) == 0) & ((blockers & own[:, None]) != 0)
+	pin_lines = np.full((count, SQUARE_COUNT), FULL_BOARD, dtype = np.int64)
+	rows, sniper_sq = np.nonzero(pinning)
+	pin_lines[rows, _highestBit(blockers[rows, sniper_sq])] = _LINE[king_sq[rows], sniper_sq]
+
+	pushes = (_PAWN_PUSHES[sides, :SQUARE_COUNT] & ~occupied[:, None]) | (_PAWN_ATTACKS[sides, :SQUARE_COUNT] & enemy[:, None])
+	targets = np.where(own_on[:, PAWN], pushes, 0)
+	targets |= np.where(own_on[:, KNIGHT] | own_on[:, ROOK] | own_on[:, QUEEN], attacks & ~own[:, None], 0)
+	targets &= block[:, None] & pin_lines
+	targets |= np.where(own_on[:, KING], king_targets[:, None], 0)
+	return attacked, targets
+
+# positionRow(): The numbers a position is encoded from, its piece bitboards and side to move. Everything else is worked out per batch.
+def positionRow(position: Position) -> Tuple[List[int], int]:
+	bitboards = position.bitboards
+	return [bitboards[code] for code in PIECE_CODES], position.side
+
+# encodeRows(): Encodes a batch of positionRow()s into planes and packed legal move masks.
+# Every bitboard is split into its 36 bits with one shift and mask over the whole batch, and the masks come from legalTargets().
+def encodeRows(bitboards: Sequence[List[int]], sides: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+	count = len(sides)
+	pieces = np.array(bitboards, dtype = np.int64).reshape(count, len(PIECE_CODES))
+	side_array = np.array(sides, dtype = np.int64)
+	attacked, targets = legalTargets(pieces, side_array)
+
+	planes = np.empty((count, PLANES, DIMENSIONS, DIMENSIONS), dtype = np.uint8)
+	planes[:, :BITBOARD_PLANES] = _squareBits(np.concatenate((pieces, attacked), axis = 1)).reshape(count, BITBOARD_PLANES, DIMENSIONS, DIMENSIONS)
+	planes[:, SIDE_PLANE] = side_array.astype(np.uint8).reshape(count, 1, 1)
+	masks = np.packbits(_squareBits(targets).reshape(count, MOVE_INDEXES), axis = 1)
+	return planes, masks
+
+# encodePositions(): Encodes positions into (N, PLANES, 6, 6) planes and (N, MOVE_BYTES) packed legal move masks
+def encodePositions(positions: Iterable[Position]) -> Tuple[np.ndarray, np.ndarray]:
+	rows = [positionRow(position) for position in positions]
+	return encodeRows([row[0] for row in rows], [row[1] for row in rows])
+
+# maskHas(): Whether each of the packed masks has the bit of the matching move index set
+def maskHas(masks: np.ndarray, indexes: np.ndarray) -> np.ndarray:
+	return ((masks[np.arange(len(indexes)), indexes >> 3] >> (7 - (indexes & 7))) & 1).astype(bool)
+
+# decodePlanes(): Rebuilds a position from its encoded planes, to check an export
+def decodePlanes(planes: np.ndarray) -> Position:
+	position = Position()
+	for plane, code in enumerate(PIECE_CODES):
+		for sq in np.flatnonzero(planes[plane]):
+			position.putPiece(int(sq), code >> 3, code & 7)
+	position.setSide(int(planes[SIDE_PLANE, 0, 0]))
+	return position
+
+class ShardWriter:
+	# __init__(): Constructor, writes shards of shard_size positions into directory; positions are buffered and encoded batch_size at a time
+	def __init__(self, directory: str, shard_size: int = DEFAULT_SHARD_SIZE, batch_size: int = DEFAULT_BATCH_SIZE) -> None:
+		os.makedirs(directory, exist_ok = True)
+		self.directory: str = directory
+		self.shard_size: int = shard_size
+		self.batch_size: int = batch_size
+		self.shards: List[Dict] = []
+		self.arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None # The open shard's memory maps
+		self.filled: int = 0 # Positions written to the open shard
+		self.positions: int = 0
+		self.games: int = 0 # Games written, a lone add()ed position counting as one
+		self.rejected: int = 0 # Games dropped for an illegal move
+		self.pending_bitboards: List[List[int]] = []
+		self.pending_sides: List[int] = []
+		self.pending_values: List[int] = []
+		self.pending_played: List[int] = [] # The move played from each position, as from * 36 + to, -1 after the last one
+		self.pending_games: List[int] = [] # Which game each position belongs to, so a game with an illegal move is dropped whole
+
+	# shardPaths(): The planes, moves and values paths of a shard
+	def shardPaths(self, index: int) -> Tuple[str, str, str]:
+		base = os.path.join(self.directory, f"shard-{index:05d}")
+		return base + "-planes.npy", base + "-moves.npy", base + "-values.npy"
+
+	# add(): Buffers one position with the game's result for its side to move
+	def add(self, position: Position, value: int) -> None:
+		self.addGame([positionRow(position)], [value], [])
+
+	# addGame(): Buffers the positionRow()s of a game, with the result for each one's side to move and the moves played between them
+	# as from * 36 + to. The moves are checked against the legal move masks when the batch is encoded.
+	def addGame(self, rows: Sequence[Tuple[List[int], int]], values: Sequence[int], played: Sequence[int]) -> None:
+		game = self.games + self.rejected + len(self.pending_games) # Unique among the pending games, nothing else needs it to be
+		for bitboards, side in rows:
+			self.pending_bitboards.append(bitboards)
+			self.pending_sides.append(side)
+		self.pending_values.extend(values)
+		self.pending_played.extend(played)
+		self.pending_played.extend([-1] * (len(rows) - len(played)))
+		self.pending_games.extend([game] * len(rows))
+		if len(self.pending_sides) >= self.batch_size:
+			self.flush()
+
+	# flush(): Encodes the buffered positions, drops the games that played a move their masks don't have, and writes the rest
+	# into the open shard, opening shards as they fill up
+	def flush(self) -> None:
+		if not self.pending_sides:
+			return
+		planes, masks = encodeRows(self.pending_bitboards, self.pending_sides)
+		values = np.array(self.pending_values, dtype = np.int8)
+		played = np.array(self.pending_played, dtype = np.int64)
+		games = np.array(self.pending_games, dtype = np.int64)
+		moved = np.flatnonzero(played >= 0)
+		illegal = np.unique(games[moved[~maskHas(masks[moved], played[moved])]])
+		if len(illegal):
+			keep = ~np.isin(games, illegal)
+			planes, masks, values, games = planes[keep], masks[keep], values[keep], games[keep]
+		self.games += len(np.unique(games))
+		self.rejected += len(illegal)
+
+		start = 0
+		total = len(values)
+		while start < total:
+			if self.arrays is None:
+				paths = self.shardPaths(len(self.shards))
+				self.arrays = (np.lib.format.open_memmap(paths[0], "w+", np.uint8, (self.shard_size, PLANES, DIMENSIONS, DIMENSIONS)),
+							   np.lib.format.open_memmap(paths[1], "w+", np.uint8, (self.shard_size, MOVE_BYTES)),
+							   np.lib.format.open_memmap(paths[2], "w+", np.int8, (self.shard_size,)))
+				self.filled = 0
+
+			end = min(total, start + self.shard_size - self.filled)
+			span = slice(self.filled, self.filled + end - start)
+			self.arrays[0][span] = planes[start:end]
+			self.arrays[1][span] = masks[start:end]
+			self.arrays[2][span] = values[start:end]
+			self.filled += end - start
+			self.positions += end - start
+			start = end
+			if self.filled == self.shard_size:
+				self.closeShard()
+
+		self.pending_bitboards.clear()
+		self.pending_sides.clear()
+		self.pending_values.clear()
+		self.pending_played.clear()
+		self.pending_games.clear()
+
+	# closeShard(): Flushes the open shard to disk. A last shard that didn't fill up is rewritten at its real length,
+	# since a .npy header can't be changed in place.
+	def closeShard(self) -> None:
+		paths = self.shardPaths(len(self.shards))
+		arrays, self.arrays = self.arrays, None
+		for array in arrays:
+			array.flush()
+		if self.filled < self.shard_size:
+			for array, path in zip(arrays, paths):
+				np.save(path + ".tmp.npy", array[:self.filled])
+			del arrays, array # Unmapped before they're replaced, which Windows insists on
+			for path in paths:
+				os.replace(path + ".tmp.npy", path)
+		self.shards.append({"planes": os.path.basename(paths[0]), "moves": os.path.basename(paths[1]),
+							"values": os.path.basename(paths[2]), "positions": self.filled})
+
+	# close(): Writes what's still buffered and the manifest
+	def close(self) -> None:
+		self.flush()
+		if self.arrays is not None:
+			self.closeShard()
+		manifest = {"planes": PLANES, "board": [DIMENSIONS, DIMENSIONS], "move_indexes": MOVE_INDEXES, "move_bytes": MOVE_BYTES,
+					"moves_packed": True, "positions": self.positions, "shards": self.shards}
+		with open(os.path.join(self.directory, "manifest.json"), "w", encoding = "utf-8") as manifest_file:
+			json.dump(manifest, manifest_file, indent = 1)
+
+# exportRecords(): Replays every game in the record files and writes each position before a move, and the final one, to the writer.
+# Returns the number of games exported; games with an unknown result or an unreadable or illegal move are skipped whole,
+# so none of their positions are written. Legality is checked against the batch's move masks, so replaying only makes sure
+# each move moves a piece of the side to move onto a square it doesn't hold, which is all Position.makeMove() needs.
+def exportRecords(paths: Iterable[str], writer: ShardWriter) -> int:
+	exported = writer.games
+	for path in paths:
+		for record in readRecords(path):
+			result = RESULT_VALUES.get(record.get("result"))
+			if result is None:
+				continue
+			position = Position.fromFen(record.get("start", START_FEN))
+			rows = [positionRow(position)]
+			values = [result if position.side == WHITE else -result]
+			played = []
+			try:
+				for from_sq, to_sq in map(parseMove, record["moves"]):
+					moving = position.mailbox[from_sq]
+					if moving == EMPTY or moving >> 3 != position.side or position.occupancy[position.side] >> to_sq & 1:
+						raise ValueError("illegal move")
+					position.makeMove(from_sq, to_sq)
+					rows.append(positionRow(position))
+					values.append(result if position.side == WHITE else -result)
+					played.append(from_sq * SQUARE_COUNT + to_sq)
+			except (ValueError, KeyError):
+				continue
+			writer.addGame(rows, values, played)
+	writer.flush()
+	return writer.games - exported
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description = "Export game record positions as NumPy training data")
+	parser.add_argument("records", nargs = "+", help = "game record files from src.selfplay")
+	parser.add_argument("--out", default = "dataset", help = "directory for the shards and manifest.json")
+	parser.add_argument("--shard-size", type = int, default = DEFAULT_SHARD_SIZE, help = "positions per shard")
+	parser.add_argument("--batch-size", type = int, default = DEFAULT_BATCH_SIZE, help = "positions encoded at once")
+	args = parser.parse_args()
+
+	start = time.perf_counter()
+	writer = ShardWriter(args.out, args.shard_size, args.batch_size)
+	games = exportRecords(args.records, writer)
+	writer.close()
+	elapsed = time.perf_counter() - start
+	print(f"{writer.positions} positions from {games} games in {len(writer.shards)} shards, "
+		  f"{elapsed:.2f}s, {writer.positions / max(elapsed, 1e-9):.0f} positions/s")
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,406 @@
+# engine.py: Defines the computer opponent, a negamax alpha-beta search over the bitboard Position.
+# Author: Julien Devol
+
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from src.position import Position, WHITE, EMPTY, DIMENSIONS, PAWN, QUEEN, moveName, packMove, unpackMove
+from src.evaluation import PIECE_VALUES
+from src.transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND, NO_MOVE
+from src.rules import Move
+from src.counters import COUNTERS
+from src.tablebase import MAX_DISTANCE
+
+MATE_SCORE: int = 100000 # Score for checkmating the opponent, minus the ply it happens at
+TABLEBASE_WIN: int = MATE_SCORE // 2 # Score for a tablebase win, minus the plies until checkmate
+INFINITY: int = 1000000
+MAX_PLY: int = 64
+# Scores at or beyond this count plies from the root, they're checkmates or tablebase wins found at most MAX_PLY plies into the search
+DISTANCE_BOUND: int = TABLEBASE_WIN - MAX_PLY - MAX_DISTANCE
+
+# Move ordering buckets; the transposition table's move, captures that don't lose material by static exchange, killers, history,
+# then the captures that do. Captures within a bucket go most valuable victim, least valuable attacker first.
+TT_ORDER: int = 1 << 31
+CAPTURE_ORDER: int = 1 << 30
+KILLER_ORDER: int = 1 << 29
+LOSING_CAPTURE_ORDER: int = -(1 << 30)
+
+# Quiescence search skips a capture when even winning the captured piece outright couldn't lift the score to alpha by this much
+DELTA_MARGIN: int = 200
+
+# How many nodes are searched between checks of the clock
+CHECK_INTERVAL: int = 1024
+
+class SearchAborted(Exception):
+	pass
+
+class SearchResult:
+	# __init__(): Constructor, holds the outcome and the throughput numbers of a single search
+	def __init__(self) -> None:
+		self.best_move: Optional[Tuple[int, int]] = None
+		self.score: int = 0
+		self.depth: int = 0
+		self.nodes: int = 0
+		self.elapsed: float = 0
+		self.tt_hit_rate: float = 0
+
+	# nodesPerSecond(): Returns the search speed
+	def nodesPerSecond(self) -> float:
+		if self.elapsed <= 0:
+			return 0
+		return self.nodes / self.elapsed
+
+	# __str__(): Summarizes the search on one line
+	def __str__(self) -> str:
+		return f'depth {self.depth} score {self.score} nodes {self.nodes} time {self.elapsed:.3f}s nps {self.nodesPerSecond():.0f} tt hits {self.tt_hit_rate:.0%} move {moveName(self.best_move)}'
+
+# evaluate(): Scores the position by material and piece-square tables, from the point of view of the side to move.
+# The position keeps the score up to date as moves are made and unmade, so this is a lookup rather than a scan of the board.
+def evaluate(position: Position) -> int:
+	return position.score if position.side == WHITE else -position.score
+
+# evaluateMaterial(): Scores the position by material alone, from the point of view of the side to move; a baseline to test evaluations against
+def evaluateMaterial(position: Position) -> int:
+	bitboards = position.bitboards
+	score = 0
+	for piece_type in range(PAWN, QUEEN + 1):
+		score += PIECE_VALUES[piece_type] * (bitboards[piece_type].bit_count() - bitboards[8 | piece_type].bit_count())
+	return score if position.side == WHITE else -score
+
+# Evaluations an engine can be built with, by name
+EVALUATIONS: Dict[str, Callable[[Position], int]] = {"pst": evaluate, "material": evaluateMaterial}
+
+# scoreToTable(): Mate and tablebase scores count plies from the root, the table stores them counted from the node instead
+def scoreToTable(score: int, ply: int) -> int:
+	if score >= DISTANCE_BOUND:
+		return score + ply
+	if score <= -DISTANCE_BOUND:
+		return score - ply
+	return score
+
+# scoreFromTable(): Reverses scoreToTable() for a node at the given ply
+def scoreFromTable(score: int, ply: int) -> int:
+	if score >= DISTANCE_BOUND:
+		return score - ply
+	if score <= -DISTANCE_BOUND:
+		return score + ply
+	return score
+
+# tablebaseScore(): Converts a tablebase value (+n win, -n loss, 0 draw, all in plies) into a search score at the given ply
+def tablebaseScore(value: int, ply: int) -> int:
+	if value > 0:
+		return TABLEBASE_WIN - ply - value
+	if value < 0:
+		return -TABLEBASE_WIN + ply - value
+	return 0
+
+class Engine:
+	# __init__(): Constructor, the transposition table is kept between searches. The opening book and endgame tablebases are optional.
+	# Engines searching on several threads can share one table by passing it as tt.
+	# evaluation names one of EVALUATIONS and delta_margin overrides DELTA_MARGIN, so self-play can pit variants against each other.
+	def __init__(self, tt_megabytes: float = 16, tablebases = None, book = None, tt: Optional[TranspositionTable] = None,
+				 evaluation: str = "pst", delta_margin: int = DELTA_MARGIN) -> None:
+		if evaluation not in EVALUATIONS:
+			raise ValueError(f"Unknown evaluation {evaluation}, expected one of {', '.join(EVALUATIONS)}")
+		self.tt: TranspositionTable = tt if tt is not None else TranspositionTable(tt_megabytes)
+		self.evaluate: Callable[[Position], int] = EVALUATIONS[evaluation]
+		self.delta_margin: int = delta_margin
+		self.tablebases = tablebases
+		self.book = book
+		self.killers: List[List[Optional[Tuple[int, int]]]] = [[None, None] for _ in range(MAX_PLY)]
+		self.history: List[List[int]] = [[0] * (DIMENSIONS * DIMENSIONS) for _ in range(DIMENSIONS * DIMENSIONS)]
+		self.nodes: int = 0
+		self.tt_probes: int = 0 # Table probes and hits of this engine's current search, the table's own counters are shared
+		self.tt_hits: int = 0
+		self.deadline: Optional[float] = None
+		self.node_limit: Optional[int] = None
+		self.stop_check: Optional[Callable[[], bool]] = None # Polled with the clock; returning True cancels the search, depth 1 included
+
+	# search(): Iterative deepening search, stops after the time budget (seconds), node budget or depth is used up.
+	# At least depth 1 always completes so there is a move to play, unless stop_check cancels it.
+	def search(self, position: Position, time_limit: Optional[float] = None, node_limit: Optional[int] = None,
+			   max_depth: int = MAX_PLY, report = None) -> SearchResult:
+		position = position.copy() # Never disturb the caller's position
+		result = SearchResult()
+		start = time.perf_counter()
+		self.resetSearch()
+
+		root_moves = position.generateMoves()
+		if not root_moves:
+			return result
+		result.best_move = root_moves[0]
+
+		if self.shortcutMove(position, root_moves, result):
+			result.elapsed = time.perf_counter() - start
+			return result
+
+		for depth in range(1, max_depth + 1):
+			try:
+				score, best_move = self.searchRoot(position, root_moves, depth)
+			except SearchAborted:
+				break
+
+			result.best_move = best_move
+			result.score = score
+			result.depth = depth
+			result.nodes = self.nodes
+			result.elapsed = time.perf_counter() - start
+			if report is not None:
+				report(result)
+
+			# Search the best move first in the next iteration
+			root_moves.remove(best_move)
+			root_moves.insert(0, best_move)
+
+			if abs(score) >= MATE_SCORE - MAX_PLY:
+				break # Found a forced checkmate, deeper searches won't change that
+
+			# Only the first iteration runs unlimited, the budgets apply from here on
+			if depth == 1:
+				if time_limit is not None:
+					self.deadline = start + time_limit
+				self.node_limit = node_limit
+			if self.deadline is not None and time.perf_counter() >= self.deadline:
+				break
+			if self.node_limit is not None and self.nodes >= self.node_limit:
+				break
+
+		result.nodes = self.nodes
+		result.elapsed = time.perf_counter() - start
+		result.tt_hit_rate = self.tt_hits / self.tt_probes if self.tt_probes else 0
+		COUNTERS.searches += 1
+		COUNTERS.search_nodes += result.nodes
+		return result
+
+	# resetSearch(): Clears the per-search counters, limits and killer moves, and ages the history table
+	def resetSearch(self) -> None:
+		self.nodes = 0
+		self.tt_probes = 0
+		self.tt_hits = 0
+		self.deadline = None
+		self.node_limit = None
+		self.killers = [[None, None] for _ in range(MAX_PLY)]
+		self.history = [[value >> 3 for value in row] for row in self.history]
+
+	# searchRoot(): Searches every root move to the given depth, returns the best score and move
+	def searchRoot(self, position: Position, root_moves: List[Tuple[int, int]], depth: int) -> Tuple[int, Tuple[int, int]]:
+		alpha = -INFINITY
+		beta = INFINITY
+		best_move = root_moves[0]
+
+		for from_sq, to_sq in root_moves:
+			captured = position.makeMove(from_sq, to_sq)
+			score = -self.negamax(position, depth - 1, -beta, -alpha, 1)
+			position.unmakeMove(from_sq, to_sq, captured)
+
+			if score > alpha:
+				alpha = score
+				best_move = (from_sq, to_sq)
+
+		self.tt.store(position.key, depth, EXACT, scoreToTable(alpha, 0), packMove(*best_move))
+		return alpha, best_move
+
+	# negamax(): Alpha-beta search, returns the score from the point of view of the side to move
+	def negamax(self, position: Position, depth: int, alpha: int, beta: int, ply: int) -> int:
+		self.nodes += 1
+		if self.nodes % CHECK_INTERVAL == 0:
+			self.checkLimits()
+
+		if self.tablebases is not None and position.occupied().bit_count() <= self.tablebases.max_pieces:
+			value = self.tablebases.probe(position)
+			if value is not None:
+				return tablebaseScore(value, ply)
+
+		if depth <= 0:
+			return self.quiescence(position, alpha, beta, ply)
+		if ply >= MAX_PLY - 1:
+			return self.evaluate(position)
+
+		# A deep enough stored result may settle this node outright, otherwise its move is searched first
+		tt_move = None
+		entry = self.tt.probe(position.key)
+		self.tt_probes += 1
+		if entry is not None:
+			self.tt_hits += 1
+			entry_depth, flag, entry_score, packed_move = entry
+			if packed_move != NO_MOVE:
+				tt_move = unpackMove(packed_move)
+			if entry_depth >= depth:
+				entry_score = scoreFromTable(entry_score, ply)
+				if flag == EXACT:
+					return entry_score
+				if flag == LOWER_BOUND and entry_score >= beta:
+					return entry_score
+				if flag == UPPER_BOUND and entry_score <= alpha:
+					return entry_score
+
+		moves = position.generateMoves()
+		if not moves:
+			return -MATE_SCORE + ply if position.inCheck() else 0 # Checkmated, or stalemate which is a draw
+
+		killers = self.killers[ply]
+		history = self.history
+		moves.sort(key = lambda move: TT_ORDER if move == tt_move else self.moveOrder(position, move, killers, history), reverse = True)
+
+		original_alpha = alpha
+		best_score = -INFINITY
+		best_move = moves[0]
+		for move in moves:
+			from_sq, to_sq = move
+			captured = position.makeMove(from_sq, to_sq)
+			score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+			position.unmakeMove(from_sq, to_sq, captured)
+
+			if score > best_score:
+				best_score = score
+				best_move = move
+				if score > alpha:
+					alpha = score
+					if score >= beta:
+						# Quiet moves that cause a cutoff are remembered as killers and in the history table
+						if captured == EMPTY:
+							if killers[0] != move:
+								killers[1] = killers[0]
+								killers[0] = move
+							history[from_sq][to_sq] += depth * depth
+						break
+
+		if best_score <= original_alpha:
+			flag = UPPER_BOUND
+		elif best_score >= beta:
+			flag = LOWER_BOUND
+		else:
+			flag = EXACT
+		self.tt.store(position.key, depth, flag, scoreToTable(best_score, ply), packMove(*best_move))
+
+		return best_score
+
+	# quiescence(): Searches captures only until the position is quiet, so leaves aren't scored halfway through an exchange.
+	# The side to move may stand pat on the static score instead; in check it can't, and every evasion is searched.
+	# Captures are tried best static exchange first, and those that lose material by it are pruned.
+	def quiescence(self, position: Position, alpha: int, beta: int, ply: int) -> int:
+		self.nodes += 1
+		if self.nodes % CHECK_INTERVAL == 0:
+			self.checkLimits()
+
+		if ply >= MAX_PLY - 1:
+			return self.evaluate(position)
+
+		if position.inCheck():
+			moves = position.generateMoves()
+			if not moves:
+				return -MATE_SCORE + ply
+			killers = self.killers[ply]
+			history = self.history
+			moves.sort(key = lambda move: self.moveOrder(position, move, killers, history), reverse = True)
+			best_score = -INFINITY
+		else:
+			best_score = self.evaluate(position)
+			if best_score >= beta:
+				return best_score
+			alpha = max(alpha, best_score)
+
+			mailbox = position.mailbox
+			ordered = []
+			for move in position.generateMoves(captures_only = True):
+				if best_score + PIECE_VALUES[mailbox[move[1]] & 7] + self.delta_margin <= alpha:
+					continue
+				gain = position.staticExchange(*move)
+				if gain >= 0:
+					ordered.append((gain, move))
+			ordered.sort(reverse = True)
+			moves = [move for _, move in ordered]
+
+		for from_sq, to_sq in moves:
+			captured = position.makeMove(from_sq, to_sq)
+			score = -self.quiescence(position, -beta, -alpha, ply + 1)
+			position.unmakeMove(from_sq, to_sq, captured)
+
+			if score > best_score:
+				best_score = score
+				if score > alpha:
+					alpha = score
+					if score >= beta:
+						break
+		return best_score
+
+	# moveOrder(): Returns the sort key of a move; winning and even captures, then killer moves, then the history heuristic, then losing captures.
+	# A capture of a piece worth at least the capturer can't lose material, so only the others pay for a static exchange evaluation.
+	@staticmethod
+	def moveOrder(position: Position, move: Tuple[int, int], killers: List[Optional[Tuple[int, int]]], history: List[List[int]]) -> int:
+		mailbox = position.mailbox
+		captured = mailbox[move[1]]
+		if captured != EMPTY:
+			victim = PIECE_VALUES[captured & 7]
+			if victim < PIECE_VALUES[mailbox[move[0]] & 7] and position.staticExchange(*move) < 0:
+				return LOSING_CAPTURE_ORDER + victim * 16 - (mailbox[move[0]] & 7)
+			return CAPTURE_ORDER + victim * 16 - (mailbox[move[0]] & 7)
+		if move == killers[0] or move == killers[1]:
+			return KILLER_ORDER
+		return history[move[0]][move[1]]
+
+	# checkLimits(): Aborts the search once the time or node budget is spent, or when stop_check asks it to
+	def checkLimits(self) -> None:
+		if self.deadline is not None and time.perf_counter() >= self.deadline:
+			raise SearchAborted()
+		if self.node_limit is not None and self.nodes >= self.node_limit:
+			raise SearchAborted()
+		if self.stop_check is not None and self.stop_check():
+			raise SearchAborted()
+
+	# shortcutMove(): Fills in the result without searching if the opening book or the tablebases know the position, returns whether they did
+	def shortcutMove(self, position: Position, root_moves: List[Tuple[int, int]], result: SearchResult) -> bool:
+		if self.book is not None:
+			book_move = self.book.pickMove(position)
+			if book_move in root_moves:
+				result.best_move = book_move
+				return True
+
+		if self.tablebases is not None:
+			tablebase_result = self.tablebaseMove(position)
+			if tablebase_result is not None:
+				result.best_move, result.score = tablebase_result
+				result.nodes = len(root_moves)
+				return True
+
+		return False
+
+	# tablebaseMove(): Picks the best root move using the tablebases, returns (move, score) or None if they don't cover every reply
+	def tablebaseMove(self, position: Position) -> Optional[Tuple[Tuple[int, int], int]]:
+		if position.occupied().bit_count() > self.tablebases.max_pieces:
+			return None
+
+		best_move = None
+		best_score = -INFINITY
+		for from_sq, to_sq in position.generateMoves():
+			captured = position.makeMove(from_sq, to_sq)
+			if position.isCheckmate():
+				score = MATE_SCORE - 1 # Mates right away
+			else:
+				value = self.tablebases.probe(position)
+				score = None if value is None else -tablebaseScore(value, 1)
+			position.unmakeMove(from_sq, to_sq, captured)
+
+			if score is None:
+				return None
+			if score > best_score:
+				best_score = score
+				best_move = (from_sq, to_sq)
+
+		return best_move, best_score
+
+	# expectedReply(): The reply to a move that the transposition table holds, if any; the move to ponder on after playing it
+	def expectedReply(self, position: Position, move: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+		captured = position.makeMove(*move)
+		entry = self.tt.probe(position.key)
+		reply = None
+		if entry is not None and entry[3] != NO_MOVE and unpackMove(entry[3]) in position.generateMoves():
+			reply = unpackMove(entry[3])
+		position.unmakeMove(*move, captured)
+		return reply
+
+	# playMove(): Searches the current position of a Game, or of the Board drawing one, and plays the best move on it
+	def playMove(self, game, time_limit: Optional[float] = None, node_limit: Optional[int] = None) -> SearchResult:
+		result = self.search(game.position, time_limit, node_limit)
+		if result.best_move is not None:
+			game.makeMove(Move(*result.best_move))
+		return result
@@ -0,0 +1,69 @@
+# evaluation.py: Material and 6x6 piece-square tables, combined into one table that Position keeps a running score with.
+# Imports nothing, so the position can update its score in makeMove() without loading the engine.
+# Author: Julien Devol
+
+from typing import List, Tuple
+
+# Material values, indexed by piece type
+PIECE_VALUES: Tuple[int, ...] = (100, 300, 500, 900, 0)
+
+# Values for static exchange evaluation; the king is worth more than everything else together, so no exchange ever ends with it taken
+EXCHANGE_VALUES: Tuple[int, ...] = (100, 300, 500, 900, 10000)
+
+# Piece-square bonuses for White, indexed by square like the position: row 0 is Black's back rank at the top.
+# Black uses them mirrored top to bottom.
+PAWN_TABLE: Tuple[int, ...] = (
+	 0,   0,   0,   0,   0,   0,
+	30,  30,  35,  35,  30,  30,
+	10,  15,  25,  25,  15,  10,
+	 5,   5,  15,  15,   5,   5,
+	 0,   0,   0,   0,   0,   0,
+	 0,   0,   0,   0,   0,   0,
+)
+KNIGHT_TABLE: Tuple[int, ...] = (
+	-30, -15, -10, -10, -15, -30,
+	-15,   0,  10,  10,   0, -15,
+	-10,  10,  20,  20,  10, -10,
+	-10,  10,  20,  20,  10, -10,
+	-15,   0,  10,  10,   0, -15,
+	-30, -15, -10, -10, -15, -30,
+)
+ROOK_TABLE: Tuple[int, ...] = (
+	 5,  10,  10,  10,  10,   5,
+	10,  15,  15,  15,  15,  10,
+	 0,   0,   0,   0,   0,   0,
+	 0,   0,   0,   0,   0,   0,
+	-5,   0,   0,   0,   0,  -5,
+	 0,   0,   5,   5,   0,   0,
+)
+QUEEN_TABLE: Tuple[int, ...] = (
+	-10,  -5,  -5,  -5,  -5, -10,
+	 -5,   0,   5,   5,   0,  -5,
+	 -5,   5,  10,  10,   5,  -5,
+	 -5,   5,  10,  10,   5,  -5,
+	 -5,   0,   5,   5,   0,  -5,
+	-10,  -5,  -5,  -5,  -5, -10,
+)
+KING_TABLE: Tuple[int, ...] = (
+	-40, -40, -40, -40, -40, -40,
+	-30, -30, -30, -30, -30, -30,
+	-20, -20, -25, -25, -20, -20,
+	-10, -15, -20, -20, -15, -10,
+	  5,   0, -10, -10,   0,   5,
+	 10,  15,   0,   0,  15,  10,
+)
+SQUARE_TABLES: Tuple[Tuple[int, ...], ...] = (PAWN_TABLE, KNIGHT_TABLE, ROOK_TABLE, QUEEN_TABLE, KING_TABLE)
+
+# _pieceSquareTable(): Material plus the square bonus of every piece code on every square, from White's point of view,
+# so Black's entries are negative and a position's score is the sum of the entries of its pieces
+def _pieceSquareTable() -> List[List[int]]:
+	table = [[0] * 36 for _ in range(16)]
+	for piece_type, bonuses in enumerate(SQUARE_TABLES):
+		for sq in range(36):
+			row, col = divmod(sq, 6)
+			table[piece_type][sq] = PIECE_VALUES[piece_type] + bonuses[sq]
+			table[8 | piece_type][sq] = -(PIECE_VALUES[piece_type] + bonuses[(5 - row) * 6 + col])
+	return table
+
+# Indexed by piece code and then square
+PIECE_SQUARE: List[List[int]] = _pieceSquareTable()
@@ -0,0 +1,72 @@
+# frametimes.py: Collects frame times into histograms and a rolling window for percentiles, to show how long the window goes between frames and so how late it reacts to input.
+# Author: Julien Devol
+
+from bisect import bisect_left
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+# Upper edges of the histogram buckets in milliseconds; a frame at 60 FPS takes about 16.7 ms
+BUCKET_EDGES_MS: Tuple[float, ...] = (8, 16, 17, 20, 25, 33, 50, 100, 250, 500, 1000)
+BAR_WIDTH: int = 40 # Characters in the longest bar of report()
+WINDOW_FRAMES: int = 300 # Frames FrameWindow keeps, five seconds at 60 FPS
+
+class FrameHistogram:
+	# __init__(): Constructor, starts with no frames
+	def __init__(self, label: str) -> None:
+		self.label: str = label
+		self.counts: List[int] = [0] * (len(BUCKET_EDGES_MS) + 1) # The last bucket holds everything slower than the last edge
+		self.frames: int = 0
+		self.total_ms: float = 0
+		self.worst_ms: float = 0
+
+	# add(): Records one frame's duration in milliseconds
+	def add(self, milliseconds: float) -> None:
+		self.counts[bisect_left(BUCKET_EDGES_MS, milliseconds)] += 1
+		self.frames += 1
+		self.total_ms += milliseconds
+		self.worst_ms = max(self.worst_ms, milliseconds)
+
+	# report(): Prints the histogram as text, one bar per non-empty bucket
+	def report(self) -> str:
+		if not self.frames:
+			return f"{self.label}: no frames"
+
+		lines = [f"{self.label}: {self.frames} frames, mean {self.total_ms / self.frames:.1f} ms, worst {self.worst_ms:.0f} ms"]
+		tallest = max(self.counts)
+		lower = 0
+		for index, count in enumerate(self.counts):
+			upper = BUCKET_EDGES_MS[index] if index < len(BUCKET_EDGES_MS) else None
+			if count:
+				span = f"{lower:>4g}-{upper:<4g} ms" if upper is not None else f"{lower:>4g}+     ms"
+				bar = '#' * max(1, count * BAR_WIDTH // tallest)
+				lines.append(f"  {span} {count:6d} {bar}")
+			lower = upper
+		return "\n".join(lines)
+
+class FrameWindow:
+	# __init__(): Constructor, keeps the durations of the last frames, and of the named sections of each, for percentiles
+	def __init__(self, size: int = WINDOW_FRAMES) -> None:
+		self.frames: Deque[float] = deque(maxlen = size)
+		self.sections: Dict[str, Deque[float]] = {}
+		self.size: int = size
+
+	# add(): Records one frame's duration in milliseconds
+	def add(self, milliseconds: float) -> None:
+		self.frames.append(milliseconds)
+
+	# addSection(): Records how long one part of the current frame took, in milliseconds
+	def addSection(self, name: str, milliseconds: float) -> None:
+		if name not in self.sections:
+			self.sections[name] = deque(maxlen = self.size)
+		self.sections[name].append(milliseconds)
+
+	# percentiles(): The given percentiles of the frames in the window, nearest-rank; zeros while it's empty
+	def percentiles(self, *percents: float) -> Tuple[float, ...]:
+		if not self.frames:
+			return tuple(0.0 for _ in percents)
+		ordered = sorted(self.frames)
+		return tuple(ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))] for percent in percents)
+
+	# sectionMeans(): The mean duration of every section over the window, in the order they were first recorded
+	def sectionMeans(self) -> Dict[str, float]:
+		return {name: sum(times) / len(times) for name, times in self.sections.items() if times}
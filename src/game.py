@@ -1,89 +1,135 @@
-# game.py: Defines all game interactions, such as the board, its squares, its pieces, and how these pieces are defined.
+# game.py: Draws a game of Los Alamos chess and handles its interactions: the board, its squares, and the pieces on them.
+# The rules, moves and move history live in rules.py, which this wraps; only this layer needs PyGame.
 # Author: Julien Devol
 
+import math
 import pygame
-import os
-import sys
+from collections import OrderedDict
 from typing import List, Tuple, Optional
-
-# resource_path(): Used to determine resource paths when using PyInstaller
-def resource_path(relative_path):
-	try:
-		base_path = sys._MEIPASS
-	except Exception:
-		base_path = os.path.abspath(".")
-
-	return os.path.join(base_path, relative_path)
+from src.position import squareIndex
+from src.rules import Game, Move
+from src.sprites import SPRITES
+from src.counters import COUNTERS
+from src.camera import zoomScale
 
 DIMENSIONS: int = 6
-pygame.font.init()
-game_font = pygame.font.SysFont('Times New Roman', 32, bold = True)
+_game_font = None
+_stats_fonts = {} # Font of the move statistics by pixel size
+
+# gameFont(): The font of the turn text, created the first time anything is drawn since finding system fonts is slow
+def gameFont():
+	global _game_font
+	if _game_font is None:
+		pygame.font.init()
+		_game_font = pygame.font.SysFont('Times New Roman', 32, bold = True)
+	return _game_font
+
+# statsFont(): The small font the move statistics are written in on highlighted squares, PyGame's bundled one since it's quick to load
+def statsFont(size: int):
+	if size not in _stats_fonts:
+		pygame.font.init()
+		_stats_fonts[size] = pygame.font.Font(None, size)
+	return _stats_fonts[size]
 
 class Board:
 	SCALE_MODIFIER: float = 0.80
 	WHITE: Tuple[int, int, int] = (240, 217, 181)
 	BLACK: Tuple[int, int, int] = (181, 136, 99)
+	TRANSPARENT_KEY: Tuple[int, int, int] = (255, 0, 255) # Color key of the cached surface, so its edges show what's behind
+	CACHE_BYTES: int = 32 << 20 # Pixel memory of the board surfaces kept for zoom levels, the least recently drawn are dropped past it; a zoom in and out usually stays within it
 
-	turn: int = 1
-	game_over: bool = False
-	winner: str = None
-
-	# __init__(): Constructor, sets up board info using the passed screen
-	def __init__(self, screen, camera) -> None:
+	# __init__(): Constructor, sets up board info using the passed screen; draws the passed game or a new one.
+	# With a PositionDatabase, the squares a selected piece can move to show how often that move was played and how it scored.
+	def __init__(self, screen, camera, game: Optional[Game] = None, database = None) -> None:
 		self.screen = screen
 		self.camera = camera
+		self.game: Game = game if game is not None else Game()
+		self.database = database
 		self.squares: List[List[Square]] = []
-		self.move_history: List[Move] = []
-		self.current_history_index: int = -1
-		Board.game_over = False
-		Board.winner = None
-		Board.turn = 1
+		self.selected: Optional[Square] = None # Square of the currently selected piece
+		self.highlighted: List[Square] = [] # Squares the selected piece can move to
 
-		self.board_size: float = min(self.camera.getWidth(), self.camera.getHeight()) * self.SCALE_MODIFIER
+		self.base_board_size: float = min(self.camera.getWidth(), self.camera.getHeight()) * self.SCALE_MODIFIER
+		self.board_size: float = self.base_board_size # At the zoom level last drawn
 		self.square_size: float = self.board_size / 6
+		self.level: int = 0
+
+		# The squares and pieces are drawn once into a surface per zoom level, and again only after invalidate().
+		# Each is kept with the version of the board it shows, so zooming back to a level just drawn costs one blit.
+		self.levels: OrderedDict[int, Tuple[pygame.Surface, int]] = OrderedDict() # Least recently drawn first
+		self.version: int = 0 # Goes up with every invalidate()
+		self.surface = None # The surface of the level being drawn
+		self.surface_key: Tuple[int, int] = (0, -1) # The level and version it shows
+		self.text_message: Optional[str] = None # The turn text, rendered again only when it changes
+		self.text_surface = None
 
 		self.initSquares()
 		self.draw(camera)
-		
-	# makeMove(): Adds a move to history and executes it
-	def makeMove(self, move: 'Move') -> None:
-		if Board.game_over:
-			return # Don't allow moves if the game is over!
-		
-		# If you aren't at the end of your move history, remove all future moves since you're currently changing that history
-		if self.current_history_index < len(self.move_history) - 1:
-			self.move_history = self.move_history[:self.current_history_index + 1]
-			
-		self.move_history.append(move)
-		self.current_history_index = len(self.move_history) - 1
-		move.execute()
+
+	# position: The game's bitboard position, which all move generation runs on
+	@property
+	def position(self):
+		return self.game.position
+
+	# makeMove(): Plays a move in the game and moves the pieces to match
+	def makeMove(self, move: Move) -> None:
+		self.game.makeMove(move)
+		self.syncPieces()
 		
 	# undoMove(): Goes back one move in the history
 	def undoMove(self) -> None:
-		if self.current_history_index >= 0:
-			# If game was over (a king was captured), set it back to active
-			Board.game_over = False
-			Board.winner = None
-			
-			self.move_history[self.current_history_index].undo()
-			self.current_history_index -= 1
+		self.game.undoMove()
+		self.syncPieces()
 			
 	# redoMove(): Goes forward one move in the history
 	def redoMove(self) -> None:
-		if self.current_history_index < len(self.move_history) - 1:
-			self.current_history_index += 1
-			self.move_history[self.current_history_index].execute()
-			
-			# Make sure to check if this redo resulted in a king capture
-			move = self.move_history[self.current_history_index]
-			if move.captured_piece is not None and move.captured_piece.type == "king":
-				winner = "White" if move.captured_piece.color == 'b' else "Black"
-				self.endGame(winner)
-			
-	# endGame(): Ends the game and declares a winner!
-	def endGame(self, winner: str) -> None:
-		Board.game_over = True
-		Board.winner = winner
+		self.game.redoMove()
+		self.syncPieces()
+
+	# seek(): Jumps to any ply of the game's history
+	def seek(self, ply: int) -> None:
+		self.game.seek(ply)
+		self.syncPieces()
+
+	# setGame(): Replaces the game being drawn, e.g. with one loaded from an archive
+	def setGame(self, game: Game) -> None:
+		self.game = game
+		self.clearSelection()
+		self.syncPieces()
+
+	# invalidate(): Marks the cached board surfaces out of date; anything that changes a square's piece or highlight calls this
+	def invalidate(self) -> None:
+		self.version += 1
+
+	# setLevel(): Resizes the squares for a camera zoom level
+	def setLevel(self, level: int) -> None:
+		self.level = level
+		self.board_size = self.base_board_size * zoomScale(level)
+		self.square_size = self.board_size / 6
+		for row in self.squares:
+			for square in row:
+				square.size = self.square_size
+				square.updatePosition()
+
+	# clearLevels(): Drops every cached board surface
+	def clearLevels(self) -> None:
+		self.levels.clear()
+		self.surface = None
+
+	# unhighlightAll(): Removes the move highlighting from every highlighted square
+	def unhighlightAll(self) -> None:
+		for square in self.highlighted:
+			square.unhighlight()
+		self.highlighted.clear()
+		self.invalidate()
+
+	# clearSelection(): Unselects the selected piece and removes all highlighting
+	def clearSelection(self) -> None:
+		if self.selected is not None:
+			self.selected.unselect_highlight()
+		self.selected = None
+		self.unhighlightAll()
+		self.invalidate()
 		
 	# initSquares(): Initializes every square's values and its position in the board
 	def initSquares(self) -> None:
@@ -93,34 +139,90 @@ class Board:
 				is_even = (row + col) % 2 == 0
 				color = self.WHITE if is_even else self.BLACK
 				new_square: Square = Square(row, col, self.square_size, color)
-				self.initializePiece(new_square, row, col)
 				square_row.append(new_square)
 		
 			self.squares.append(square_row)
 
-	# draw(): Draws the squares that compose the board and the upper UI.
-	def draw(self, camera) -> None:
-		for row in range(len(self.squares)):
-			for col in range(len(self.squares[row])):
-				self.squares[row][col].draw(camera.getScreen(), camera.getX(), camera.getY())
+		self.syncPieces()
+
+	# syncPieces(): Puts a Piece on every square to match the game's position, keeping the pieces that are already right
+	def syncPieces(self) -> None:
+		self.invalidate()
+		for row in self.squares:
+			for square in row:
+				piece_name = self.game.pieceAt(squareIndex(square.row, square.col))
+				if piece_name is None:
+					square.setPiece(None)
+				elif square.piece is None or (square.piece.color, square.piece.type) != piece_name:
+					square.setPiece(Piece.createPiece(piece_name[0], piece_name[1], square))
+
+	# renderSurface(): Picks the cached surface of the current zoom level, drawing every square and piece into it if it's out of date
+	def renderSurface(self) -> None:
+		entry = self.levels.get(self.level)
+		if entry is not None:
+			self.levels.move_to_end(self.level)
+			if entry[1] == self.version:
+				self.surface = entry[0]
+				self.surface_key = (self.level, self.version)
+				return
 
-		if Board.game_over:
-			message = f"Game Over. {Board.winner} wins!"
-			text_color = (255, 215, 0) # Gold
+		if entry is None:
+			size = math.ceil(self.board_size)
+			surface = pygame.Surface((size, size))
+			surface.set_colorkey(self.TRANSPARENT_KEY)
+			if pygame.display.get_surface() is not None:
+				surface = surface.convert() # Match the screen's pixel format so blits are plain copies
 		else:
-			# Determine current player based on turn #
-			current_player = "White" if Board.turn % 2 == 1 else "Black"
-			message = f'Turn {Board.turn} - {current_player}\'s Turn'
-			text_color = (255, 255, 255) # White
-			
-		text_surface = game_font.render(message, False, text_color)
-		text_rect = text_surface.get_rect()
+			surface = entry[0]
+
+		surface.fill(self.TRANSPARENT_KEY)
+		for row in self.squares:
+			for square in row:
+				square.draw(surface)
+		self.surface = surface
+		self.surface_key = (self.level, self.version)
+		self.levels[self.level] = (surface, self.version)
+		cached_bytes = sum(cached.get_width() * cached.get_height() * cached.get_bytesize() for cached, _ in self.levels.values())
+		while cached_bytes > self.CACHE_BYTES and len(self.levels) > 1:
+			dropped, _ = self.levels.popitem(last = False)[1]
+			cached_bytes -= dropped.get_width() * dropped.get_height() * dropped.get_bytesize()
+
+	# statusText(): The message above the board and its color
+	def statusText(self) -> Tuple[str, Tuple[int, int, int]]:
+		if self.game.game_over:
+			message = f"Checkmate. {self.game.winner} wins!" if self.game.winner else "Stalemate. It's a draw!"
+			return message, (255, 215, 0) # Gold
+
+		# Determine current player based on turn #
+		current_player = "White" if self.game.currentColor() == 'w' else "Black"
+		message = f'Turn {self.game.turn} - {current_player}\'s Turn'
+		if self.game.position.inCheck():
+			message += " - Check!"
+		return message, (255, 255, 255) # White
+
+	# draw(): Draws the board at the camera's zoom level and the upper UI; two blits unless a move or a highlight changed the board,
+	# the zoom reached a level not drawn recently or the text changed. Returns the screen rects it drew over, for updating only those parts of the display.
+	def draw(self, camera) -> List[pygame.Rect]:
+		COUNTERS.board_draws += 1
+		level = camera.getLevel()
+		if level != self.level:
+			self.setLevel(level)
+		if self.surface is None or self.surface_key != (self.level, self.version):
+			self.renderSurface()
+
+		message, text_color = self.statusText()
+		if message != self.text_message:
+			self.text_surface = gameFont().render(message, False, text_color)
+			self.text_message = message
+
+		screen = camera.getScreen()
+		board_rect = screen.blit(self.surface, (camera.getX(), camera.getY()))
+		text_rect = self.text_surface.get_rect()
 		text_rect.centerx = camera.getWidth() / 2
 		text_rect.top = camera.getHeight() / 24
+		return [board_rect, screen.blit(self.text_surface, text_rect)]
 
-		camera.getScreen().blit(text_surface, text_rect)
-
-	# getSquareAt(): Get a reference to the square underneath the current mouse_pos_xy.
+	# getSquareAt(): Get a reference to the square underneath the current mouse_pos_xy, at the zoom level last drawn so it matches the screen.
 	def getSquareAt(self, mouse_pos_xy: Tuple[float, float]) -> 'Square':
 		row = int((mouse_pos_xy[1] - self.camera.getY()) // self.square_size)
 		col = int((mouse_pos_xy[0] - self.camera.getX()) // self.square_size)
@@ -131,35 +233,9 @@ class Board:
 		
 		return None
 
-	# initializePiece(): Initializes pieces in their default positions
-	def initializePiece(self, square: 'Square', row: int, col: int):
-		if 2 <= row <= 3:
-			return # No pieces in the middle two rows
-		
-		color = 'b' if row < 2 else 'w'
-		piece_type = None
-
-		# Determine piece type based on position
-		if row == 1 or row == 4:
-			piece_type = "pawn"
-		else:
-			if col == 0 or col == 5:
-				piece_type = "rook"
-			if col == 1 or col == 4:
-				piece_type = "knight"
-			if col == 2:
-				piece_type = "queen"
-			if col == 3:
-				piece_type = "king"
-
-		# Create piece using the factory method
-		if piece_type:
-			square.piece = Piece.createPiece(color, piece_type, self.screen, square)
-
 
 class Square:
-	current_selected: 'Square' = None # Currently selected piece
-	highlighted: List['Square'] = [] # Currently highlighted squares
+	__slots__ = ("x", "y", "size", "row", "col", "color", "base_color", "highlighted_color", "piece", "is_highlighted", "is_selected", "stats_text")
 	HIGHLIGHT_EMPTY: Tuple[int, int, int] = (144, 238, 144)  # Light green
 	HIGHLIGHT_CAPTURE: Tuple[int, int, int] = (255, 128, 128)  # Light red
 	HIGHLIGHT_SELECTED: Tuple[int, int, int] = (100, 149, 237)  # Cornflower blue
@@ -177,6 +253,7 @@ class Square:
 		self.piece: Optional[Piece] = None
 		self.is_highlighted: bool = False
 		self.is_selected: bool = False
+		self.stats_text: Optional[str] = None # Database statistics of the move here while it's highlighted
 		
 		self.updatePosition()
 
@@ -192,11 +269,10 @@ class Square:
 			# For capturable squares; a light red tint
 			self.color = (r * 0.8 + 50, g * 0.8, b * 0.8)
 
-		Square.highlighted.append(self)
-
 	# unhighlight(): Remove move highlighting from this square
 	def unhighlight(self):
 		self.is_highlighted = False
+		self.stats_text = None
 		if not self.is_selected:
 			self.color = self.base_color
 
@@ -211,15 +287,9 @@ class Square:
 		self.is_selected = False
 		self.color = self.base_color # Reset the color
 
-	# unhighlight_all(): Static method to unhighlight all highlighted squares
-	@staticmethod
-	def unhighlight_all():
-		for square in Square.highlighted:
-			square.unhighlight()
-		Square.highlighted.clear()
-		
 	# draw(): Draws a square to the screen at the specified coordinates
 	def draw(self, screen, cam_x = 0, cam_y = 0) -> None:
+		COUNTERS.square_draws += 1
 		offset_x = self.x + cam_x
 		offset_y = self.y + cam_y
 
@@ -234,6 +304,11 @@ class Square:
 			circle_color = (50, 150, 50)  # Dark green
 			pygame.draw.circle(screen, circle_color, (circle_x, circle_y), circle_radius)
 		
+		# Write the move's statistics along the bottom edge
+		if self.stats_text is not None:
+			text = statsFont(max(10, int(self.size * 0.2))).render(self.stats_text, True, (30, 30, 30))
+			screen.blit(text, (offset_x + (self.size - text.get_width()) / 2, offset_y + self.size - text.get_height() - 2))
+
 		# If this is the selected square, draw a thicker border!
 		if self.is_selected:
 			border_rect = pygame.Rect(offset_x, offset_y, self.size, self.size)
@@ -246,7 +321,8 @@ class Square:
 	# setPiece(): Set the piece on this square
 	def setPiece(self, piece: Optional["Piece"]) -> None:
 		self.piece = piece
-		self.draw()
+		if piece is not None:
+			piece.parent = self
 
 	# getPiece(): Return the piece on this square
 	def getPiece(self):
@@ -257,95 +333,96 @@ class Square:
 		self.x = self.size * self.col
 		self.y = self.size * self.row
 	
-	# select(): Select this square
-	def select(self, board):
-		if Board.game_over:
+	# select(): Select this square on the given board
+	def select(self, board: Board):
+		if board.game.game_over:
 			return # If the game is over, don't bother selecting anything.
+		board.invalidate() # Every click below changes the selection or highlights
 		
-		current_color = 'w' if Board.turn % 2 == 1 else 'b'
+		current_color = board.game.currentColor()
 		
 		# Unselect if clicked twice
-		if Square.current_selected == self:
-			self.unselect_highlight()
-			self.unselect()
-			Square.unhighlight_all()
+		if board.selected == self:
+			board.clearSelection()
 			return
 		
-		if Square.current_selected is not None:
+		if board.selected is not None:
 			# If this is a highlighted square (valid move), make the move
-			if self in Square.highlighted:
-				from_square = Square.current_selected
-				to_square = self
-				captured_piece = self.piece  # Store the potentially captured piece!
-				
-				move = Move(from_square, to_square, captured_piece)
-				board.makeMove(move)
-				
-				if captured_piece is not None and captured_piece.type == "king":
-					winner = "White" if captured_piece.color == 'b' else "Black"
-					board.endGame(winner)
-				
-				from_square.unselect_highlight()
-				self.unselect()
-				Square.unhighlight_all()
+			if self in board.highlighted:
+				from_square = board.selected
+				move = Move(squareIndex(from_square.row, from_square.col), squareIndex(self.row, self.col))
+				board.makeMove(move) # Also ends the game if this was checkmate or stalemate
+				board.clearSelection()
 				return
 			
 			# If this is a new piece of the SAME color, select it instead
 			if self.piece is not None and self.piece.color == current_color:
-				Square.current_selected.unselect_highlight()
-				Square.unhighlight_all()
-				Square.current_selected = self
+				board.clearSelection()
+				board.selected = self
 				self.select_highlight()
 				self.show_legal_moves(board)
 				return
 			
 			# If this is not a valid move or same color piece, just unselect!
-			Square.current_selected.unselect_highlight()
-			Square.unhighlight_all()
-			Square.current_selected = None
+			board.clearSelection()
 			return
 		
 		if self.piece is not None and self.piece.color == current_color:
-			Square.current_selected = self
+			board.selected = self
 			self.select_highlight()
 			self.show_legal_moves(board)
-
-	# unselect(): Unselect this square
-	def unselect(self):
-		Square.current_selected = None
 		
 	# show_legal_moves(): Show legal moves for the piece on this square
-	def show_legal_moves(self, board):
+	def show_legal_moves(self, board: Board):
 		if self.piece is None:
 			return
+		COUNTERS.legal_move_queries += 1
 			
 		# Unhighlight any previously highlighted squares
-		Square.unhighlight_all()
+		board.unhighlightAll()
 		
-		# Get legal moves from the piece
-		moves = self.piece.get_moves(self, board.squares)
+		# Get legal moves for the piece from the bitboard position
+		moves = board.position.movesFrom(squareIndex(self.row, self.col))
+
+		# Every move played from this position in the database, an indexed lookup by its key
+		stats = {}
+		if board.database is not None:
+			stats = {entry.move: entry for entry in board.database.explore(board.position)}
 		
-		# Highlight each legal move
+		# Highlight each legal move, with its score for the side moving and its game count if it was ever played
 		for move in moves:
-			move.highlight()
+			row, col = divmod(move[1], DIMENSIONS)
+			target = board.squares[row][col]
+			target.highlight()
+			entry = stats.get(move)
+			if entry is not None:
+				score = entry.score(board.position.side)
+				target.stats_text = f"{score:.0%} of {entry.games}" if score is not None else f"{entry.games} games"
+			board.highlighted.append(target)
 
 
 class Piece:
+	__slots__ = ("parent", "color", "type", "sprite")
 	SCALE_MODIFIER = 0.8
 
-	# __init__(): Base constructor for all pieces
-	def __init__(self, color, type, screen, square) -> None:
+	# __init__(): Base constructor for all pieces, the sprite is fetched the first time the piece is drawn
+	def __init__(self, color, type, square) -> None:
 		self.parent: 'Square' = square
 		self.color: str = color
 		self.type = type
 		self.sprite = None
-		self.loadSprite()
-		self.draw(screen)
 
 	# draw(): Draw the piece on the screen
 	def draw(self, screen, cam_x = 0, cam_y = 0) -> None:
-		if self.type is None or self.sprite is None:
+		COUNTERS.piece_draws += 1
+		if self.type is None:
 			return
+
+		# Pick up a differently scaled sprite if the square has changed size
+		if self.sprite is None or self.sprite.get_width() != int(self.parent.size * self.SCALE_MODIFIER):
+			self.loadSprite()
+			if self.sprite is None:
+				return
 	
 		square_size = self.parent.size
 
@@ -357,81 +434,40 @@ class Piece:
 
 		screen.blit(self.sprite, (offset_x, offset_y))
 
-	# loadSprite(): Loads a sprite to represent this Piece
+	# loadSprite(): Fetches the sprite to represent this Piece from the shared cache, scaled to fit its square
 	def loadSprite(self) -> None:
 		if self.type is None:
 			return
 
-		try:
-			path = f'assets/{self.color}_{self.type}.png'
-			new_sprite = pygame.image.load(resource_path(path)).convert_alpha()
-
-			scale_size = int(self.parent.size * self.SCALE_MODIFIER)
-			self.sprite = pygame.transform.scale(new_sprite, (scale_size, scale_size))
-
-		except pygame.error as err:
-			print(f"Error loading image for {self.color}, {self.type}: {err}")
+		scale_size = int(self.parent.size * self.SCALE_MODIFIER)
+		self.sprite = SPRITES.get(self.color, self.type, scale_size)
 			
-	# get_moves(): Base method to be overridden by each piece type;
+	# get_moves(): The square-walking move generation the window used before Position, overridden by each piece type. Pseudo-legal:
+	# moves that leave the king attacked are included. Nothing in the game calls it any more, Position.movesFrom() generates the
+	# legal moves from bitboards; it's kept as the reference 'py -m src.perft --compare' times against.
 	def get_moves(self, square: 'Square', board: List[List['Square']]) -> List['Square']:
 		return []  # Base class returns no moves by default
 		
 	# createPiece(): Factory method to create the appropriate piece type.
 	@staticmethod
-	def createPiece(color: str, piece_type: str, screen, square: 'Square') -> 'Piece':
+	def createPiece(color: str, piece_type: str, square: 'Square') -> 'Piece':
 		if piece_type == "pawn":
-			return Pawn(color, piece_type, screen, square)
+			return Pawn(color, piece_type, square)
 		elif piece_type == "rook":
-			return Rook(color, piece_type, screen, square)
+			return Rook(color, piece_type, square)
 		elif piece_type == "knight":
-			return Knight(color, piece_type, screen, square)
+			return Knight(color, piece_type, square)
 		elif piece_type == "queen":
-			return Queen(color, piece_type, screen, square)
+			return Queen(color, piece_type, square)
 		elif piece_type == "king":
-			return King(color, piece_type, screen, square)
+			return King(color, piece_type, square)
 		else:
-			return Piece(color, piece_type, screen, square)
-		
-class Move:
-	# __init__(): Constructor
-	def __init__(self, from_square: 'Square', to_square: 'Square', 
-				 captured_piece: Optional['Piece'] = None) -> None:
-		self.from_square = from_square
-		self.to_square = to_square
-		self.moved_piece = from_square.piece
-		self.captured_piece = captured_piece
-		self.turn_number = Board.turn
-
-	# undo(): Reverts this move!
-	def undo(self) -> None:
-		# Move piece back to original square
-		self.from_square.piece = self.moved_piece
-		if self.moved_piece is not None:
-			self.moved_piece.parent = self.from_square
+			return Piece(color, piece_type, square)
 		
-		# Restore the captured piece (if any!)
-		self.to_square.piece = self.captured_piece
-		if self.captured_piece is not None:
-			self.captured_piece.parent = self.to_square
-		
-		Board.turn = self.turn_number
-		
-	# execute(): Executes this move.
-	def execute(self) -> None:
-		# Store potentially captured piece
-		self.captured_piece = self.to_square.piece
-		
-		# Move the piece to new square
-		self.to_square.piece = self.moved_piece
-		self.from_square.piece = None
-		
-		if self.moved_piece is not None:
-			self.moved_piece.parent = self.to_square
-		
-		Board.turn += 1
-
 class Pawn(Piece):
-	# get_moves(): Returns all legal moves for this pawn.
+	__slots__ = ()
+
+	# get_moves(): Returns every square this pawn can move to, pseudo-legal.
 	def get_moves(self, square: 'Square', board: List[List['Square']]) -> List['Square']:
 		moves = []
 		direction = -1 if self.color == 'w' else 1  # White can only move up, black can only move down
@@ -452,7 +488,9 @@ class Pawn(Piece):
 		return moves
 
 class Rook(Piece):
-	# get_moves(): Returns all legal moves for this rook.
+	__slots__ = ()
+
+	# get_moves(): Returns every square this rook can move to, pseudo-legal.
 	def get_moves(self, square: 'Square', board: List[List['Square']]) -> List['Square']:
 		moves = []
 		directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]  # Right, down, left, up
@@ -474,7 +512,9 @@ class Rook(Piece):
 		return moves
 
 class Knight(Piece):
-	# get_moves(): Returns all legal moves for this knight.
+	__slots__ = ()
+
+	# get_moves(): Returns every square this knight can move to, pseudo-legal.
 	def get_moves(self, square: 'Square', board: List[List['Square']]) -> List['Square']:
 		moves = []
 
@@ -493,7 +533,9 @@ class Knight(Piece):
 		return moves
 
 class Queen(Piece):
-	# get_moves(): Returns all legal moves for this queen.
+	__slots__ = ()
+
+	# get_moves(): Returns every square this queen can move to, pseudo-legal.
 	def get_moves(self, square: 'Square', board: List[List['Square']]) -> List['Square']:
 		moves = []
 
@@ -517,7 +559,9 @@ class Queen(Piece):
 		return moves
 
 class King(Piece):
-	# get_moves(): Returns all legal moves for this king.
+	__slots__ = ()
+
+	# get_moves(): Returns every square this king can move to, pseudo-legal.
 	def get_moves(self, square: 'Square', board: List[List['Square']]) -> List['Square']:
 		moves = []
 		offsets = [
@@ -533,4 +577,4 @@ class King(Piece):
 				if target_square.piece is None or target_square.piece.color != self.color:
 					moves.append(target_square)
 		
-		return moves
\ No newline at end of file
+		return moves
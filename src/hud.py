@@ -0,0 +1,99 @@
+# hud.py: Draws the optional performance overlay; frame time percentiles, how long each part of a frame takes, and the hot-path counters.
+# Toggled with F3 in the game, or shown from the start with LOS_ALAMOS_HUD=1.
+# Author: Julien Devol
+
+import os
+import time
+import pygame
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from src.counters import COUNTERS
+from src.frametimes import FrameWindow
+
+HUD_VARIABLE: str = "LOS_ALAMOS_HUD"
+REFRESH_SECONDS: float = 0.25 # How often the text is rendered again; rendering it every frame would cost more than much of what it measures
+TEXT_COLOR = (255, 255, 255)
+PANEL_COLOR = (0, 0, 0, 170)
+PADDING: int = 6
+
+class Hud:
+	# __init__(): Constructor, measures from the start even while hidden, so the numbers are there as soon as it's shown
+	def __init__(self, enabled: Optional[bool] = None) -> None:
+		self.enabled: bool = os.environ.get(HUD_VARIABLE) == "1" if enabled is None else enabled
+		self.window: FrameWindow = FrameWindow()
+		self.font = None
+		self.panel = None
+		self.frames: int = 0
+		self.last_refresh: float = time.perf_counter()
+		self.last_frames: int = 0
+		self.last_counts: Dict[str, int] = COUNTERS.snapshot()
+		self.last_search: Optional[str] = None # Depth, nodes and speed of the computer's last move
+
+	# toggle(): Shows or hides the overlay
+	def toggle(self) -> None:
+		self.enabled = not self.enabled
+
+	# section(): Times the code in a with block as one named part of the frame
+	@contextmanager
+	def section(self, name: str) -> Iterator[None]:
+		start = time.perf_counter()
+		yield
+		self.window.addSection(name, (time.perf_counter() - start) * 1000)
+
+	# frameDone(): Records the time since the last frame, in milliseconds
+	def frameDone(self, milliseconds: float) -> None:
+		self.window.add(milliseconds)
+		self.frames += 1
+
+	# searchDone(): Keeps the summary of the computer's last search to show
+	def searchDone(self, summary: str) -> None:
+		self.last_search = summary
+
+	# lines(): The overlay's text, with rates worked out since the previous refresh
+	def lines(self, now: float) -> List[str]:
+		p50, p95, p99 = self.window.percentiles(50, 95, 99)
+		worst = max(self.window.frames, default = 0)
+		counts = COUNTERS.snapshot()
+		elapsed = max(now - self.last_refresh, 1e-6)
+		frames = max(self.frames - self.last_frames, 1)
+		rate = lambda name: (counts[name] - self.last_counts[name]) / elapsed
+		per_frame = lambda name: (counts[name] - self.last_counts[name]) / frames
+		sections = "  ".join(f"{name} {milliseconds:.2f}" for name, milliseconds in self.window.sectionMeans().items())
+
+		lines = [
+			f"frame ms  p50 {p50:.1f}  p95 {p95:.1f}  p99 {p99:.1f}  max {worst:.1f}  ({len(self.window.frames)} frames)",
+			f"mean ms  {sections}",
+			f"draws/frame  board {per_frame('board_draws'):.1f}  squares {per_frame('square_draws'):.1f}  pieces {per_frame('piece_draws'):.1f}",
+			f"move generations {rate('move_generations'):.0f}/s  legal move queries {counts['legal_move_queries']}",
+			f"search nodes {counts['search_nodes']} in {counts['searches']} searches",
+		]
+		if self.last_search is not None:
+			lines.append(f"last search  {self.last_search}")
+		self.last_counts = counts
+		self.last_frames = self.frames
+		return lines
+
+	# render(): Renders the text onto a translucent panel, kept until the next refresh
+	def render(self, now: float) -> None:
+		if self.font is None:
+			pygame.font.init()
+			self.font = pygame.font.Font(None, 20) # PyGame's bundled font, no slow system font lookup
+		texts = [self.font.render(line, True, TEXT_COLOR) for line in self.lines(now)]
+		width = max(text.get_width() for text in texts) + PADDING * 2
+		height = sum(text.get_height() for text in texts) + PADDING * 2
+		self.panel = pygame.Surface((width, height), pygame.SRCALPHA)
+		self.panel.fill(PANEL_COLOR)
+		y = PADDING
+		for text in texts:
+			self.panel.blit(text, (PADDING, y))
+			y += text.get_height()
+		self.last_refresh = now
+
+	# draw(): Draws the overlay in the top left corner if it's shown, and returns the rect it covers
+	def draw(self, screen) -> List[pygame.Rect]:
+		if not self.enabled:
+			return []
+		now = time.perf_counter()
+		if self.panel is None or now - self.last_refresh >= REFRESH_SECONDS:
+			self.render(now)
+		return [screen.blit(self.panel, (0, 0))]
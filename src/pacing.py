@@ -0,0 +1,122 @@
+# pacing.py: Decides when the game draws its next frame. Fixed pacing draws at FRAME_RATE all the time; adaptive pacing only does while
+# something on screen changes, and otherwise sleeps until input arrives or the background's next, much slower, step.
+# LOS_ALAMOS_PACING=fixed brings back the old behaviour, adaptive is the default.
+# Usage: py -m src.pacing [seconds] compares the CPU time of both with a static board.
+# Author: Julien Devol
+
+import os
+import sys
+import time
+import pygame
+from typing import List
+
+PACING_VARIABLE: str = "LOS_ALAMOS_PACING"
+MODES = ("adaptive", "fixed")
+FRAME_RATE: int = 60 # Frames per second while something moves
+BACKGROUND_FRAME_RATE: int = 12 # Frames per second while idle, only for the background's wave; it moves 4 rows per frame at this rate
+
+class FramePacer:
+	# __init__(): Constructor, the mode comes from LOS_ALAMOS_PACING unless given
+	def __init__(self, mode: str = None) -> None:
+		mode = mode or os.environ.get(PACING_VARIABLE) or "adaptive"
+		if mode not in MODES:
+			raise ValueError(f"Unknown pacing mode {mode}, expected one of {', '.join(MODES)}")
+		self.adaptive: bool = mode == "adaptive"
+		self.clock = pygame.time.Clock()
+		self.active: bool = True # Whether the frame being waited for is drawn at the full rate
+		self.idle_frames: int = 0
+		self.active_frames: int = 0
+		self.last_frame: float = time.perf_counter()
+		self.woken_by = None # The event that ended an idle wait, taken off the queue ahead of the rest
+
+	# wait(): Waits until the next frame is due and returns the seconds since the last one. At the full rate this is clock.tick();
+	# when idle it sleeps in the event queue, so input wakes it at once and is handled in the frame drawn right after, by events().
+	def wait(self, active: bool) -> float:
+		self.active = active or not self.adaptive
+		if self.active:
+			self.active_frames += 1
+			delta = self.clock.tick(FRAME_RATE) / 1000
+			self.last_frame = time.perf_counter()
+			return delta
+
+		self.idle_frames += 1
+		timeout = round((1 / BACKGROUND_FRAME_RATE - (time.perf_counter() - self.last_frame)) * 1000)
+		if timeout > 0:
+			event = pygame.event.wait(timeout)
+			if event.type != pygame.NOEVENT:
+				self.woken_by = event
+		self.last_frame = time.perf_counter()
+		return self.clock.tick() / 1000
+
+	# events(): The frame's input, in the order it arrived; replaces pygame.event.get() in a loop paced by wait(),
+	# which may have taken the first event off the queue already
+	def events(self) -> List[pygame.event.Event]:
+		events = pygame.event.get()
+		if self.woken_by is not None:
+			events.insert(0, self.woken_by)
+			self.woken_by = None
+		return events
+
+	# cameraDelta(): The seconds the camera may move for this frame. A key press that wakes an idle wait would otherwise
+	# move the camera for the whole wait at once, so after one it's capped at one full rate frame.
+	def cameraDelta(self, delta: float) -> float:
+		return delta if self.active else min(delta, 1 / FRAME_RATE)
+
+# compareCpuUse(): Runs the game's frame loop with a static board for a while in each mode, with a key press posted from another
+# thread every half second, and prints the CPU time used, the frames drawn and how long each key press took to reach the screen
+def compareCpuUse(seconds: float = 10, width: int = 1280, height: int = 720) -> None:
+	import threading
+	from src.camera import Camera
+	from src.background import GradientBackground
+	from src.game import Board
+
+	pygame.init()
+	screen = pygame.display.set_mode((width, height))
+	camera = Camera(screen)
+	background = GradientBackground(width, height)
+	board = Board(screen, camera)
+	press_interval = 0.5
+
+	for mode in MODES:
+		pacer = FramePacer(mode)
+		stopping = threading.Event()
+		def pressKeys() -> None:
+			while not stopping.wait(press_interval):
+				pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key = pygame.K_F3, posted = time.perf_counter()))
+		presser = threading.Thread(target = pressKeys, daemon = True)
+
+		latencies: List[float] = []
+		drawn_rects = []
+		time_elapsed = 0
+		active = False
+		presser.start()
+		start, cpu_start = time.perf_counter(), time.process_time()
+		while time.perf_counter() - start < seconds:
+			time_elapsed += pacer.wait(active)
+			if background.needsRedraw(time_elapsed):
+				background.draw(screen, time_elapsed)
+				update = None
+			else:
+				for rect in drawn_rects:
+					background.restore(screen, rect)
+				update = drawn_rects
+			events = pacer.events()
+			rects = board.draw(camera)
+			pygame.display.update(update + rects if update is not None else None)
+			drawn_rects = rects
+			latencies += [(time.perf_counter() - event.posted) * 1000 for event in events if hasattr(event, "posted")]
+			active = bool(events)
+		elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+		stopping.set()
+		presser.join()
+		pygame.event.clear()
+
+		latencies.sort()
+		frames = pacer.active_frames + pacer.idle_frames
+		print(f"{mode:>8}: CPU {cpu / elapsed * 100:5.1f}% of a core, {frames / elapsed:5.1f} frames/s, "
+			  f"key to screen median {latencies[len(latencies) // 2]:.1f} ms, worst {latencies[-1]:.1f} ms ({len(latencies)} presses)")
+	pygame.quit()
+
+if __name__ == "__main__":
+	os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # Doesn't need a window to benchmark
+	compareCpuUse(float(sys.argv[1]) if len(sys.argv) > 1 else 10)
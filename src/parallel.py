@@ -0,0 +1,184 @@
+# parallel.py: Defines a multi-core version of the computer opponent, splitting the root moves over a process pool.
+# Usage: py -m src.parallel [depth] [--workers N] [--fen FEN]
+# Author: Julien Devol
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+from src.position import Position
+from src.engine import Engine, SearchResult, SearchAborted, MATE_SCORE, MAX_PLY
+from src.perft import START_FEN
+from src.tablebase import Tablebases
+
+# Every worker process keeps its own engine, so its transposition table carries over between searches
+_worker_engine: Optional[Engine] = None
+_worker_cancelled = None # The shared id of the last cancelled search, if the engine can be cancelled
+
+# _initWorker(): Runs once in every worker process when the pool starts it, every worker maps the tablebases itself
+def _initWorker(tt_megabytes: float, tablebase_directory: Optional[str], cancelled) -> None:
+	global _worker_engine, _worker_cancelled
+	tablebases = Tablebases(tablebase_directory) if tablebase_directory is not None else None
+	_worker_engine = Engine(tt_megabytes, tablebases)
+	_worker_cancelled = cancelled
+
+# _searchChunk(): Runs in a worker; searches a share of the root moves to a fixed depth.
+# The position arrives packed, and only (score, move, nodes, tt hits, tt probes, expected reply) goes back; the reply to the chunk's
+# best move comes from this worker's table, the only one that holds it. Score, move and reply are None if a limit ran out
+# or the search was cancelled, which the worker notices at its clock checks.
+def _searchChunk(packed: bytes, moves: List[Tuple[int, int]], depth: int, time_left: Optional[float], node_limit: Optional[int],
+				 search_id: int) -> Tuple[Optional[int], Optional[Tuple[int, int]], int, int, int, Optional[Tuple[int, int]]]:
+	engine = _worker_engine
+	engine.resetSearch()
+	if time_left is not None:
+		engine.deadline = time.perf_counter() + time_left
+	engine.node_limit = node_limit
+	if _worker_cancelled is not None:
+		engine.stop_check = lambda: search_id <= _worker_cancelled.value
+
+	position = Position.unpack(packed)
+	try:
+		score, best_move = engine.searchRoot(position, moves, depth)
+	except SearchAborted:
+		return None, None, engine.nodes, engine.tt_hits, engine.tt_probes, None
+	return score, best_move, engine.nodes, engine.tt_hits, engine.tt_probes, engine.expectedReply(position, best_move)
+
+class ParallelEngine(Engine):
+	# __init__(): Constructor, starts the worker processes; defaults to one per CPU core.
+	# cancelled is a shared integer Value; the workers stop the running search at their next clock check once it reaches search_id.
+	def __init__(self, workers: Optional[int] = None, tt_megabytes: float = 16, tablebases: Optional[Tablebases] = None, book = None,
+				 cancelled = None) -> None:
+		super().__init__(tt_megabytes, tablebases, book)
+		self.workers: int = workers or os.cpu_count() or 1
+		self.cancelled = cancelled
+		self.search_id: int = 0 # Set by the owner before every search that cancelled can stop
+		self.best_move: Optional[Tuple[int, int]] = None # The last search's move
+		self.best_reply: Optional[Tuple[int, int]] = None # The reply its pool worker expects; this process's own table is never searched into
+		tablebase_directory = tablebases.directory if tablebases is not None else None
+		self.pool = ProcessPoolExecutor(self.workers, initializer = _initWorker,
+										initargs = (tt_megabytes / self.workers, tablebase_directory, cancelled))
+
+	# close(): Shuts the worker processes down
+	def close(self) -> None:
+		self.pool.shutdown(cancel_futures = True)
+
+	# search(): Iterative deepening like Engine.search(), but every depth is split over the workers.
+	# Each worker searches its share of the root moves with a full window, so the best of their results is exact.
+	def search(self, position: Position, time_limit: Optional[float] = None, node_limit: Optional[int] = None,
+			   max_depth: int = MAX_PLY, report = None) -> SearchResult:
+		result = SearchResult()
+		start = time.perf_counter()
+		self.nodes = 0
+		tt_hits = 0
+		tt_probes = 0
+		deadline = None
+		nodes_allowed = None
+
+		self.best_move = None
+		self.best_reply = None
+		root_moves = position.generateMoves()
+		if not root_moves:
+			return result
+		result.best_move = root_moves[0]
+		packed = position.pack()
+
+		if self.shortcutMove(position.copy(), root_moves, result):
+			result.elapsed = time.perf_counter() - start
+			return result
+
+		for depth in range(1, max_depth + 1):
+			if self.stop_check is not None and self.stop_check():
+				break # Cancelled between depths; during one, the workers stop themselves and come back incomplete
+
+			# The previous best move is first in the list, so it leads the first worker's share
+			chunks = [root_moves[index::self.workers] for index in range(min(self.workers, len(root_moves)))]
+
+			time_left = None
+			if deadline is not None:
+				time_left = deadline - time.perf_counter()
+				if time_left <= 0:
+					break
+			chunk_node_limit = None
+			if nodes_allowed is not None:
+				chunk_node_limit = max(1, (nodes_allowed - self.nodes) // len(chunks))
+
+			futures = [self.pool.submit(_searchChunk, packed, chunk, depth, time_left, chunk_node_limit, self.search_id)
+					   for chunk in chunks]
+			outcomes = [future.result() for future in futures]
+			for _, _, nodes, hits, probes, _ in outcomes:
+				self.nodes += nodes
+				tt_hits += hits
+				tt_probes += probes
+			if any(outcome[0] is None for outcome in outcomes):
+				break # A worker ran out of budget or was cancelled, so this depth is incomplete
+
+			score, best_move, _, _, _, reply = max(outcomes, key = lambda outcome: outcome[0])
+			self.best_move = best_move
+			self.best_reply = reply
+			result.best_move = best_move
+			result.score = score
+			result.depth = depth
+			result.nodes = self.nodes
+			result.elapsed = time.perf_counter() - start
+			if report is not None:
+				report(result)
+
+			root_moves.remove(best_move)
+			root_moves.insert(0, best_move)
+
+			if abs(score) >= MATE_SCORE - MAX_PLY:
+				break
+
+			# Only the first iteration runs unlimited, the budgets apply from here on
+			if depth == 1:
+				if time_limit is not None:
+					deadline = start + time_limit
+				nodes_allowed = node_limit
+			if deadline is not None and time.perf_counter() >= deadline:
+				break
+			if nodes_allowed is not None and self.nodes >= nodes_allowed:
+				break
+
+		result.nodes = self.nodes
+		result.elapsed = time.perf_counter() - start
+		result.tt_hit_rate = tt_hits / tt_probes if tt_probes else 0
+		return result
+
+	# expectedReply(): The reply the worker that searched the last best move expects; other moves fall back to this process's table
+	def expectedReply(self, position: Position, move: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+		if move == self.best_move:
+			return self.best_reply
+		return super().expectedReply(position, move)
+
+# benchmark(): Searches the same position to a fixed depth on one core and then on the pool, and prints the speedup
+def benchmark(fen: str, depth: int, workers: int) -> None:
+	position = Position.fromFen(fen)
+
+	single = Engine().search(position, max_depth = depth)
+	print(f"1 worker:  {single}")
+
+	engine = ParallelEngine(workers)
+	try:
+		engine.search(position, max_depth = 1) # Start the worker processes before timing anything
+		parallel = engine.search(position, max_depth = depth)
+	finally:
+		engine.close()
+	print(f"{engine.workers} workers: {parallel}")
+
+	speedup = single.elapsed / parallel.elapsed if parallel.elapsed > 0 else 0
+	print(f"speedup {speedup:.2f}x, nps {single.nodesPerSecond():.0f} -> {parallel.nodesPerSecond():.0f}")
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description = "Los Alamos parallel search benchmark")
+	parser.add_argument("depth", type = int, nargs = "?", default = 6)
+	parser.add_argument("--workers", type = int, default = os.cpu_count() or 1)
+	parser.add_argument("--fen", default = START_FEN)
+	args = parser.parse_args()
+
+	benchmark(args.fen, args.depth, args.workers)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
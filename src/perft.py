@@ -0,0 +1,175 @@
+# perft.py: Counts move-generator leaf nodes to a fixed depth, to check the generator's correctness and measure its speed.
+# Usage: py -m src.perft [depth] [--fen FEN] [--divide] [--check] [--compare]
+# Author: Julien Devol
+
+import argparse
+import random
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+from src.position import Position, DIMENSIONS, EMPTY, COLOR_NAMES, moveName
+
+START_FEN: str = "rnqknr/pppppp/6/6/PPPPPP/RNQKNR w"
+COMPARE_TARGET: int = 10 # Speedup over get_moves() the bitboard core was asked for; --compare shows how far off it still is
+
+# Reference leaf counts of legal moves, cross-checked against the get_moves() methods of game.py with every move that leaves the king attacked removed.
+# A checkmated or stalemated side has no moves.
+REFERENCE_COUNTS: Dict[str, Dict[int, int]] = {
+	START_FEN: {1: 10, 2: 100, 3: 1212, 4: 14332, 5: 191846},
+	"rn1kr1/ppq1pp/2pp1n/N1P3/PP1PP1/RQ1KNR w": {1: 20, 2: 312, 3: 6338, 4: 106043},
+	"1nq1nr/1pk3/3p1p/r1PpPN/R2p1P/4KR w": {1: 4, 2: 85, 3: 1275, 4: 25174},
+	"2k3/1p2r1/6/3Q2/4P1/1K4 b": {1: 10, 2: 202, 3: 1585, 4: 28996},
+	"rnq1nr/ppp1pp/3p2/PkPP1N/1PQ1PP/RN1K1R b": {1: 0, 2: 0}, # Black is checkmated
+	"2r2P/2Pk2/n2pp1/r3p1/3p2/2n2K w": {1: 0, 2: 0}, # White is stalemated
+}
+
+# perft(): Returns the number of leaf nodes depth plies below the position
+def perft(position: Position, depth: int) -> int:
+	if depth <= 0:
+		return 1
+	if depth == 1:
+		return position.countMoves() # Bulk counting, the leaves don't need to be made
+
+	nodes = 0
+	for from_sq, to_sq in position.generateMoves():
+		captured = position.makeMove(from_sq, to_sq)
+		nodes += perft(position, depth - 1)
+		position.unmakeMove(from_sq, to_sq, captured)
+	return nodes
+
+# divide(): Returns the perft count below every root move, for narrowing down where two generators disagree
+def divide(position: Position, depth: int) -> List[Tuple[Tuple[int, int], int]]:
+	counts = []
+	for from_sq, to_sq in position.generateMoves():
+		captured = position.makeMove(from_sq, to_sq)
+		counts.append(((from_sq, to_sq), perft(position, depth - 1)))
+		position.unmakeMove(from_sq, to_sq, captured)
+	return counts
+
+# runPerft(): Runs and prints perft for depths 1..max_depth, returns False if any count disagrees with the reference
+def runPerft(fen: str, max_depth: int) -> bool:
+	position = Position.fromFen(fen)
+	expected_counts = REFERENCE_COUNTS.get(position.toFen(), {})
+	passed = True
+
+	print(f"perft {position.toFen()}")
+	for depth in range(1, max_depth + 1):
+		start = time.perf_counter()
+		nodes = perft(position, depth)
+		elapsed = time.perf_counter() - start
+		nps = nodes / elapsed if elapsed > 0 else 0
+
+		expected = expected_counts.get(depth)
+		if expected is None:
+			status = ""
+		elif expected == nodes:
+			status = " ok"
+		else:
+			status = f" MISMATCH, expected {expected}"
+			passed = False
+		print(f"depth {depth} nodes {nodes} time {elapsed:.3f}s nps {nps:.0f}{status}")
+
+	return passed
+
+# runDivide(): Prints the perft count below every root move
+def runDivide(fen: str, depth: int) -> None:
+	position = Position.fromFen(fen)
+	start = time.perf_counter()
+	counts = divide(position, depth)
+	elapsed = time.perf_counter() - start
+
+	for move, nodes in sorted(counts, key = lambda entry: moveName(entry[0])):
+		print(f"{moveName(move)}: {nodes}")
+	total = sum(nodes for _, nodes in counts)
+	print(f"moves {len(counts)} nodes {total} time {elapsed:.3f}s")
+
+# samplePositions(): Positions from random games, the same ones on every run
+def samplePositions(count: int, seed: int = 1) -> List[Position]:
+	generator = random.Random(seed)
+	positions: List[Position] = []
+	position: Optional[Position] = None
+	while len(positions) < count:
+		if position is None or len(positions) % 60 == 0:
+			position = Position.fromFen(START_FEN)
+		moves = position.generateMoves()
+		if not moves:
+			position = None
+			continue
+		positions.append(position.copy())
+		position.makeMove(*generator.choice(moves))
+	return positions
+
+# runCompare(): Times the get_moves() methods of game.py, walking a grid of Square objects as the window did before Position,
+# against generateMoves() and countMoves() on the same positions, in moves per second. The grids are built before timing.
+def runCompare(count: int = 3000, repeats: int = 5) -> None:
+	from src.game import Square, Piece
+	from src.rules import PIECE_TYPES
+
+	positions = samplePositions(count)
+	boards = []
+	for position in positions:
+		squares = [[Square(row, col, 1, (0, 0, 0)) for col in range(DIMENSIONS)] for row in range(DIMENSIONS)]
+		for sq, code in enumerate(position.mailbox):
+			if code != EMPTY:
+				square = squares[sq // DIMENSIONS][sq % DIMENSIONS]
+				square.setPiece(Piece.createPiece(COLOR_NAMES[code >> 3], PIECE_TYPES[code & 7], square))
+		boards.append((squares, COLOR_NAMES[position.side]))
+
+	# getMoves(): Every move of the side to move the way the window found them, every square's piece asked for its own
+	def getMoves() -> int:
+		moves = 0
+		for squares, color in boards:
+			for row in squares:
+				for square in row:
+					if square.piece is not None and square.piece.color == color:
+						moves += len(square.piece.get_moves(square, squares))
+		return moves
+
+	runs = (("game.py get_moves(), pseudo-legal", getMoves),
+			("generateMoves(), legal", lambda: sum(len(position.generateMoves()) for position in positions)),
+			("countMoves(), legal", lambda: sum(position.countMoves() for position in positions)))
+
+	rates = []
+	for label, run in runs:
+		best = float("inf")
+		for _ in range(repeats):
+			start = time.perf_counter()
+			moves = run()
+			best = min(best, time.perf_counter() - start)
+		rates.append(moves / best)
+		print(f"{label:>38}: {moves} moves, {rates[-1] / 1e6:.2f}M moves/s, {best / count * 1e6:.2f} us/position, {rates[-1] / rates[0]:.1f}x")
+	speedup = rates[1] / rates[0]
+	print(f"generateMoves() is {speedup:.1f}x get_moves(), the target is {COMPARE_TARGET}x: {'met' if speedup >= COMPARE_TARGET else 'not met'}")
+
+# runChecks(): Runs perft on every reference position to its deepest stored depth
+def runChecks() -> bool:
+	passed = True
+	for fen, expected_counts in REFERENCE_COUNTS.items():
+		if expected_counts:
+			passed = runPerft(fen, max(expected_counts)) and passed
+	return passed
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description = "Los Alamos move generator perft")
+	parser.add_argument("depth", type = int, nargs = "?", default = 4)
+	parser.add_argument("--fen", default = START_FEN, help = "position to start from, defaults to the starting layout")
+	parser.add_argument("--divide", action = "store_true", help = "break the count down per root move")
+	parser.add_argument("--check", action = "store_true", help = "check every stored reference position")
+	parser.add_argument("--compare", action = "store_true", help = "time generation against the get_moves() methods of game.py")
+	args = parser.parse_args()
+
+	if args.compare:
+		runCompare()
+		passed = True
+	elif args.check:
+		passed = runChecks()
+	elif args.divide:
+		runDivide(args.fen, args.depth)
+		passed = True
+	else:
+		passed = runPerft(args.fen, args.depth)
+
+	return 0 if passed else 1
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,784 @@
+# position.py: Defines the headless bitboard position that the rules, search and analysis tools are built on.
+# Author: Julien Devol
+
+import random
+from typing import List, Tuple, Dict
+from src.counters import COUNTERS
+from src.evaluation import PIECE_SQUARE, EXCHANGE_VALUES
+
+# Every square on the 6x6 board is one bit of a 36-bit integer, indexed as row * 6 + col.
+# Row 0 is Black's back rank (the top of the screen), exactly like Board.squares[row][col].
+DIMENSIONS: int = 6
+SQUARE_COUNT: int = DIMENSIONS * DIMENSIONS
+FULL_BOARD: int = (1 << SQUARE_COUNT) - 1
+
+WHITE: int = 0
+BLACK: int = 1
+
+PAWN: int = 0
+KNIGHT: int = 1
+ROOK: int = 2
+QUEEN: int = 3
+KING: int = 4
+
+EMPTY: int = -1
+
+# Conversions between the string names the rendering layer uses and the integer codes used here
+COLOR_CODES: Dict[str, int] = {'w': WHITE, 'b': BLACK}
+COLOR_NAMES: Tuple[str, str] = ('w', 'b')
+PIECE_TYPES: Tuple[str, ...] = ("pawn", "knight", "rook", "queen", "king")
+TYPE_CODES: Dict[str, int] = {name: code for code, name in enumerate(PIECE_TYPES)}
+
+# pieceCode(): Packs a color and a piece type into the single integer stored in the mailbox
+def pieceCode(color: int, piece_type: int) -> int:
+	return (color << 3) | piece_type
+
+WHITE_ROOK: int = pieceCode(WHITE, ROOK)
+WHITE_QUEEN: int = pieceCode(WHITE, QUEEN)
+BLACK_ROOK: int = pieceCode(BLACK, ROOK)
+BLACK_QUEEN: int = pieceCode(BLACK, QUEEN)
+
+# squareIndex(): Returns the bit index of the square at row, col
+def squareIndex(row: int, col: int) -> int:
+	return row * DIMENSIONS + col
+
+# squareName(): Returns the algebraic name of a square, files a-f from the left and ranks 1-6 from White's side
+def squareName(sq: int) -> str:
+	row, col = divmod(sq, DIMENSIONS)
+	return f'{"abcdef"[col]}{DIMENSIONS - row}'
+
+# parseSquare(): Reverses squareName(), returning the index of a square such as "c3"
+def parseSquare(name: str) -> int:
+	col = "abcdef".index(name[0])
+	row = DIMENSIONS - int(name[1])
+	if not (0 <= row < DIMENSIONS):
+		raise ValueError(f"Invalid square: {name}")
+	return squareIndex(row, col)
+
+# moveName(): Returns a move in coordinate notation, such as "c2c3"
+def moveName(move) -> str:
+	if move is None:
+		return '-'
+	return squareName(move[0]) + squareName(move[1])
+
+# parseMove(): Reverses moveName(), returning a (from, to) move
+def parseMove(text: str) -> Tuple[int, int]:
+	if len(text) != 4:
+		raise ValueError(f"Invalid move: {text}")
+	return (parseSquare(text[:2]), parseSquare(text[2:]))
+
+# Packed moves fit one move in a 16-bit int, for storing them in the move history and the transposition table.
+# Bits 0-5 are the target square and 6-11 the origin, so the low 12 bits are the from * 64 + to the opening book uses too.
+# Bits 12-14 are the piece type a pawn promotes to, 0 for none, and bit 15 is set for captures.
+MOVE_SQUARES_MASK: int = 0xFFF
+MOVE_PROMOTION_SHIFT: int = 12
+MOVE_CAPTURE: int = 1 << 15
+
+# packMove(): Packs a move into a 16-bit int
+def packMove(from_sq: int, to_sq: int, promotion: int = 0, capture: bool = False) -> int:
+	return (from_sq << 6) | to_sq | (promotion << MOVE_PROMOTION_SHIFT) | (MOVE_CAPTURE if capture else 0)
+
+# unpackMove(): Returns the (from, to) squares of a packed move
+def unpackMove(packed: int) -> Tuple[int, int]:
+	return ((packed >> 6) & 63, packed & 63)
+
+# movePromotion(): Returns the piece type a packed move promotes to, 0 if it doesn't
+def movePromotion(packed: int) -> int:
+	return (packed >> MOVE_PROMOTION_SHIFT) & 7
+
+# isCapture(): Whether a packed move was flagged as a capture
+def isCapture(packed: int) -> bool:
+	return bool(packed & MOVE_CAPTURE)
+
+# Letters used for each piece type in position strings; White is uppercase, Black lowercase
+PIECE_LETTERS: Tuple[str, ...] = ('P', 'N', 'R', 'Q', 'K')
+
+# Direction offsets, as (row delta, col delta). The first four increase the square index, the last four decrease it.
+DIRECTIONS: Tuple[Tuple[int, int], ...] = (
+	(0, 1), (1, 0), (1, 1), (1, -1), # Right, down, down-right, down-left
+	(0, -1), (-1, 0), (-1, -1), (-1, 1) # Left, up, up-left, up-right
+)
+STRAIGHT_DIRECTIONS: Tuple[int, ...] = (0, 1, 4, 5)
+ALL_DIRECTIONS: Tuple[int, ...] = tuple(range(8))
+POSITIVE_DIRECTIONS: Tuple[bool, ...] = (True, True, True, True, False, False, False, False)
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+# _offsetTable(): Builds a per-square attack table out of a list of (row, col) offsets
+def _offsetTable(offsets) -> List[int]:
+	table = []
+	for sq in range(SQUARE_COUNT):
+		row, col = divmod(sq, DIMENSIONS)
+		bits = 0
+		for dr, dc in offsets:
+			r, c = row + dr, col + dc
+			if 0 <= r < DIMENSIONS and 0 <= c < DIMENSIONS:
+				bits |= 1 << squareIndex(r, c)
+		table.append(bits)
+	return table
+
+# _rayTable(): Builds the full, unblocked ray from every square in the given direction
+def _rayTable(dr: int, dc: int) -> List[int]:
+	table = []
+	for sq in range(SQUARE_COUNT):
+		row, col = divmod(sq, DIMENSIONS)
+		bits = 0
+		r, c = row + dr, col + dc
+		while 0 <= r < DIMENSIONS and 0 <= c < DIMENSIONS:
+			bits |= 1 << squareIndex(r, c)
+			r += dr
+			c += dc
+		table.append(bits)
+	return table
+
+KNIGHT_ATTACKS: List[int] = _offsetTable(KNIGHT_OFFSETS)
+KING_ATTACKS: List[int] = _offsetTable(KING_OFFSETS)
+
+# White pawns move up the board (towards row 0), black pawns move down
+PAWN_DIRECTION: Tuple[int, int] = (-1, 1)
+PAWN_ATTACKS: List[List[int]] = [_offsetTable(((PAWN_DIRECTION[color], -1), (PAWN_DIRECTION[color], 1))) for color in (WHITE, BLACK)]
+PAWN_PUSHES: List[List[int]] = [_offsetTable(((PAWN_DIRECTION[color], 0),)) for color in (WHITE, BLACK)]
+
+RAYS: List[List[int]] = [_rayTable(dr, dc) for dr, dc in DIRECTIONS]
+
+# slidingAttacks(): Returns every square a slider on sq attacks in the given directions, stopping at the first blocker
+def slidingAttacks(sq: int, occupied: int, directions: Tuple[int, ...]) -> int:
+	attacks = 0
+	for direction in directions:
+		ray = RAYS[direction][sq]
+		blockers = ray & occupied
+		if blockers:
+			if POSITIVE_DIRECTIONS[direction]:
+				nearest = (blockers & -blockers).bit_length() - 1
+			else:
+				nearest = blockers.bit_length() - 1
+			ray ^= RAYS[direction][nearest]
+		attacks |= ray
+	return attacks
+
+# _relevantMask(): Squares whose occupancy can change a slider's attacks from sq (the last square of each ray never blocks anything)
+def _relevantMask(sq: int, directions: Tuple[int, ...]) -> int:
+	mask = 0
+	for direction in directions:
+		ray = RAYS[direction][sq]
+		if ray:
+			if POSITIVE_DIRECTIONS[direction]:
+				last = ray.bit_length() - 1
+			else:
+				last = (ray & -ray).bit_length() - 1
+			mask |= ray & ~(1 << last)
+	return mask
+
+# _slidingTable(): Precomputes a slider's attacks from every square for every subset of its relevant blockers
+def _slidingTable(directions: Tuple[int, ...]) -> Tuple[List[int], List[Dict[int, int]]]:
+	masks = []
+	tables = []
+	for sq in range(SQUARE_COUNT):
+		mask = _relevantMask(sq, directions)
+		table = {}
+		subset = 0
+		while True: # Walk every subset of the mask (Carry-Rippler)
+			table[subset] = slidingAttacks(sq, subset, directions)
+			subset = (subset - mask) & mask
+			if subset == 0:
+				break
+		masks.append(mask)
+		tables.append(table)
+	return masks, tables
+
+# Los Alamos has no bishops, but a queen attacks exactly like a rook plus a bishop
+DIAGONAL_DIRECTIONS: Tuple[int, ...] = (2, 3, 6, 7)
+ROOK_MASKS, ROOK_TABLES = _slidingTable(STRAIGHT_DIRECTIONS)
+DIAGONAL_MASKS, DIAGONAL_TABLES = _slidingTable(DIAGONAL_DIRECTIONS)
+
+# rookAttacks(): Table lookup for the squares a rook on sq attacks
+def rookAttacks(sq: int, occupied: int) -> int:
+	return ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]]
+
+# queenAttacks(): Table lookup for the squares a queen on sq attacks
+def queenAttacks(sq: int, occupied: int) -> int:
+	return ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]] | DIAGONAL_TABLES[sq][occupied & DIAGONAL_MASKS[sq]]
+
+# pieceAttacks(): Squares the piece with the given code attacks from sq, own pieces included since it defends those
+def pieceAttacks(code: int, sq: int, occupied: int) -> int:
+	piece_type = code & 7
+	if piece_type == PAWN:
+		return PAWN_ATTACKS[code >> 3][sq]
+	if piece_type == KNIGHT:
+		return KNIGHT_ATTACKS[sq]
+	if piece_type == KING:
+		return KING_ATTACKS[sq]
+	if piece_type == ROOK:
+		return ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]]
+	return ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]] | DIAGONAL_TABLES[sq][occupied & DIAGONAL_MASKS[sq]]
+
+# _lineTables(): For every pair of squares on a common rank, file or diagonal, the squares strictly between them and the whole line through them
+def _lineTables() -> Tuple[List[List[int]], List[List[int]]]:
+	between = [[0] * SQUARE_COUNT for _ in range(SQUARE_COUNT)]
+	line = [[0] * SQUARE_COUNT for _ in range(SQUARE_COUNT)]
+	for a in range(SQUARE_COUNT):
+		for direction in ALL_DIRECTIONS:
+			full_line = RAYS[direction][a] | RAYS[direction ^ 4][a] | (1 << a) # direction ^ 4 is the opposite direction
+			ray = RAYS[direction][a]
+			while ray:
+				lowest = ray & -ray
+				ray ^= lowest
+				b = lowest.bit_length() - 1
+				between[a][b] = RAYS[direction][a] & ~RAYS[direction][b] & ~lowest
+				line[a][b] = full_line
+	return between, line
+
+BETWEEN, LINE = _lineTables()
+
+# Zobrist keys; one random 64-bit number per piece code and square, and one for Black to move.
+# Seeded so every process (and every saved hash) agrees on the same keys.
+_zobrist_random = random.Random(0x105A1A305)
+ZOBRIST_PIECES: List[List[int]] = [[_zobrist_random.getrandbits(64) for _ in range(SQUARE_COUNT)] for _ in range(16)]
+ZOBRIST_BLACK_TO_MOVE: int = _zobrist_random.getrandbits(64)
+
+# Files a pawn can't capture away from, since the shift would wrap onto the other edge of the board
+NOT_LEFT_FILE: int = sum(1 << squareIndex(row, col) for row in range(DIMENSIONS) for col in range(1, DIMENSIONS))
+NOT_RIGHT_FILE: int = sum(1 << squareIndex(row, col) for row in range(DIMENSIONS) for col in range(DIMENSIONS - 1))
+
+# The same target set always expands into the same list of moves, so expansions are cached.
+# Bounded so long analysis runs can't grow it without limit.
+_MOVE_LIST_CACHE: Dict[int, Tuple[Tuple[int, int], ...]] = {}
+_MOVE_LIST_CACHE_LIMIT: int = 1 << 18
+
+# _expandTargets(): Turns a target bitboard from one square into a tuple of (from, to) moves
+def _expandTargets(from_sq: int, targets: int) -> Tuple[Tuple[int, int], ...]:
+	key = (targets << 6) | from_sq
+	moves = _MOVE_LIST_CACHE.get(key)
+	if moves is None:
+		expanded = []
+		while targets:
+			lowest = targets & -targets
+			expanded.append((from_sq, lowest.bit_length() - 1))
+			targets ^= lowest
+		moves = tuple(expanded)
+
+		if len(_MOVE_LIST_CACHE) >= _MOVE_LIST_CACHE_LIMIT:
+			_MOVE_LIST_CACHE.clear()
+		_MOVE_LIST_CACHE[key] = moves
+	return moves
+
+# _expandShifted(): Turns a set of pawn targets into (from, to) moves, where every pawn moved by the same square delta
+def _expandShifted(targets: int, delta: int) -> Tuple[Tuple[int, int], ...]:
+	key = -((targets << 4) | (delta + 8)) # Negative keys can't collide with _expandTargets()
+	moves = _MOVE_LIST_CACHE.get(key)
+	if moves is None:
+		expanded = []
+		while targets:
+			lowest = targets & -targets
+			to_sq = lowest.bit_length() - 1
+			expanded.append((to_sq - delta, to_sq))
+			targets ^= lowest
+		moves = tuple(expanded)
+
+		if len(_MOVE_LIST_CACHE) >= _MOVE_LIST_CACHE_LIMIT:
+			_MOVE_LIST_CACHE.clear()
+		_MOVE_LIST_CACHE[key] = moves
+	return moves
+
+class Position:
+	__slots__ = ("bitboards", "occupancy", "mailbox", "side", "key", "score", "attacks_from", "attacked", "attacked_stale")
+
+	# __init__(): Constructor, creates an empty position with White to move
+	def __init__(self) -> None:
+		self.bitboards: List[int] = [0] * 16 # Indexed by pieceCode(color, piece_type)
+		self.occupancy: List[int] = [0, 0] # Indexed by color
+		self.mailbox: List[int] = [EMPTY] * SQUARE_COUNT # Piece code on every square, or EMPTY
+		self.side: int = WHITE
+		self.key: int = 0 # 64-bit Zobrist key, updated incrementally by every change to the position
+		self.score: int = 0 # Material and piece-square score from White's point of view, updated incrementally like the key
+		self.attacks_from: List[int] = [0] * SQUARE_COUNT # Squares attacked by the piece on every square, updated incrementally
+		self.attacked: List[int] = [0, 0] # Every square each side attacks, the union of its attacks_from
+		self.attacked_stale: int = 0 # Bit per color, set when attacks_from changed since that side's attacked was last built
+
+	# initial(): Creates the standard Los Alamos starting position
+	@staticmethod
+	def initial() -> 'Position':
+		position = Position()
+		back_rank = (ROOK, KNIGHT, QUEEN, KING, KNIGHT, ROOK)
+		for col in range(DIMENSIONS):
+			position.putPiece(squareIndex(0, col), BLACK, back_rank[col])
+			position.putPiece(squareIndex(1, col), BLACK, PAWN)
+			position.putPiece(squareIndex(4, col), WHITE, PAWN)
+			position.putPiece(squareIndex(5, col), WHITE, back_rank[col])
+		return position
+
+	# fromFen(): Builds a position from a FEN-style string for 6x6, ranks 6 down to 1 and then the side to move.
+	# The starting position is "rnqknr/pppppp/6/6/PPPPPP/RNQKNR w".
+	@staticmethod
+	def fromFen(fen: str) -> 'Position':
+		fields = fen.split()
+		ranks = fields[0].split('/')
+		if len(ranks) != DIMENSIONS:
+			raise ValueError(f"Expected {DIMENSIONS} ranks in position: {fen}")
+
+		position = Position()
+		for row, rank in enumerate(ranks):
+			col = 0
+			for letter in rank:
+				if letter.isdigit():
+					col += int(letter)
+					continue
+				if letter.upper() not in PIECE_LETTERS or col >= DIMENSIONS:
+					raise ValueError(f"Invalid rank '{rank}' in position: {fen}")
+				color = WHITE if letter.isupper() else BLACK
+				position.putPiece(squareIndex(row, col), color, PIECE_LETTERS.index(letter.upper()))
+				col += 1
+			if col != DIMENSIONS:
+				raise ValueError(f"Invalid rank '{rank}' in position: {fen}")
+
+		if len(fields) > 1:
+			if fields[1] not in COLOR_CODES:
+				raise ValueError(f"Invalid side to move in position: {fen}")
+			position.setSide(COLOR_CODES[fields[1]])
+		return position
+
+	# toFen(): Returns this position as a string that fromFen() can read back
+	def toFen(self) -> str:
+		ranks = []
+		for row in range(DIMENSIONS):
+			rank = ''
+			empty = 0
+			for col in range(DIMENSIONS):
+				code = self.mailbox[squareIndex(row, col)]
+				if code == EMPTY:
+					empty += 1
+					continue
+				if empty:
+					rank += str(empty)
+					empty = 0
+				letter = PIECE_LETTERS[code & 7]
+				rank += letter if code >> 3 == WHITE else letter.lower()
+			if empty:
+				rank += str(empty)
+			ranks.append(rank)
+		return '/'.join(ranks) + ' ' + COLOR_NAMES[self.side]
+
+	# pack(): Serializes the position into 19 bytes; one nibble per square and a byte for the side to move.
+	# This is what gets sent between processes, rather than pickling whole objects.
+	def pack(self) -> bytes:
+		mailbox = self.mailbox
+		data = bytearray(SQUARE_COUNT // 2 + 1)
+		for sq in range(0, SQUARE_COUNT, 2):
+			data[sq >> 1] = (mailbox[sq] + 1) | ((mailbox[sq + 1] + 1) << 4)
+		data[-1] = self.side
+		return bytes(data)
+
+	# unpack(): Rebuilds a position serialized with pack()
+	@staticmethod
+	def unpack(data: bytes) -> 'Position':
+		position = Position()
+		for sq in range(SQUARE_COUNT):
+			code = ((data[sq >> 1] >> (4 * (sq & 1))) & 0xF) - 1
+			if code != EMPTY:
+				position.putPiece(sq, code >> 3, code & 7)
+		position.setSide(data[-1])
+		return position
+
+	# fromSquares(): Builds a position out of the rendering layer's grid of squares
+	@staticmethod
+	def fromSquares(squares, side: int = WHITE) -> 'Position':
+		position = Position()
+		for row in squares:
+			for square in row:
+				if square.piece is not None:
+					position.putPiece(squareIndex(square.row, square.col), COLOR_CODES[square.piece.color], TYPE_CODES[square.piece.type])
+		position.setSide(side)
+		return position
+
+	# copy(): Returns an independent copy of this position
+	def copy(self) -> 'Position':
+		position = Position()
+		position.bitboards = self.bitboards[:]
+		position.occupancy = self.occupancy[:]
+		position.mailbox = self.mailbox[:]
+		position.side = self.side
+		position.key = self.key
+		position.score = self.score
+		position.attacks_from = self.attacks_from[:]
+		position.attacked = self.attacked[:]
+		position.attacked_stale = self.attacked_stale
+		return position
+
+	# setSide(): Sets the side to move
+	def setSide(self, side: int) -> None:
+		if side != self.side:
+			self.side = side
+			self.key ^= ZOBRIST_BLACK_TO_MOVE
+
+	# computeKey(): Computes the Zobrist key from scratch; the incremental key must always equal this
+	def computeKey(self) -> int:
+		key = ZOBRIST_BLACK_TO_MOVE if self.side == BLACK else 0
+		for sq, code in enumerate(self.mailbox):
+			if code != EMPTY:
+				key ^= ZOBRIST_PIECES[code][sq]
+		return key
+
+	# computeScore(): Computes the score from scratch; the incremental score must always equal this
+	def computeScore(self) -> int:
+		return sum(PIECE_SQUARE[code][sq] for sq, code in enumerate(self.mailbox) if code != EMPTY)
+
+	# putPiece(): Places a piece on an empty square
+	def putPiece(self, sq: int, color: int, piece_type: int) -> None:
+		bit = 1 << sq
+		code = pieceCode(color, piece_type)
+		self.bitboards[code] |= bit
+		self.occupancy[color] |= bit
+		self.mailbox[sq] = code
+		self.key ^= ZOBRIST_PIECES[code][sq]
+		self.score += PIECE_SQUARE[code][sq]
+		self.updateAttacks(bit)
+
+	# removePiece(): Removes whatever piece is on the square
+	def removePiece(self, sq: int) -> None:
+		code = self.mailbox[sq]
+		if code == EMPTY:
+			return
+		bit = 1 << sq
+		self.bitboards[code] &= ~bit
+		self.occupancy[code >> 3] &= ~bit
+		self.mailbox[sq] = EMPTY
+		self.key ^= ZOBRIST_PIECES[code][sq]
+		self.score -= PIECE_SQUARE[code][sq]
+		self.updateAttacks(bit)
+
+	# pieceAt(): Returns the (color, piece_type) on a square, or None if it's empty
+	def pieceAt(self, sq: int):
+		code = self.mailbox[sq]
+		if code == EMPTY:
+			return None
+		return (code >> 3, code & 7)
+
+	# occupied(): Returns the bitboard of every occupied square
+	def occupied(self) -> int:
+		return self.occupancy[WHITE] | self.occupancy[BLACK]
+
+	# hasKing(): Whether the given side has its king on the board
+	def hasKing(self, color: int) -> bool:
+		return self.bitboards[pieceCode(color, KING)] != 0
+
+	# updateAttacks(): Refreshes attacks_from after the squares in changed were emptied or filled.
+	# Only the pieces on those squares change, plus the rooks and queens whose lines run into them.
+	def updateAttacks(self, changed: int) -> None:
+		bitboards = self.bitboards
+		occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+		queens = bitboards[WHITE_QUEEN] | bitboards[BLACK_QUEEN]
+		straight = bitboards[WHITE_ROOK] | bitboards[BLACK_ROOK] | queens
+
+		refresh = changed
+		while changed:
+			lowest = changed & -changed
+			changed ^= lowest
+			sq = lowest.bit_length() - 1
+			refresh |= (ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]] & straight) | (DIAGONAL_TABLES[sq][occupied & DIAGONAL_MASKS[sq]] & queens)
+
+		mailbox = self.mailbox
+		attacks_from = self.attacks_from
+		while refresh:
+			lowest = refresh & -refresh
+			refresh ^= lowest
+			sq = lowest.bit_length() - 1
+			code = mailbox[sq]
+			attacks_from[sq] = 0 if code == EMPTY else pieceAttacks(code, sq, occupied)
+		self.attacked_stale = 3
+
+	# attackedBy(): Every square the given side attacks, built from attacks_from the first time it's needed after a change
+	def attackedBy(self, color: int) -> int:
+		if self.attacked_stale & (1 << color):
+			attacks_from = self.attacks_from
+			pieces = self.occupancy[color]
+			attacked = 0
+			while pieces:
+				lowest = pieces & -pieces
+				pieces ^= lowest
+				attacked |= attacks_from[lowest.bit_length() - 1]
+			self.attacked[color] = attacked
+			self.attacked_stale ^= 1 << color
+		return self.attacked[color]
+
+	# attackersTo(): Pieces of the given color that attack sq, with the given occupancy
+	def attackersTo(self, sq: int, color: int, occupied: int) -> int:
+		bitboards = self.bitboards
+		base = color << 3
+		queens = bitboards[base | QUEEN]
+		return ((PAWN_ATTACKS[color ^ 1][sq] & bitboards[base | PAWN]) | (KNIGHT_ATTACKS[sq] & bitboards[base | KNIGHT]) |
+				(KING_ATTACKS[sq] & bitboards[base | KING]) |
+				(ROOK_TABLES[sq][occupied & ROOK_MASKS[sq]] & (bitboards[base | ROOK] | queens)) |
+				(DIAGONAL_TABLES[sq][occupied & DIAGONAL_MASKS[sq]] & queens))
+
+	# inCheck(): Whether the side to move's king is attacked
+	def inCheck(self) -> bool:
+		return bool(self.bitboards[(self.side << 3) | KING] & self.attackedBy(self.side ^ 1))
+
+	# pinnedPieces(): The side to move's pieces that can't leave the line between their king and an enemy rook or queen
+	def pinnedPieces(self, king_sq: int) -> int:
+		bitboards = self.bitboards
+		enemy_base = (self.side ^ 1) << 3
+		queens = bitboards[enemy_base | QUEEN]
+		snipers = (ROOK_TABLES[king_sq][0] & (bitboards[enemy_base | ROOK] | queens)) | (DIAGONAL_TABLES[king_sq][0] & queens)
+		occupied = self.occupancy[WHITE] | self.occupancy[BLACK]
+		own = self.occupancy[self.side]
+
+		pinned = 0
+		while snipers:
+			lowest = snipers & -snipers
+			snipers ^= lowest
+			blockers = BETWEEN[king_sq][lowest.bit_length() - 1] & occupied
+			if blockers and not blockers & (blockers - 1) and blockers & own:
+				pinned |= blockers
+		return pinned
+
+	# staticExchange(): The material the side moving from from_sq wins by capturing on to_sq, if both sides then keep recapturing there
+	# with their least valuable attacker for as long as it pays. Pieces behind the capturers join in as the line opens; pins are ignored.
+	def staticExchange(self, from_sq: int, to_sq: int) -> int:
+		mailbox = self.mailbox
+		bitboards = self.bitboards
+		captured = mailbox[to_sq]
+		gains = [EXCHANGE_VALUES[captured & 7] if captured != EMPTY else 0]
+		on_square = EXCHANGE_VALUES[mailbox[from_sq] & 7] # Value of the piece that would be taken by the next recapture
+		color = (mailbox[from_sq] >> 3) ^ 1
+		occupied = (self.occupancy[WHITE] | self.occupancy[BLACK]) ^ (1 << from_sq)
+
+		while True:
+			attackers = self.attackersTo(to_sq, color, occupied) & occupied
+			if not attackers:
+				break
+			gains.append(on_square - gains[-1])
+			if max(-gains[-2], gains[-1]) < 0:
+				break # Neither side's result can change any more
+			base = color << 3
+			for piece_type in (PAWN, KNIGHT, ROOK, QUEEN, KING):
+				least = attackers & bitboards[base | piece_type]
+				if least:
+					break
+			occupied ^= least & -least
+			on_square = EXCHANGE_VALUES[piece_type]
+			color ^= 1
+
+		# Each side may stop instead of recapturing, so fold the sequence back from the last capture
+		for index in range(len(gains) - 1, 0, -1):
+			gains[index - 1] = -max(-gains[index - 1], gains[index])
+		return gains[0]
+
+	# isCheckmate(): Whether the side to move is in check and has no legal moves
+	def isCheckmate(self) -> bool:
+		return self.inCheck() and not self.generateMoves()
+
+	# isStalemate(): Whether the side to move isn't in check but has no legal moves, which is a draw
+	def isStalemate(self) -> bool:
+		return not self.inCheck() and not self.generateMoves()
+
+	# isGameOver(): The game ends when the side to move has no legal moves, by checkmate or stalemate
+	def isGameOver(self) -> bool:
+		return not self.generateMoves()
+
+	# movesFrom(): Returns the legal (from, to) moves of the piece on sq
+	def movesFrom(self, sq: int) -> List[Tuple[int, int]]:
+		return [move for move in self.generateMoves() if move[0] == sq]
+
+	# legalityMasks(): Returns (king square, king targets, pinned pieces, block mask) for the side to move.
+	# The king's targets avoid every square in the opponent's attack map; block holds the squares that get the king out of check, all of them when it isn't in check.
+	def legalityMasks(self) -> Tuple[int, int, int, int]:
+		color = self.side
+		bitboards = self.bitboards
+		base = color << 3
+		king = bitboards[base | KING]
+		if not king:
+			return -1, 0, 0, FULL_BOARD # Only hand-built positions lack a king; every move of theirs is legal
+
+		king_sq = king.bit_length() - 1
+		enemy_attacks = self.attackedBy(color ^ 1)
+		king_targets = KING_ATTACKS[king_sq] & ~self.occupancy[color] & ~enemy_attacks
+		if not king & enemy_attacks:
+			return king_sq, king_targets, self.pinnedPieces(king_sq), FULL_BOARD
+
+		checkers = self.attackersTo(king_sq, color ^ 1, self.occupancy[WHITE] | self.occupancy[BLACK])
+		if checkers & (checkers - 1):
+			block = 0 # Double check, only the king can move
+		else:
+			block = checkers | BETWEEN[king_sq][checkers.bit_length() - 1]
+
+		# The king can't step back along the line of a checking rook or queen either, it only blocked that square itself
+		sliders = checkers & (bitboards[(base ^ 8) | ROOK] | bitboards[(base ^ 8) | QUEEN])
+		while sliders:
+			lowest = sliders & -sliders
+			sliders ^= lowest
+			king_targets &= ~LINE[king_sq][lowest.bit_length() - 1] | lowest
+		return king_sq, king_targets, self.pinnedPieces(king_sq), block
+
+	# generateMoves(): Returns every legal (from, to) move for the side to move. There's no castling and no double pawn push.
+	# Rather than making every move and looking for replies that take the king, each piece's targets are masked:
+	# the king avoids every square in the opponent's attack map, pinned pieces stay on their pin line, and in check every other piece has to block or capture.
+	# With captures_only the masks are narrowed to the opponent's pieces, which is all quiescence search needs.
+	def generateMoves(self, captures_only: bool = False) -> List[Tuple[int, int]]:
+		COUNTERS.move_generations += 1
+		color = self.side
+		own = self.occupancy[color]
+		enemy = self.occupancy[color ^ 1]
+		occupied = own | enemy
+		bitboards = self.bitboards
+		base = color << 3
+		moves: List[Tuple[int, int]] = []
+		extend = moves.extend
+		cached = _MOVE_LIST_CACHE.get
+
+		king_sq, king_targets, pinned, block = self.legalityMasks()
+		if captures_only:
+			king_targets &= enemy
+			block &= enemy
+		if not block:
+			if king_targets:
+				extend(_expandTargets(king_sq, king_targets))
+			return moves
+
+		# Pawns are generated set-wise, all pawns at once for each direction they can move in. Pinned pawns are done one by one below.
+		pawns = bitboards[base | PAWN]
+		free_pawns = pawns & ~pinned
+		if free_pawns:
+			pushes = ~occupied & block
+			captures = enemy & block
+			if color == WHITE:
+				shifted = (((free_pawns >> 6) & pushes, -6), (((free_pawns & NOT_LEFT_FILE) >> 7) & captures, -7), (((free_pawns & NOT_RIGHT_FILE) >> 5) & captures, -5))
+			else:
+				shifted = (((free_pawns << 6) & pushes & FULL_BOARD, 6), (((free_pawns & NOT_LEFT_FILE) << 5) & captures, 5), (((free_pawns & NOT_RIGHT_FILE) << 7) & captures, 7))
+			for targets, delta in shifted:
+				if targets:
+					expanded = cached(-((targets << 4) | (delta + 8)))
+					extend(expanded if expanded is not None else _expandShifted(targets, delta))
+
+		pinned_pawns = pawns & pinned
+		while pinned_pawns:
+			lowest = pinned_pawns & -pinned_pawns
+			pinned_pawns ^= lowest
+			sq = lowest.bit_length() - 1
+			targets = ((PAWN_PUSHES[color][sq] & ~occupied) | (PAWN_ATTACKS[color][sq] & enemy)) & block & LINE[king_sq][sq]
+			if targets:
+				extend(_expandTargets(sq, targets))
+
+		# Knights, rooks and queens move to the squares they attack, which attacks_from already holds, so each is one lookup
+		# and the cached expansion of its targets
+		attacks_from = self.attacks_from
+		movable = ~own & block
+		pieces = own & ~pawns & ~bitboards[base | KING]
+		while pieces:
+			lowest = pieces & -pieces
+			pieces ^= lowest
+			sq = lowest.bit_length() - 1
+			targets = attacks_from[sq] & movable
+			if lowest & pinned:
+				targets &= LINE[king_sq][sq]
+			if targets:
+				expanded = cached((targets << 6) | sq)
+				extend(expanded if expanded is not None else _expandTargets(sq, targets))
+
+		if king_targets:
+			extend(_expandTargets(king_sq, king_targets))
+
+		return moves
+
+	# countMoves(): Counts the moves generateMoves() would return without building them, using popcounts on the same masks
+	def countMoves(self) -> int:
+		COUNTERS.move_generations += 1
+		color = self.side
+		own = self.occupancy[color]
+		enemy = self.occupancy[color ^ 1]
+		occupied = own | enemy
+		bitboards = self.bitboards
+		base = color << 3
+		king_sq, king_targets, pinned, block = self.legalityMasks()
+		count = king_targets.bit_count()
+		if not block:
+			return count
+
+		not_own = ~own & block
+		pawns = bitboards[base | PAWN]
+		free_pawns = pawns & ~pinned
+		pushes = ~occupied & block
+		captures = enemy & block
+		if color == WHITE:
+			count += ((free_pawns >> 6) & pushes).bit_count() + (((free_pawns & NOT_LEFT_FILE) >> 7) & captures).bit_count() + (((free_pawns & NOT_RIGHT_FILE) >> 5) & captures).bit_count()
+		else:
+			count += ((free_pawns << 6) & pushes & FULL_BOARD).bit_count() + (((free_pawns & NOT_LEFT_FILE) << 5) & captures).bit_count() + (((free_pawns & NOT_RIGHT_FILE) << 7) & captures).bit_count()
+
+		pinned_pawns = pawns & pinned
+		while pinned_pawns:
+			lowest = pinned_pawns & -pinned_pawns
+			pinned_pawns ^= lowest
+			sq = lowest.bit_length() - 1
+			count += (((PAWN_PUSHES[color][sq] & ~occupied) | (PAWN_ATTACKS[color][sq] & enemy)) & block & LINE[king_sq][sq]).bit_count()
+
+		attacks_from = self.attacks_from
+		pieces = own & ~pawns & ~bitboards[base | KING]
+		while pieces:
+			lowest = pieces & -pieces
+			pieces ^= lowest
+			sq = lowest.bit_length() - 1
+			targets = attacks_from[sq] & not_own
+			count += (targets & LINE[king_sq][sq] if lowest & pinned else targets).bit_count()
+
+		return count
+
+	# packedMove(): Packs a move from this position, flagging it as a capture if to_sq is occupied
+	def packedMove(self, from_sq: int, to_sq: int) -> int:
+		return packMove(from_sq, to_sq, capture = self.mailbox[to_sq] != EMPTY)
+
+	# makeMove(): Moves a piece from from_sq to to_sq and passes the turn. Returns the captured piece code (or EMPTY) for unmakeMove().
+	def makeMove(self, from_sq: int, to_sq: int) -> int:
+		mailbox = self.mailbox
+		code = mailbox[from_sq]
+		captured = mailbox[to_sq]
+		from_bit = 1 << from_sq
+		to_bit = 1 << to_sq
+		move_bits = from_bit | to_bit
+
+		self.bitboards[code] ^= move_bits
+		self.occupancy[code >> 3] ^= move_bits
+		keys = ZOBRIST_PIECES[code]
+		key = self.key ^ keys[from_sq] ^ keys[to_sq] ^ ZOBRIST_BLACK_TO_MOVE
+		values = PIECE_SQUARE[code]
+		score = self.score + values[to_sq] - values[from_sq]
+		if captured != EMPTY:
+			self.bitboards[captured] ^= to_bit
+			self.occupancy[captured >> 3] ^= to_bit
+			key ^= ZOBRIST_PIECES[captured][to_sq]
+			score -= PIECE_SQUARE[captured][to_sq]
+
+		mailbox[to_sq] = code
+		mailbox[from_sq] = EMPTY
+		self.side ^= 1
+		self.key = key
+		self.score = score
+		self.updateAttacks(move_bits)
+		return captured
+
+	# unmakeMove(): Reverts a move made with makeMove()
+	def unmakeMove(self, from_sq: int, to_sq: int, captured: int) -> None:
+		mailbox = self.mailbox
+		code = mailbox[to_sq]
+		from_bit = 1 << from_sq
+		to_bit = 1 << to_sq
+		move_bits = from_bit | to_bit
+
+		self.bitboards[code] ^= move_bits
+		self.occupancy[code >> 3] ^= move_bits
+		keys = ZOBRIST_PIECES[code]
+		key = self.key ^ keys[from_sq] ^ keys[to_sq] ^ ZOBRIST_BLACK_TO_MOVE
+		values = PIECE_SQUARE[code]
+		score = self.score + values[from_sq] - values[to_sq]
+		if captured != EMPTY:
+			self.bitboards[captured] ^= to_bit
+			self.occupancy[captured >> 3] ^= to_bit
+			key ^= ZOBRIST_PIECES[captured][to_sq]
+			score += PIECE_SQUARE[captured][to_sq]
+
+		mailbox[from_sq] = code
+		mailbox[to_sq] = captured
+		self.side ^= 1
+		self.key = key
+		self.score = score
+		self.updateAttacks(move_bits)
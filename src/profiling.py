@@ -0,0 +1,133 @@
+# profiling.py: Captures a profile of the next frames, with cProfile or by sampling the main thread's stack, and writes it to files.
+# Starts without code changes from the LOS_ALAMOS_PROFILE environment variable, e.g. LOS_ALAMOS_PROFILE=cprofile:120 or sample:600,
+# and in the game with F9. LOS_ALAMOS_PROFILE_DIR sets where the files go, the working directory by default.
+# Author: Julien Devol
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+PROFILE_VARIABLE: str = "LOS_ALAMOS_PROFILE"
+PROFILE_DIRECTORY_VARIABLE: str = "LOS_ALAMOS_PROFILE_DIR"
+MODES = ("cprofile", "sample")
+DEFAULT_FRAMES: int = 120
+SAMPLE_INTERVAL: float = 0.001 # Seconds between stack samples; the sampler waits for the GIL too, so real gaps can be longer
+SUMMARY_LINES: int = 40 # Functions listed in a cProfile capture's text summary
+
+class StackSampler:
+	# __init__(): Constructor, samples the given thread's stack from a background thread once started
+	def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL) -> None:
+		self.thread_id: int = thread_id
+		self.interval: float = interval
+		self.counts: Dict[str, int] = {} # Collapsed stacks, outermost call first and ';' between calls, to how often they were seen
+		self.samples: int = 0
+		self.stopping = threading.Event()
+		self.thread = threading.Thread(target = self.run, name = "stack-sampler", daemon = True)
+
+	# start(): Starts sampling
+	def start(self) -> None:
+		self.thread.start()
+
+	# run(): Runs on the sampler thread until stop()
+	def run(self) -> None:
+		while not self.stopping.is_set():
+			frame = sys._current_frames().get(self.thread_id)
+			calls = []
+			while frame is not None:
+				code = frame.f_code
+				calls.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+				frame = frame.f_back
+			if calls:
+				stack = ';'.join(reversed(calls))
+				self.counts[stack] = self.counts.get(stack, 0) + 1
+				self.samples += 1
+			time.sleep(self.interval)
+
+	# stop(): Stops sampling and waits for the sampler thread
+	def stop(self) -> None:
+		self.stopping.set()
+		self.thread.join()
+
+	# write(): Writes the samples in the collapsed stack format flame graph tools read, one "stack count" line each, most frequent first
+	def write(self, path: str) -> None:
+		with open(path, "w", encoding = "utf-8") as output:
+			for stack, count in sorted(self.counts.items(), key = lambda entry: -entry[1]):
+				output.write(f"{stack} {count}\n")
+
+class FrameCapture:
+	# __init__(): Constructor, starts profiling right away; frameDone() stops it once the given number of frames have ended
+	def __init__(self, mode: str, frames: int = DEFAULT_FRAMES, directory: Optional[str] = None) -> None:
+		if mode not in MODES:
+			raise ValueError(f"Unknown profiling mode {mode}, expected one of {', '.join(MODES)}")
+		directory = directory or os.environ.get(PROFILE_DIRECTORY_VARIABLE) or "."
+		os.makedirs(directory, exist_ok = True)
+
+		self.mode: str = mode
+		self.frames_left: int = max(1, frames)
+		self.base_path: str = os.path.join(directory, f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{mode}")
+		self.paths = []
+		self.profiler: Optional[cProfile.Profile] = None
+		self.sampler: Optional[StackSampler] = None
+
+		if mode == "cprofile":
+			self.profiler = cProfile.Profile()
+			self.profiler.enable()
+		else:
+			self.sampler = StackSampler(threading.get_ident())
+			self.sampler.start()
+
+	# frameDone(): Counts a finished frame, and writes the capture out after the last one. Returns whether it has finished.
+	def frameDone(self) -> bool:
+		self.frames_left -= 1
+		if self.frames_left > 0:
+			return False
+		self.finish()
+		return True
+
+	# finish(): Stops profiling and writes the files; cProfile captures are saved for pstats/snakeviz with a text summary beside them
+	def finish(self) -> None:
+		if self.profiler is not None:
+			self.profiler.disable()
+			self.paths = [self.base_path + ".prof", self.base_path + ".txt"]
+			self.profiler.dump_stats(self.paths[0])
+			with open(self.paths[1], "w", encoding = "utf-8") as summary:
+				pstats.Stats(self.profiler, stream = summary).sort_stats("cumulative").print_stats(SUMMARY_LINES)
+		else:
+			self.sampler.stop()
+			self.paths = [self.base_path + ".txt"]
+			self.sampler.write(self.paths[0])
+
+# profileSetting(): The (mode, frames) LOS_ALAMOS_PROFILE asks for, as MODE or MODE:FRAMES; None if it isn't set.
+# Raises ValueError if FRAMES isn't a number.
+def profileSetting() -> Optional[Tuple[str, int]]:
+	value = os.environ.get(PROFILE_VARIABLE)
+	if not value:
+		return None
+	mode, _, frames = value.partition(':')
+	if frames and not frames.isdigit():
+		raise ValueError(f"Frame count {frames} isn't a whole number")
+	return mode, int(frames) if frames else DEFAULT_FRAMES
+
+# captureFromEnvironment(): Starts the capture LOS_ALAMOS_PROFILE asks for; None if it isn't set.
+# A setting that doesn't parse is only warned about, a diagnostics variable mustn't stop the game from starting.
+def captureFromEnvironment() -> Optional[FrameCapture]:
+	try:
+		setting = profileSetting()
+		return FrameCapture(*setting) if setting is not None else None
+	except ValueError as error:
+		print(f"Ignoring {PROFILE_VARIABLE}: {error}", file = sys.stderr)
+		return None
+
+# keyCapture(): Starts the capture of the profiling key, the next DEFAULT_FRAMES frames in LOS_ALAMOS_PROFILE's mode,
+# or with cProfile if it isn't set or doesn't parse to a known mode
+def keyCapture() -> FrameCapture:
+	try:
+		setting = profileSetting()
+	except ValueError:
+		setting = None
+	mode = setting[0] if setting is not None and setting[0] in MODES else "cprofile"
+	return FrameCapture(mode, DEFAULT_FRAMES)
@@ -0,0 +1,317 @@
+# protocol.py: Serves the engine over a UCI-style text protocol adapted to 6x6 Los Alamos, on stdin/stdout or on a local TCP socket.
+# Every client is a session with its own position; searches run on a bounded pool of search processes, so sessions search in parallel
+# on as many cores. Each process keeps its engine and transposition table between searches.
+# Usage: py -m src.protocol [--tcp PORT] [--host HOST] [--workers N] [--hash MB]
+# Author: Julien Devol
+#
+# Commands, one per line. Moves are in coordinate notation such as b1c3, positions in the two-field FEN of perft.py.
+#   uci                                                 replies id name, id author and uciok
+#   isready                                             replies readyok
+#   ucinewgame                                          resets the position to the starting layout
+#   position (startpos | fen BOARD SIDE) [moves MOVE...]
+#   go [movetime MS] [nodes N] [depth N] [infinite]     replies an info line per finished depth, then bestmove MOVE; with infinite,
+#                                                       the limits are ignored and bestmove waits for stop
+#   stop                                                ends the running search, which still replies bestmove
+#   d                                                   replies the position's FEN and legal moves
+#   quit                                                ends the session
+
+import argparse
+import asyncio
+import copy
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+from src.position import Position, moveName, parseMove
+from src.engine import Engine, SearchResult, MATE_SCORE, MAX_PLY
+from src.tablebase import Tablebases
+from src.book import OpeningBook
+
+ENGINE_NAME: str = "Los Alamos"
+ENGINE_AUTHOR: str = "Julien Devol"
+DEFAULT_PORT: int = 6036
+
+# infoLine(): Formats a finished depth of a search as an info line; mate scores are given in moves, positive when the engine mates
+def infoLine(result: SearchResult) -> str:
+	if abs(result.score) >= MATE_SCORE - MAX_PLY:
+		plies = MATE_SCORE - abs(result.score)
+		score = f"mate {(plies + 1) // 2 if result.score > 0 else -((plies + 1) // 2)}"
+	else:
+		score = f"cp {result.score}"
+	return (f"info depth {result.depth} score {score} nodes {result.nodes} nps {result.nodesPerSecond():.0f} "
+			f"time {result.elapsed * 1000:.0f} pv {moveName(result.best_move)}")
+
+# _searchMain(): Runs in a search process; searches every job it's sent until it receives None. Every finished depth is sent back
+# as (job id, False, result) and the end of the search as (job id, True, result). Jobs stop at their next clock check once stopped reaches their id.
+def _searchMain(jobs, results, stopped, tt_megabytes: float, tablebase_directory: Optional[str], book_path: Optional[str]) -> None:
+	signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl+C is for the server, which stops the processes itself
+	tablebases = Tablebases(tablebase_directory) if tablebase_directory is not None else None
+	book = OpeningBook(book_path) if book_path is not None else None
+	engine = Engine(tt_megabytes, tablebases, book)
+
+	job_id = 0
+	engine.stop_check = lambda: job_id <= stopped.value
+	report = lambda result: results.put((job_id, False, copy.copy(result))) # The queue pickles later, after the search has moved on
+	while True:
+		job = jobs.get()
+		if job is None:
+			break
+		job_id, packed, time_limit, node_limit, max_depth = job
+		results.put((job_id, True, engine.search(Position.unpack(packed), time_limit, node_limit, max_depth, report)))
+
+class SearchProcess:
+	# __init__(): Constructor, starts a search process with an engine and a transposition table of its own
+	def __init__(self, tt_megabytes: float, tablebase_directory: Optional[str], book_path: Optional[str]) -> None:
+		self.jobs = multiprocessing.Queue()
+		self.results = multiprocessing.Queue()
+		self.stopped = multiprocessing.Value('i', 0, lock = False) # Highest job id that has been told to stop
+		self.process = multiprocessing.Process(target = _searchMain, name = "search",
+											   args = (self.jobs, self.results, self.stopped, tt_megabytes, tablebase_directory, book_path),
+											   daemon = True)
+		self.process.start()
+		self.last_id: int = 0
+
+	# start(): Queues a search of the position, returns its job id
+	def start(self, position: Position, time_limit: Optional[float], node_limit: Optional[int], max_depth: int) -> int:
+		self.last_id += 1
+		self.jobs.put((self.last_id, position.pack(), time_limit, node_limit, max_depth))
+		return self.last_id
+
+	# stop(): Stops a search at its next clock check; it still sends its result
+	def stop(self, job_id: int) -> None:
+		self.stopped.value = max(self.stopped.value, job_id)
+
+	# close(): Stops the process once its current job is done, or right away if it doesn't end in time
+	def close(self) -> None:
+		self.stop(self.last_id)
+		self.jobs.put(None)
+		self.process.join(timeout = 2)
+		if self.process.is_alive():
+			self.process.terminate()
+
+class EngineServer:
+	# __init__(): Constructor, starts one search process per worker, each with an equal share of the transposition table's megabytes.
+	# Python threads would take turns on one core, so searches that should run at once each get a process.
+	def __init__(self, workers: Optional[int] = None, tt_megabytes: float = 64, tablebase_directory: Optional[str] = None,
+				 book_path: Optional[str] = None) -> None:
+		self.workers: int = workers or os.cpu_count() or 1
+		self.idle_processes: List[SearchProcess] = [SearchProcess(tt_megabytes / self.workers, tablebase_directory, book_path)
+													for _ in range(self.workers)]
+		self.processes: List[SearchProcess] = list(self.idle_processes)
+		self.readers = ThreadPoolExecutor(self.workers, thread_name_prefix = "results") # Wait on the processes' results off the event loop
+		self.process_free: Optional[asyncio.Condition] = None # Made on first use, inside the running event loop
+		self.sessions: int = 0
+		self.searches: int = 0
+
+	# acquireProcess(): Waits for an idle search process; a search past the pool's size queues here until another one finishes
+	async def acquireProcess(self) -> SearchProcess:
+		if self.process_free is None:
+			self.process_free = asyncio.Condition()
+		async with self.process_free:
+			await self.process_free.wait_for(lambda: self.idle_processes)
+			return self.idle_processes.pop()
+
+	# releaseProcess(): Returns a search process to the pool
+	async def releaseProcess(self, process: SearchProcess) -> None:
+		async with self.process_free:
+			self.idle_processes.append(process)
+			self.process_free.notify()
+
+	# close(): Stops the search processes
+	def close(self) -> None:
+		for process in self.processes:
+			process.close()
+		self.readers.shutdown(wait = False)
+
+class Session:
+	# __init__(): Constructor, one client's position and search. Replies go through write, one line at a time.
+	def __init__(self, server: EngineServer, write: Callable[[str], None]) -> None:
+		self.server = server
+		self.write = write
+		self.position: Position = Position.initial()
+		self.search_task: Optional[asyncio.Task] = None
+		self.stop_flag: Optional[threading.Event] = None # Set to stop the running search
+		self.running: Optional[Tuple[SearchProcess, int]] = None # The process and job id of the running search, once it has started
+
+	# handle(): Runs one command line, returns False once the session should end
+	async def handle(self, line: str) -> bool:
+		tokens = line.split()
+		if not tokens:
+			return True
+
+		command, arguments = tokens[0], tokens[1:]
+		if command == "uci":
+			self.write(f"id name {ENGINE_NAME}")
+			self.write(f"id author {ENGINE_AUTHOR}")
+			self.write("uciok")
+		elif command == "isready":
+			self.write("readyok")
+		elif command == "ucinewgame":
+			await self.stopSearch()
+			self.position = Position.initial()
+		elif command == "position":
+			await self.stopSearch()
+			self.setPosition(arguments)
+		elif command == "go":
+			await self.stopSearch()
+			self.go(arguments)
+		elif command == "stop":
+			await self.stopSearch()
+		elif command == "d":
+			self.write(f"info string fen {self.position.toFen()}")
+			self.write(f"info string moves {' '.join(sorted(moveName(move) for move in self.position.generateMoves()))}")
+		elif command == "quit":
+			await self.stopSearch()
+			return False
+		else:
+			self.write(f"info string Unknown command: {command}")
+		return True
+
+	# setPosition(): Handles 'position'; moves are played until the first illegal one, which is reported
+	def setPosition(self, arguments: List[str]) -> None:
+		if "moves" in arguments:
+			split = arguments.index("moves")
+			setup, moves = arguments[:split], arguments[split + 1:]
+		else:
+			setup, moves = arguments, []
+
+		try:
+			if setup[:1] == ["startpos"]:
+				position = Position.initial()
+			elif setup[:1] == ["fen"]:
+				position = Position.fromFen(' '.join(setup[1:]))
+			else:
+				raise ValueError("Expected startpos or fen")
+		except (ValueError, IndexError, KeyError) as err:
+			self.write(f"info string Invalid position: {err}")
+			return
+
+		for move_text in moves:
+			try:
+				move = parseMove(move_text)
+			except (ValueError, KeyError):
+				move = None
+			if move not in position.generateMoves():
+				self.write(f"info string Illegal move: {move_text}")
+				break
+			position.makeMove(*move)
+		self.position = position
+
+	# go(): Handles 'go' by starting a search of a copy of the position in the background; the session keeps reading commands meanwhile
+	def go(self, arguments: List[str]) -> None:
+		infinite = "infinite" in arguments
+		time_limit = None
+		node_limit = None
+		max_depth = MAX_PLY
+		try:
+			for index in range(0, len(arguments) - 1):
+				if arguments[index] == "movetime":
+					time_limit = int(arguments[index + 1]) / 1000
+				elif arguments[index] == "nodes":
+					node_limit = int(arguments[index + 1])
+				elif arguments[index] == "depth":
+					max_depth = max(1, min(int(arguments[index + 1]), MAX_PLY))
+		except ValueError:
+			self.write(f"info string Invalid go arguments: {' '.join(arguments)}")
+			return
+		if infinite:
+			time_limit, node_limit, max_depth = None, None, MAX_PLY
+
+		self.stop_flag = threading.Event()
+		self.search_task = asyncio.create_task(self.runSearch(self.position.copy(), time_limit, node_limit, max_depth, self.stop_flag, infinite))
+
+	# runSearch(): Searches on one of the server's search processes, writing info lines as depths finish and then the best move.
+	# An infinite search that ends by itself, on a forced mate or at MAX_PLY, holds its best move back until stop.
+	async def runSearch(self, position: Position, time_limit: Optional[float], node_limit: Optional[int], max_depth: int,
+						stop_flag: threading.Event, infinite: bool = False) -> None:
+		loop = asyncio.get_running_loop()
+		process = await self.server.acquireProcess()
+		try:
+			job_id = process.start(position, time_limit, node_limit, max_depth)
+			self.running = (process, job_id)
+			if stop_flag.is_set():
+				process.stop(job_id) # Stopped while it waited for a free process
+			self.server.searches += 1
+			while True:
+				_, done, result = await loop.run_in_executor(self.server.readers, process.results.get)
+				if done:
+					break
+				self.write(infoLine(result))
+		finally:
+			self.running = None
+			await self.server.releaseProcess(process)
+
+		if infinite:
+			await loop.run_in_executor(None, stop_flag.wait)
+		self.write(f"bestmove {moveName(result.best_move) if result.best_move is not None else '(none)'}")
+
+	# stopSearch(): Stops the running search, if any, and waits until it has replied with its best move
+	async def stopSearch(self) -> None:
+		if self.search_task is not None:
+			self.stop_flag.set()
+			if self.running is not None:
+				self.running[0].stop(self.running[1])
+			await self.search_task
+			self.search_task = None
+
+# serveStdio(): Runs a single session on stdin and stdout until quit or the end of input
+async def serveStdio(server: EngineServer) -> None:
+	session = Session(server, lambda line: print(line, flush = True))
+	loop = asyncio.get_running_loop()
+	while True:
+		line = await loop.run_in_executor(None, sys.stdin.readline) # Blocking reads happen off the event loop
+		if not line or not await session.handle(line):
+			break
+	await session.stopSearch()
+
+# serveTcp(): Accepts any number of sessions on a local TCP port until interrupted
+async def serveTcp(server: EngineServer, host: str, port: int) -> None:
+	async def handleClient(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+		server.sessions += 1
+		session = Session(server, lambda line: writer.write((line + "\n").encode("ascii")))
+		try:
+			while True:
+				line = await reader.readline()
+				if not line or not await session.handle(line.decode("ascii", "replace")):
+					break
+				await writer.drain()
+		except ConnectionError:
+			pass # The client went away
+		finally:
+			await session.stopSearch()
+			server.sessions -= 1
+			writer.close()
+
+	tcp_server = await asyncio.start_server(handleClient, host, port)
+	print(f"listening on {host}:{port} with {server.workers} search processes", flush = True)
+	async with tcp_server:
+		await tcp_server.serve_forever()
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description = "Los Alamos engine protocol server")
+	parser.add_argument("--tcp", type = int, nargs = "?", const = DEFAULT_PORT, help = f"serve on a TCP port (default {DEFAULT_PORT}) instead of stdin/stdout")
+	parser.add_argument("--host", default = "127.0.0.1")
+	parser.add_argument("--workers", type = int, default = os.cpu_count() or 1, help = "search processes, the searches that run at once; more wait for a free one")
+	parser.add_argument("--hash", type = float, default = 64, help = "megabytes of transposition table, split between the search processes")
+	parser.add_argument("--tablebases", default = "tablebases")
+	parser.add_argument("--book", default = "book.bin")
+	args = parser.parse_args()
+
+	server = EngineServer(args.workers, args.hash, args.tablebases if os.path.isdir(args.tablebases) else None,
+						  args.book if os.path.isfile(args.book) else None)
+	try:
+		if args.tcp is not None:
+			asyncio.run(serveTcp(server, args.host, args.tcp))
+		else:
+			asyncio.run(serveStdio(server))
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.close()
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,232 @@
+# rules.py: Defines a game of Los Alamos chess without drawing it: whose turn it is, its moves and their history, and how it ends.
+# Imports no PyGame, so engines, analysis workers and tools start fast; game.py draws a Game and handles clicks on it.
+# Its import time and history are measured by rulesbench.py.
+# Author: Julien Devol
+
+from typing import Dict, List, Optional, Tuple
+from src.position import Position, WHITE, BLACK, EMPTY, COLOR_NAMES, PIECE_TYPES, moveName, packMove, unpackMove, MOVE_SQUARES_MASK
+
+CHECKPOINT_INTERVAL: int = 32 # Plies between the position snapshots kept in the move history
+
+# Packed moves are interned, so every history node playing the same move shares one int object
+_PACKED_MOVES: Dict[int, int] = {}
+
+class Move:
+	__slots__ = ("from_index", "to_index", "captured_code", "turn_number")
+
+	# __init__(): Constructor, a move from one square index to another.
+	# The captured piece and the turn it was played on are filled in when a Game makes the move.
+	def __init__(self, from_index: int, to_index: int) -> None:
+		self.from_index: int = from_index
+		self.to_index: int = to_index
+		self.captured_code: int = EMPTY
+		self.turn_number: int = 0
+
+	# packed(): The move as a 16-bit int, see packMove()
+	def packed(self) -> int:
+		return packMove(self.from_index, self.to_index, capture = self.captured_code != EMPTY)
+
+	# __repr__(): Prints the move in coordinate notation
+	def __repr__(self) -> str:
+		return f"Move({moveName((self.from_index, self.to_index))})"
+
+class HistoryNode:
+	__slots__ = ("move", "captured_code", "parent", "ply", "first_child", "next_sibling", "last_child", "checkpoint")
+
+	# __init__(): Constructor, one ply of the move history tree: the packed move that led here and every move tried after it.
+	# Every CHECKPOINT_INTERVAL plies a node also keeps the packed position, so any ply is at most that many moves from a snapshot.
+	def __init__(self, move: int, captured_code: int, parent: Optional['HistoryNode'], ply: int) -> None:
+		self.move: int = move
+		self.captured_code: int = captured_code # Needed to unmake the move
+		self.parent: Optional['HistoryNode'] = parent
+		self.ply: int = ply
+		self.first_child: Optional['HistoryNode'] = None # Children are a linked list through next_sibling, most nodes only have one
+		self.next_sibling: Optional['HistoryNode'] = None
+		self.last_child: Optional['HistoryNode'] = None # The continuation followed most recently; redo and line switches go this way
+		self.checkpoint: Optional[bytes] = None
+
+	# children(): Every node reached by a move tried from this one, in the order they were first played
+	def children(self) -> List['HistoryNode']:
+		children = []
+		child = self.first_child
+		while child is not None:
+			children.append(child)
+			child = child.next_sibling
+		return children
+
+	# addChild(): Adds a node after the existing children
+	def addChild(self, child: 'HistoryNode') -> None:
+		if self.first_child is None:
+			self.first_child = child
+			return
+		last = self.first_child
+		while last.next_sibling is not None:
+			last = last.next_sibling
+		last.next_sibling = child
+
+	# childFor(): Returns the child reached by playing from_index -> to_index, or None if it hasn't been tried
+	def childFor(self, from_index: int, to_index: int) -> Optional['HistoryNode']:
+		squares = packMove(from_index, to_index)
+		child = self.first_child
+		while child is not None:
+			if child.move & MOVE_SQUARES_MASK == squares:
+				return child
+			child = child.next_sibling
+		return None
+
+	# toMove(): The node's move as a Move
+	def toMove(self) -> Move:
+		move = Move(*unpackMove(self.move))
+		move.captured_code = self.captured_code
+		move.turn_number = self.ply
+		return move
+
+class Game:
+	# __init__(): Constructor, starts from the passed position or the initial one
+	def __init__(self, position: Optional[Position] = None) -> None:
+		self.position: Position = position if position is not None else Position.initial()
+		self.game_over: bool = False
+		self.winner: Optional[str] = None
+		self.root: HistoryNode = HistoryNode(0, EMPTY, None, 0)
+		self.root.checkpoint = self.position.pack()
+		self.line: List[HistoryNode] = [self.root] # The line being viewed, from the start to its furthest move
+		self.ply: int = 0 # Index into line of the node the position is currently at
+		self.updateResult()
+
+	# turn: Number of the turn being played, starting at 1
+	@property
+	def turn(self) -> int:
+		return self.ply + 1
+
+	# move_history: The moves of the line being viewed, including the ones after the current ply
+	@property
+	def move_history(self) -> List[Move]:
+		return [node.toMove() for node in self.line[1:]]
+
+	# currentColor(): The color whose turn it is, 'w' or 'b'
+	def currentColor(self) -> str:
+		return COLOR_NAMES[self.position.side]
+
+	# pieceAt(): The (color, type) names of the piece on a square index, e.g. ('w', "pawn"), or None if it's empty
+	def pieceAt(self, index: int) -> Optional[Tuple[str, str]]:
+		code = self.position.mailbox[index]
+		if code == EMPTY:
+			return None
+		return COLOR_NAMES[code >> 3], PIECE_TYPES[code & 7]
+
+	# getZobristKey(): Returns the 64-bit Zobrist key of the current position
+	def getZobristKey(self) -> int:
+		return self.position.key
+
+	# lineLength(): Number of plies in the line being viewed
+	def lineLength(self) -> int:
+		return len(self.line) - 1
+
+	# isAtEnd(): Whether the current ply is the last one of the line being viewed
+	def isAtEnd(self) -> bool:
+		return self.ply == len(self.line) - 1
+
+	# lineResult(): How the line being viewed ends, as "1-0", "0-1" or "1/2-1/2" like the self-play records; None if its last position isn't over
+	def lineResult(self) -> Optional[str]:
+		position = self.position
+		if not self.isAtEnd():
+			position = position.copy()
+			for node in self.line[self.ply + 1:]:
+				position.makeMove(*unpackMove(node.move))
+		if not position.isGameOver():
+			return None
+		if not position.inCheck():
+			return "1/2-1/2"
+		return "0-1" if position.side == WHITE else "1-0"
+
+	# variations(): Every move that has been tried from the current position, the one the line continues with included
+	def variations(self) -> List[Move]:
+		return [child.toMove() for child in self.line[self.ply].children()]
+
+	# makeMove(): Plays a move from the current position.
+	# A move that differs from the line's next one starts a variation instead of erasing the rest of the line; a move tried before switches back to its line.
+	def makeMove(self, move: Move) -> None:
+		if self.game_over:
+			return # Don't allow moves if the game is over!
+
+		node = self.line[self.ply]
+		child = node.childFor(move.from_index, move.to_index)
+		if child is None:
+			packed = self.position.packedMove(move.from_index, move.to_index)
+			packed = _PACKED_MOVES.setdefault(packed, packed)
+			child = HistoryNode(packed, self.position.mailbox[move.to_index], node, node.ply + 1)
+			node.addChild(child)
+		self.enterChild(child)
+
+		move.captured_code = child.captured_code
+		move.turn_number = child.ply
+
+	# switchVariation(): Plays the index-th move of variations(), continuing along whatever line was last followed after it
+	def switchVariation(self, index: int) -> None:
+		self.enterChild(self.line[self.ply].children()[index])
+
+	# enterChild(): Moves forward into a child of the current node, switching the viewed line to go through it
+	def enterChild(self, child: HistoryNode) -> None:
+		child.parent.last_child = child
+
+		if self.ply + 1 >= len(self.line) or self.line[self.ply + 1] is not child:
+			continuation = [child]
+			while continuation[-1].last_child is not None:
+				continuation.append(continuation[-1].last_child)
+			self.line = self.line[:self.ply + 1] + continuation
+
+		self.ply += 1
+		self.executeNode(child)
+
+	# undoMove(): Goes back one move in the history
+	def undoMove(self) -> None:
+		if self.ply > 0:
+			node = self.line[self.ply]
+			self.position.unmakeMove(*unpackMove(node.move), node.captured_code)
+			self.ply -= 1
+			self.updateResult()
+
+	# redoMove(): Goes forward one move in the history
+	def redoMove(self) -> None:
+		if self.ply < len(self.line) - 1:
+			self.ply += 1
+			self.executeNode(self.line[self.ply])
+
+	# seek(): Jumps to any ply of the line being viewed.
+	# Far jumps restore the nearest checkpoint at or before the ply and replay fewer than CHECKPOINT_INTERVAL moves from there.
+	def seek(self, ply: int) -> None:
+		ply = max(0, min(ply, len(self.line) - 1))
+
+		if abs(ply - self.ply) > CHECKPOINT_INTERVAL:
+			checkpoint_ply = ply - ply % CHECKPOINT_INTERVAL
+			self.position = Position.unpack(self.line[checkpoint_ply].checkpoint)
+			self.ply = checkpoint_ply
+			self.updateResult()
+
+		while self.ply > ply:
+			self.undoMove()
+		while self.ply < ply:
+			self.redoMove()
+
+	# executeNode(): Plays a node's move on the position, and snapshots the position if the node is a checkpoint
+	def executeNode(self, node: HistoryNode) -> None:
+		self.position.makeMove(*unpackMove(node.move))
+		if node.checkpoint is None and node.ply % CHECKPOINT_INTERVAL == 0:
+			node.checkpoint = self.position.pack()
+		self.updateResult()
+
+	# updateResult(): Ends the game if the side to move has no legal moves, by checkmate or stalemate, otherwise makes sure it's active
+	def updateResult(self) -> None:
+		if self.position.isGameOver():
+			if self.position.inCheck():
+				self.endGame("White" if self.position.side == BLACK else "Black")
+			else:
+				self.endGame(None) # Stalemate, a draw
+		else:
+			self.game_over = False
+			self.winner = None
+
+	# endGame(): Ends the game and declares a winner, or None for a draw!
+	def endGame(self, winner: Optional[str]) -> None:
+		self.game_over = True
+		self.winner = winner
@@ -0,0 +1,115 @@
+# rulesbench.py: Measures the rules module: its import time against a budget, seeking through long histories, and their memory use.
+# Kept apart from rules.py so that importing the rules doesn't pay for these tools.
+# Usage: py -m src.rulesbench [imports] checks how long src.rules takes to import against IMPORT_BUDGET_MS.
+#        py -m src.rulesbench seek [--plies N] times jumping around a long game's history.
+#        py -m src.rulesbench memory [--plies N] measures the memory a long game's history takes.
+# Author: Julien Devol
+
+import argparse
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Tuple
+from src.position import packMove
+from src.rules import Game, Move
+
+IMPORT_BUDGET_MS: float = 50 # Fresh-process import time of src.rules, move generation tables included
+
+# measureImportTime(): Median time to import a module in a fresh interpreter, in ms, and whether doing so loaded PyGame
+def measureImportTime(module: str, runs: int = 5) -> Tuple[float, bool]:
+	script = ("import sys, time; start = time.perf_counter(); import " + module +
+			  "; print((time.perf_counter() - start) * 1000, 'pygame' in sys.modules)")
+	times = []
+	loaded_pygame = False
+	for _ in range(runs):
+		output = subprocess.run([sys.executable, "-c", script], capture_output = True, text = True, check = True).stdout.split()
+		times.append(float(output[-2]))
+		loaded_pygame = loaded_pygame or output[-1] == "True"
+	return statistics.median(times), loaded_pygame
+
+# randomGame(): Plays a long game of random moves that never checkmate or stalemate, for timing the history
+def randomGame(plies: int, seed: int = 0) -> Game:
+	randomizer = random.Random(seed)
+	game = Game()
+	position = game.position
+	for _ in range(plies):
+		moves = position.generateMoves()
+		randomizer.shuffle(moves)
+		for from_sq, to_sq in moves:
+			captured = position.makeMove(from_sq, to_sq)
+			ends_game = position.isGameOver()
+			position.unmakeMove(from_sq, to_sq, captured)
+			if not ends_game:
+				game.makeMove(Move(from_sq, to_sq))
+				break
+		else:
+			break # Every move ends the game
+	return game
+
+# compareSeekTimes(): Times jumps to random plies of a long game through the checkpoints against stepping one move at a time
+def compareSeekTimes(plies: int = 5000, jumps: int = 200) -> None:
+	game = randomGame(plies)
+	targets = random.Random(1).choices(range(game.lineLength() + 1), k = jumps)
+
+	start = time.perf_counter()
+	for target in targets:
+		while game.ply > target:
+			game.undoMove()
+		while game.ply < target:
+			game.redoMove()
+	stepping_ms = (time.perf_counter() - start) / jumps * 1000
+
+	start = time.perf_counter()
+	for target in targets:
+		game.seek(target)
+	seek_ms = (time.perf_counter() - start) / jumps * 1000
+
+	print(f"{game.lineLength()} plies, {jumps} jumps to random plies")
+	print(f"one move at a time: {stepping_ms:.3f} ms/jump")
+	print(f"checkpoints:        {seek_ms:.3f} ms/jump ({stepping_ms / seek_ms:.0f}x faster)")
+
+# measureHistoryMemory(): Prints the memory a game's history takes per ply, and the size of one move in each form
+def measureHistoryMemory(plies: int = 5000) -> None:
+	moves = [(move.from_index, move.to_index) for move in randomGame(plies).move_history] # Also fills the move generation caches
+
+	tracemalloc.start()
+	game = Game()
+	before = tracemalloc.get_traced_memory()[0]
+	for from_index, to_index in moves:
+		game.makeMove(Move(from_index, to_index))
+	history_bytes = tracemalloc.get_traced_memory()[0] - before
+	tracemalloc.stop()
+
+	print(f"{len(moves)} plies: {history_bytes / len(moves):.0f} bytes/ply of history, checkpoints included")
+	print(f"Move object: {sys.getsizeof(Move(0, 1))} bytes, packed move: {sys.getsizeof(packMove(63, 62))} bytes or shared when interned")
+
+# checkImportBudget(): Prints the import times of the rules and the rendering layer, returns whether the rules stay within budget
+def checkImportBudget() -> bool:
+	rules_ms, rules_pygame = measureImportTime("src.rules")
+	game_ms, _ = measureImportTime("src.game")
+	within_budget = rules_ms <= IMPORT_BUDGET_MS and not rules_pygame
+
+	print(f"src.rules: {rules_ms:.1f} ms (budget {IMPORT_BUDGET_MS:.0f} ms){', loads PyGame!' if rules_pygame else ''}")
+	print(f"src.game:  {game_ms:.1f} ms, with PyGame and the rendering layer")
+	print("within budget" if within_budget else "OVER BUDGET")
+	return within_budget
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description = "Los Alamos rules module checks")
+	parser.add_argument("command", nargs = "?", choices = ("imports", "seek", "memory"), default = "imports")
+	parser.add_argument("--plies", type = int, default = 5000, help = "length of the game to seek through or measure")
+	args = parser.parse_args()
+
+	if args.command == "seek":
+		compareSeekTimes(args.plies)
+		return 0
+	if args.command == "memory":
+		measureHistoryMemory(args.plies)
+		return 0
+	return 0 if checkImportBudget() else 1
+
+if __name__ == "__main__":
+	sys.exit(main())
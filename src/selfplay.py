@@ -0,0 +1,190 @@
+# selfplay.py: Plays engine-vs-engine Los Alamos games without a display and streams every finished game to a record file.
+# Usage: py -m src.selfplay GAMES [--out games.jsonl] [--workers N] [--nodes-a N] [--nodes-b N] [--eval-a NAME] [--eval-b NAME]
+#        [--params-a FILE] [--params-b FILE]
+# Engines A and B can differ in node budget, evaluation and search parameters, so one tournament measures a change against the current engine.
+# Author: Julien Devol
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional
+from src.position import Position, WHITE, BLACK, moveName
+from src.engine import Engine, EVALUATIONS, DELTA_MARGIN
+from src.perft import START_FEN
+
+MAX_PLIES: int = 200 # Games that haven't ended by now are scored as draws
+REPETITIONS_FOR_DRAW: int = 3
+
+# An engine's settings for a tournament; a params file is a JSON object of any of these
+DEFAULT_SETTINGS: Dict = {"nodes": 2000, "evaluation": "pst", "delta_margin": DELTA_MARGIN}
+
+# loadSettings(): An engine's settings: the defaults, overridden by a params file's and then by those given on the command line.
+# Raises ValueError for a setting or an evaluation that doesn't exist.
+def loadSettings(params_path: Optional[str] = None, **overrides) -> Dict:
+	settings = dict(DEFAULT_SETTINGS)
+	if params_path is not None:
+		with open(params_path, "r", encoding = "utf-8") as params_file:
+			settings.update(json.load(params_file))
+	settings.update({name: value for name, value in overrides.items() if value is not None})
+
+	unknown = set(settings) - set(DEFAULT_SETTINGS)
+	if unknown:
+		raise ValueError(f"Unknown engine settings {', '.join(sorted(unknown))}, expected {', '.join(DEFAULT_SETTINGS)}")
+	if settings["evaluation"] not in EVALUATIONS:
+		raise ValueError(f"Unknown evaluation {settings['evaluation']}, expected one of {', '.join(EVALUATIONS)}")
+	return settings
+
+# playGame(): Plays one game between two node-limited engines, each built from its player's settings, returns its record.
+# The first random_plies moves are picked at random (seeded by the game id) so games don't all repeat each other.
+def playGame(game_id: int, white: str, black: str, settings: Dict[str, Dict], random_plies: int = 4,
+			 start_fen: str = START_FEN, tt_megabytes: float = 4) -> Dict:
+	position = Position.fromFen(start_fen)
+	players = {WHITE: white, BLACK: black}
+	engines = {color: Engine(tt_megabytes, evaluation = settings[player]["evaluation"], delta_margin = settings[player]["delta_margin"])
+			   for color, player in players.items()}
+	randomizer = random.Random(game_id)
+	seen: Dict[int, int] = {position.key: 1}
+	moves: List[str] = []
+	result = "1/2-1/2"
+	reason = "move limit"
+
+	while len(moves) < MAX_PLIES:
+		legal_moves = position.generateMoves()
+		if not legal_moves:
+			# Same end condition as Game.updateResult(); checkmate wins, stalemate is a draw
+			if position.inCheck():
+				result = "0-1" if position.side == WHITE else "1-0"
+				reason = "checkmate"
+			else:
+				reason = "stalemate"
+			break
+
+		if len(moves) < random_plies:
+			move = randomizer.choice(legal_moves)
+		else:
+			move = engines[position.side].search(position, node_limit = settings[players[position.side]]["nodes"]).best_move
+
+		position.makeMove(*move)
+		moves.append(moveName(move))
+
+		seen[position.key] = seen.get(position.key, 0) + 1
+		if seen[position.key] >= REPETITIONS_FOR_DRAW:
+			reason = "repetition"
+			break
+
+	return {"id": game_id, "white": white, "black": black, "start": start_fen, "moves": moves,
+			"result": result, "reason": reason, "plies": len(moves)}
+
+# readRecords(): Streams game records back out of a record file, one game per line
+def readRecords(path: str) -> Iterator[Dict]:
+	with open(path, "r", encoding = "utf-8") as record_file:
+		for line in record_file:
+			line = line.strip()
+			if line:
+				yield json.loads(line)
+
+class TournamentStats:
+	# __init__(): Constructor, tallies results from the point of view of one player
+	def __init__(self, player: str) -> None:
+		self.player = player
+		self.wins: int = 0
+		self.draws: int = 0
+		self.losses: int = 0
+
+	# add(): Counts one finished game
+	def add(self, record: Dict) -> None:
+		if record["result"] == "1/2-1/2":
+			self.draws += 1
+		elif (record["result"] == "1-0") == (record["white"] == self.player):
+			self.wins += 1
+		else:
+			self.losses += 1
+
+	# games(): Number of games counted
+	def games(self) -> int:
+		return self.wins + self.draws + self.losses
+
+	# score(): Mean score per game, a win is 1 and a draw is 0.5
+	def score(self) -> float:
+		games = self.games()
+		return (self.wins + 0.5 * self.draws) / games if games else 0.5
+
+	# confidenceInterval(): Normal-approximation interval around the mean score (95% for z = 1.96)
+	def confidenceInterval(self, z: float = 1.96):
+		games = self.games()
+		if games < 2:
+			return (0.0, 1.0)
+		mean = self.score()
+		variance = (self.wins * (1 - mean) ** 2 + self.draws * (0.5 - mean) ** 2 + self.losses * mean ** 2) / (games - 1)
+		margin = z * math.sqrt(variance / games)
+		return (max(0.0, mean - margin), min(1.0, mean + margin))
+
+	# eloDifference(): Converts a mean score into an Elo difference
+	@staticmethod
+	def eloDifference(score: float) -> float:
+		score = min(max(score, 1e-6), 1 - 1e-6)
+		return -400 * math.log10(1 / score - 1)
+
+	# __str__(): Summarizes the results on one line
+	def __str__(self) -> str:
+		low, high = self.confidenceInterval()
+		elo = self.eloDifference(self.score())
+		return (f"{self.player}: +{self.wins} ={self.draws} -{self.losses} score {self.score():.3f} "
+				f"[{low:.3f}, {high:.3f}] elo {elo:+.0f} [{self.eloDifference(low):+.0f}, {self.eloDifference(high):+.0f}]")
+
+# runTournament(): Plays the games on a process pool, appending every game to the record file the moment it finishes
+def runTournament(games: int, out_path: str, workers: Optional[int], settings: Dict[str, Dict],
+				  random_plies: int = 4, first_id: int = 0, report_every: int = 50) -> TournamentStats:
+	stats = TournamentStats("A")
+	start = time.perf_counter()
+
+	with ProcessPoolExecutor(workers) as pool, open(out_path, "a", encoding = "utf-8") as record_file:
+		futures = []
+		for game_id in range(first_id, first_id + games):
+			# Alternate colors so neither side keeps the first move
+			white, black = ("A", "B") if game_id % 2 == 0 else ("B", "A")
+			futures.append(pool.submit(playGame, game_id, white, black, settings, random_plies))
+
+		for finished, future in enumerate(as_completed(futures), 1):
+			record = future.result()
+			record_file.write(json.dumps(record, separators = (",", ":")) + "\n")
+			record_file.flush()
+			stats.add(record)
+
+			if finished % report_every == 0 or finished == games:
+				elapsed = time.perf_counter() - start
+				print(f"{finished}/{games} games, {finished / elapsed * 3600:.0f} games/hour, {stats}")
+
+	return stats
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description = "Los Alamos self-play tournament")
+	parser.add_argument("games", type = int)
+	parser.add_argument("--out", default = "selfplay.jsonl", help = "record file, finished games are appended one per line")
+	parser.add_argument("--workers", type = int, default = os.cpu_count() or 1)
+	for player in ("a", "b"):
+		parser.add_argument(f"--nodes-{player}", type = int, help = f"node budget per move for engine {player.upper()}, {DEFAULT_SETTINGS['nodes']} by default")
+		parser.add_argument(f"--eval-{player}", choices = sorted(EVALUATIONS), help = f"evaluation of engine {player.upper()}, {DEFAULT_SETTINGS['evaluation']} by default")
+		parser.add_argument(f"--params-{player}", help = f"JSON file of engine {player.upper()}'s settings, any of {', '.join(DEFAULT_SETTINGS)}")
+	parser.add_argument("--random-plies", type = int, default = 4, help = "random opening moves at the start of each game")
+	parser.add_argument("--first-id", type = int, default = 0, help = "id of the first game, to continue an existing record file")
+	args = parser.parse_args()
+
+	try:
+		settings = {"A": loadSettings(args.params_a, nodes = args.nodes_a, evaluation = args.eval_a),
+					"B": loadSettings(args.params_b, nodes = args.nodes_b, evaluation = args.eval_b)}
+	except (OSError, ValueError) as error:
+		print(error, file = sys.stderr)
+		return 2
+	for player, player_settings in settings.items():
+		print(f"{player}: " + ", ".join(f"{name} {value}" for name, value in player_settings.items()))
+	runTournament(args.games, args.out, args.workers, settings, args.random_plies, args.first_id)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
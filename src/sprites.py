@@ -0,0 +1,132 @@
+# sprites.py: Defines the process-wide sprite cache, so every piece image is read from disk once and scaled once per size.
+# Scaled sprites are kept for the most recently drawn sizes only, since every zoom level of the camera draws them at another size.
+# Usage: py -m src.sprites [boards] compares the cost of building boards with and without the cache.
+# Author: Julien Devol
+
+import pygame
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# resource_path(): Used to determine resource paths when using PyInstaller
+def resource_path(relative_path):
+	try:
+		base_path = sys._MEIPASS
+	except Exception:
+		base_path = os.path.abspath(".")
+
+	return os.path.join(base_path, relative_path)
+
+MAX_SCALED: int = 120 # Scaled sprites kept, the 10 piece images at 12 sizes, one doubling of the camera's zoom levels
+
+class SpriteCache:
+	# __init__(): Constructor, starts out empty; images are loaded the first time they're asked for.
+	# Past max_scaled scaled sprites, the least recently used one is dropped.
+	def __init__(self, max_scaled: int = MAX_SCALED) -> None:
+		self.images: Dict[Tuple[str, str], Optional[pygame.Surface]] = {} # Full-size images, keyed by (color, type)
+		self.scaled: OrderedDict[Tuple[str, str, int], Optional[pygame.Surface]] = OrderedDict() # Scaled copies, keyed by (color, type, size), least recently used first
+		self.max_scaled: int = max_scaled
+		self.disk_loads: int = 0
+		self.scales: int = 0
+		self.evictions: int = 0
+
+	# getImage(): Returns the full-size image for a piece, loading it from disk the first time
+	def getImage(self, color: str, piece_type: str) -> Optional[pygame.Surface]:
+		key = (color, piece_type)
+		if key not in self.images:
+			image = None
+			try:
+				path = f'assets/{color}_{piece_type}.png'
+				image = pygame.image.load(resource_path(path)).convert_alpha()
+				self.disk_loads += 1
+			except pygame.error as err:
+				print(f"Error loading image for {color}, {piece_type}: {err}")
+			self.images[key] = image # A failed load is remembered too, so it isn't retried every frame
+
+		return self.images[key]
+
+	# get(): Returns the piece's sprite scaled to size x size pixels, scaling it the first time that size is asked for
+	def get(self, color: str, piece_type: str, size: int) -> Optional[pygame.Surface]:
+		key = (color, piece_type, size)
+		if key in self.scaled:
+			self.scaled.move_to_end(key)
+			return self.scaled[key]
+
+		sprite = None
+		image = self.getImage(color, piece_type)
+		if image is not None:
+			sprite = pygame.transform.scale(image, (size, size))
+			self.scales += 1
+		self.scaled[key] = sprite
+		if len(self.scaled) > self.max_scaled:
+			self.scaled.popitem(last = False)
+			self.evictions += 1
+		return sprite
+
+	# clear(): Drops every cached image, for example after the display mode changes
+	def clear(self) -> None:
+		self.images.clear()
+		self.scaled.clear()
+
+	# clearScaled(): Drops the scaled sprites but keeps the full-size images
+	def clearScaled(self) -> None:
+		self.scaled.clear()
+
+	# memoryBytes(): Approximate pixel memory held by the cache
+	def memoryBytes(self) -> int:
+		total = 0
+		for surface in list(self.images.values()) + list(self.scaled.values()):
+			if surface is not None:
+				total += surface.get_width() * surface.get_height() * surface.get_bytesize()
+		return total
+
+	# report(): Summarizes what the cache holds on one line
+	def report(self) -> str:
+		return (f"sprites: {len(self.images)} images, {len(self.scaled)} scaled, {self.memoryBytes() / 1024:.0f} KiB, "
+				f"{self.disk_loads} disk loads, {self.scales} scales, {self.evictions} evicted")
+
+# The cache shared by every piece on every board
+SPRITES: SpriteCache = SpriteCache()
+
+# loadSpriteUncached(): The original way of loading a sprite, from disk and scaled again for every piece. Kept for comparison.
+def loadSpriteUncached(color: str, piece_type: str, size: int) -> pygame.Surface:
+	image = pygame.image.load(resource_path(f'assets/{color}_{piece_type}.png')).convert_alpha()
+	return pygame.transform.scale(image, (size, size))
+
+# compareBoardBuilds(): Times building boards with the shared cache against loading every piece's sprite on its own
+def compareBoardBuilds(boards: int = 20, width: int = 1280, height: int = 720) -> None:
+	from src.camera import Camera
+	from src.game import Board
+	from src.sprites import SPRITES as shared # The cache the pieces use; under 'py -m' this file is also loaded as __main__
+
+	pygame.init()
+	screen = pygame.display.set_mode((width, height))
+	camera = Camera(screen)
+
+	start = time.perf_counter()
+	first = Board(screen, camera)
+	first_ms = (time.perf_counter() - start) * 1000
+
+	start = time.perf_counter()
+	for _ in range(boards):
+		Board(screen, camera)
+	cached_ms = (time.perf_counter() - start) / boards * 1000
+
+	pieces = [square.piece for row in first.squares for square in row if square.piece is not None]
+	start = time.perf_counter()
+	for _ in range(boards):
+		for piece in pieces:
+			loadSpriteUncached(piece.color, piece.type, piece.sprite.get_width())
+	uncached_ms = (time.perf_counter() - start) / boards * 1000
+
+	print(f"first board (fills the cache): {first_ms:.2f} ms")
+	print(f"later boards, cached:          {cached_ms:.2f} ms/board")
+	print(f"sprite loads alone, uncached:  {uncached_ms:.2f} ms/board ({len(pieces)} disk loads)")
+	print(shared.report())
+	pygame.quit()
+
+if __name__ == "__main__":
+	os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # Doesn't need a window to benchmark
+	compareBoardBuilds(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
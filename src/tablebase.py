@@ -0,0 +1,322 @@
+# tablebase.py: Generates and probes endgame tablebases, solved completely by retrograde analysis.
+# Every table covers one material signature (such as "KQvK") and stores, for every placement of its pieces and side to move,
+# whether the side to move wins, draws or loses and how many plies it takes until checkmate.
+# Usage: py -m src.tablebase [--pieces N] [--out DIRECTORY] [--workers N]
+# Author: Julien Devol
+
+import argparse
+import itertools
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from src.position import (Position, WHITE, BLACK, KNIGHT, ROOK, QUEEN, KING, EMPTY, SQUARE_COUNT, PIECE_LETTERS,
+						  KNIGHT_ATTACKS, KING_ATTACKS, FULL_BOARD, pieceCode, rookAttacks, queenAttacks)
+
+MAGIC: bytes = b"LATB"
+VERSION: int = 2 # Version 1 tables were solved for king captures and must be regenerated
+HEADER = struct.Struct("<4sHH16sI") # Magic, version, piece count, signature, entry count
+FILE_EXTENSION: str = ".latb"
+
+# Values are stored as one signed byte per position: +n wins in n plies, -n loses in n plies, 0 is a draw.
+# The checkmated position itself counts as one ply, so it is stored as -1 and a mate in one as +2.
+DRAW: int = 0
+MAX_DISTANCE: int = 127
+
+# Piece letters for the pieces a signature can hold besides the two kings
+EXTRA_PIECES: Tuple[str, ...] = ('Q', 'R', 'N', 'P')
+
+# signaturePieces(): Splits a signature such as "KRvKN" into the (color, type) of every piece, kings first
+def signaturePieces(signature: str) -> List[Tuple[int, int]]:
+	white, black = signature.split('v')
+	pieces = [(WHITE, KING), (BLACK, KING)]
+	pieces += [(WHITE, PIECE_LETTERS.index(letter)) for letter in white[1:]]
+	pieces += [(BLACK, PIECE_LETTERS.index(letter)) for letter in black[1:]]
+	return pieces
+
+# signatureOf(): Returns the material signature of a position, or None if a king is missing
+def signatureOf(position: Position) -> Optional[str]:
+	if not position.hasKing(WHITE) or not position.hasKing(BLACK):
+		return None
+	sides = []
+	for color in (WHITE, BLACK):
+		letters = 'K'
+		for letter in EXTRA_PIECES:
+			letters += letter * position.bitboards[pieceCode(color, PIECE_LETTERS.index(letter))].bit_count()
+		sides.append(letters)
+	return 'v'.join(sides)
+
+# materialSignatures(): Lists every signature with at most max_pieces pieces, grouped by piece count (fewest first)
+def materialSignatures(max_pieces: int) -> List[List[str]]:
+	levels = []
+	for extra in range(max_pieces - 1):
+		level = []
+		for white_count in range(extra, -1, -1):
+			for white in itertools.combinations_with_replacement(EXTRA_PIECES, white_count):
+				for black in itertools.combinations_with_replacement(EXTRA_PIECES, extra - white_count):
+					level.append('K' + ''.join(white) + 'vK' + ''.join(black))
+		levels.append(level)
+	return levels
+
+# tableSize(): Number of entries in a table with the given number of pieces; every piece on every square, for both sides to move
+def tableSize(piece_count: int) -> int:
+	return (SQUARE_COUNT ** piece_count) * 2
+
+# encodeIndex(): Returns the table index for the pieces' squares (in signature order) and the side to move
+def encodeIndex(squares, side: int) -> int:
+	index = 0
+	for sq in squares:
+		index = index * SQUARE_COUNT + sq
+	return index * 2 + side
+
+# decodeIndex(): Reverses encodeIndex()
+def decodeIndex(index: int, piece_count: int) -> Tuple[List[int], int]:
+	index, side = divmod(index, 2)
+	squares = [0] * piece_count
+	for slot in range(piece_count - 1, -1, -1):
+		index, squares[slot] = divmod(index, SQUARE_COUNT)
+	return squares, side
+
+# tablePath(): Returns where a signature's table is stored
+def tablePath(directory: str, signature: str) -> str:
+	return os.path.join(directory, signature + FILE_EXTENSION)
+
+class Tablebases:
+	# __init__(): Constructor, memory-maps every table in the directory. Tables are probed straight from the mapping, never read into the heap.
+	def __init__(self, directory: str) -> None:
+		self.directory = directory
+		self.tables: Dict[str, Tuple[mmap.mmap, List[Tuple[int, int]]]] = {}
+		self.max_pieces: int = 0
+		self.hits: int = 0
+
+		if os.path.isdir(directory):
+			for filename in sorted(os.listdir(directory)):
+				if filename.endswith(FILE_EXTENSION):
+					self.open(os.path.join(directory, filename))
+
+	# open(): Maps a single table file
+	def open(self, path: str) -> None:
+		with open(path, "rb") as table_file:
+			mapping = mmap.mmap(table_file.fileno(), 0, access = mmap.ACCESS_READ)
+
+		magic, version, piece_count, signature, entries = HEADER.unpack_from(mapping, 0)
+		if magic != MAGIC or version != VERSION:
+			mapping.close()
+			raise ValueError(f"Not a version {VERSION} tablebase file: {path}")
+
+		signature = signature.rstrip(b"\0").decode("ascii")
+		pieces = signaturePieces(signature)
+		if len(pieces) != piece_count or entries != tableSize(piece_count):
+			mapping.close()
+			raise ValueError(f"Corrupt tablebase header: {path}")
+
+		self.tables[signature] = (mapping, [pieceCode(color, piece_type) for color, piece_type in pieces])
+		self.max_pieces = max(self.max_pieces, piece_count)
+
+	# close(): Unmaps every table
+	def close(self) -> None:
+		for mapping, _ in self.tables.values():
+			mapping.close()
+		self.tables.clear()
+
+	# probeIndex(): Returns the stored value at an index of a signature's table
+	def probeIndex(self, signature: str, index: int) -> int:
+		value = self.tables[signature][0][HEADER.size + index]
+		return value - 256 if value > MAX_DISTANCE else value
+
+	# probe(): Returns the value of a position for the side to move (+n win, -n loss, 0 draw), or None if no table covers it
+	def probe(self, position: Position) -> Optional[int]:
+		if position.occupied().bit_count() > self.max_pieces:
+			return None
+		signature = signatureOf(position)
+		table = self.tables.get(signature)
+		if table is None:
+			return None
+
+		# Identical pieces are looked up in whichever order the bitboards give; the generator solved every ordering
+		squares = []
+		bitboards = position.bitboards
+		taken: Dict[int, int] = {}
+		for code in table[1]:
+			bb = bitboards[code] >> taken.get(code, 0)
+			offset = taken.get(code, 0) + (bb & -bb).bit_length()
+			taken[code] = offset
+			squares.append(offset - 1)
+
+		self.hits += 1
+		value = table[0][HEADER.size + encodeIndex(squares, position.side)]
+		return value - 256 if value > MAX_DISTANCE else value
+
+# _reverseTargets(): Squares the piece on sq could have come from with a quiet move, given the current occupancy
+def _reverseTargets(code: int, sq: int, occupied: int) -> int:
+	empty = ~occupied & FULL_BOARD
+	piece_type = code & 7
+	if piece_type == KING:
+		return KING_ATTACKS[sq] & empty
+	if piece_type == KNIGHT:
+		return KNIGHT_ATTACKS[sq] & empty
+	if piece_type == ROOK:
+		return rookAttacks(sq, occupied) & empty
+	if piece_type == QUEEN:
+		return queenAttacks(sq, occupied) & empty
+
+	# Pawns only ever move forward, so they came from one square behind
+	origin = sq + 6 if code >> 3 == WHITE else sq - 6
+	if 0 <= origin < SQUARE_COUNT:
+		return (1 << origin) & empty
+	return 0
+
+# generateTable(): Solves one signature by retrograde analysis and writes its table; every smaller table must already exist
+def generateTable(signature: str, directory: str) -> Tuple[str, int, int, int, float]:
+	start = time.perf_counter()
+	pieces = signaturePieces(signature)
+	codes = [pieceCode(color, piece_type) for color, piece_type in pieces]
+	piece_count = len(pieces)
+	size = tableSize(piece_count)
+	subtables = Tablebases(directory)
+
+	UNKNOWN = -128
+	values = array('b', [UNKNOWN]) * size
+	counters = array('i', [0]) * size # Children inside this table that aren't known wins for the opponent yet
+	escapes = bytearray(size) # Set when a position has a move that doesn't lose, so it can never be a loss
+	longest = array('H', [0]) * size # Distance of the slowest loss found so far, for positions that may turn out lost
+	buckets: Dict[int, List[Tuple[int, int]]] = {}
+
+	# Forward pass; every legal position counts its quiet moves, and captures are looked up in the smaller tables
+	for squares in itertools.product(range(SQUARE_COUNT), repeat = piece_count):
+		if len(set(squares)) != piece_count:
+			continue # Two pieces on one square
+
+		for side in (WHITE, BLACK):
+			index = encodeIndex(squares, side)
+			position = Position()
+			for sq, (color, piece_type) in zip(squares, pieces):
+				position.putPiece(sq, color, piece_type)
+			position.setSide(side)
+
+			if position.attackedBy(side) & position.bitboards[pieceCode(side ^ 1, KING)]:
+				values[index] = DRAW # The side that just moved left its king attacked. Settled up front, so it's never reached from a legal position
+				continue
+
+			moves = position.generateMoves()
+			if not moves:
+				if position.inCheck():
+					buckets.setdefault(1, []).append((index, -1)) # Checkmated
+				else:
+					escapes[index] = 1 # Stalemate is a draw
+				continue
+
+			quiet = 0
+			quickest_win = 0
+			slowest_loss = 0
+			for from_sq, to_sq in moves:
+				captured = position.mailbox[to_sq]
+				if captured == EMPTY:
+					quiet += 1
+					continue
+
+				position.makeMove(from_sq, to_sq)
+				child = subtables.probe(position)
+				position.unmakeMove(from_sq, to_sq, captured)
+
+				if child < 0:
+					if not quickest_win or 1 - child < quickest_win:
+						quickest_win = 1 - child
+				elif child == DRAW:
+					escapes[index] = 1
+				else:
+					slowest_loss = max(slowest_loss, child + 1)
+
+			if quickest_win:
+				escapes[index] = 1
+				buckets.setdefault(quickest_win, []).append((index, 1))
+			counters[index] = quiet
+			longest[index] = slowest_loss
+			if quiet == 0 and not escapes[index]:
+				buckets.setdefault(max(slowest_loss, 1), []).append((index, -1)) # Every move is a capture into a lost ending
+
+	subtables.close()
+
+	# Backward pass; settle positions in order of distance and push the result to their predecessors by un-making quiet moves
+	distance = 1
+	while buckets:
+		pending = buckets.pop(distance, [])
+		for index, outcome in pending:
+			if values[index] != UNKNOWN:
+				continue
+			values[index] = min(distance, MAX_DISTANCE) * outcome
+
+			squares, side = decodeIndex(index, piece_count)
+			mover = side ^ 1 # The side that moved into this position
+			occupied = 0
+			for sq in squares:
+				occupied |= 1 << sq
+
+			for slot, code in enumerate(codes):
+				if code >> 3 != mover:
+					continue
+				origins = _reverseTargets(code, squares[slot], occupied)
+				while origins:
+					lowest = origins & -origins
+					origins ^= lowest
+					previous = squares[:]
+					previous[slot] = lowest.bit_length() - 1
+					predecessor = encodeIndex(previous, mover)
+					if values[predecessor] != UNKNOWN:
+						continue
+
+					if outcome < 0:
+						# The mover can reach a lost position for the opponent, so the predecessor is won
+						buckets.setdefault(distance + 1, []).append((predecessor, 1))
+					else:
+						counters[predecessor] -= 1
+						longest[predecessor] = max(longest[predecessor], distance + 1)
+						if counters[predecessor] == 0 and not escapes[predecessor]:
+							buckets.setdefault(longest[predecessor], []).append((predecessor, -1))
+		distance += 1
+
+	# Everything left unsettled (and every impossible placement) is a draw; illegal positions were stored as draws already
+	wins = losses = 0
+	for index in range(size):
+		value = values[index]
+		if value == UNKNOWN:
+			values[index] = DRAW
+		elif value > 0:
+			wins += 1
+		elif value < 0:
+			losses += 1
+
+	os.makedirs(directory, exist_ok = True)
+	temporary_path = tablePath(directory, signature) + ".tmp"
+	with open(temporary_path, "wb") as table_file:
+		table_file.write(HEADER.pack(MAGIC, VERSION, piece_count, signature.encode("ascii"), size))
+		values.tofile(table_file)
+	os.replace(temporary_path, tablePath(directory, signature))
+
+	return signature, size, wins, losses, time.perf_counter() - start
+
+# generateAll(): Generates every table up to max_pieces, each piece count in parallel once the smaller ones are done
+def generateAll(max_pieces: int, directory: str, workers: Optional[int] = None) -> None:
+	with ProcessPoolExecutor(workers) as pool:
+		for level in materialSignatures(max_pieces):
+			futures = [pool.submit(generateTable, signature, directory) for signature in level]
+			for future in futures:
+				signature, size, wins, losses, elapsed = future.result()
+				print(f"{signature}: {size} entries, {wins} wins, {losses} losses, {elapsed:.1f}s")
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description = "Los Alamos endgame tablebase generator")
+	parser.add_argument("--pieces", type = int, default = 3, help = "largest number of pieces, kings included")
+	parser.add_argument("--out", default = "tablebases", help = "directory to write the tables to")
+	parser.add_argument("--workers", type = int, default = os.cpu_count() or 1)
+	args = parser.parse_args()
+
+	generateAll(args.pieces, args.out, args.workers)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
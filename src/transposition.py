@@ -0,0 +1,95 @@
+# transposition.py: Defines a fixed-size transposition table, keyed by Zobrist hashes, that remembers search results.
+# Author: Julien Devol
+
+from typing import List, Optional, Tuple
+
+# Bound types of a stored score
+EXACT: int = 0
+LOWER_BOUND: int = 1 # The score is at least this (the search failed high)
+UPPER_BOUND: int = 2 # The score is at most this (the search failed low)
+
+NO_MOVE: int = 0xFFF
+
+# Each entry is a key and a packed data int in two parallel lists; roughly two list slots plus two int objects
+ENTRY_BYTES: int = 88
+
+SCORE_OFFSET: int = 1 << 20 # Scores are stored shifted so they're never negative
+SCORE_BITS: int = 21
+DEPTH_BITS: int = 7
+FLAG_BITS: int = 2
+SCORE_MASK: int = (1 << SCORE_BITS) - 1
+DEPTH_MASK: int = (1 << DEPTH_BITS) - 1
+FLAG_MASK: int = (1 << FLAG_BITS) - 1
+DEPTH_SHIFT: int = SCORE_BITS
+FLAG_SHIFT: int = DEPTH_SHIFT + DEPTH_BITS
+MOVE_SHIFT: int = FLAG_SHIFT + FLAG_BITS
+
+class TranspositionTable:
+	# __init__(): Constructor, sizes the table to fit in the given number of megabytes.
+	# Every bucket has two slots; one keeps the deepest result seen, the other always takes the newest.
+	# Keys are stored xor'd with their data, so when searches on several threads share a table, an entry torn by two stores fails its key check.
+	def __init__(self, megabytes: float = 16) -> None:
+		entries = max(2, int(megabytes * 1024 * 1024) // ENTRY_BYTES)
+		self.bucket_count: int = entries // 2
+		self.keys: List[int] = [0] * (self.bucket_count * 2)
+		self.data: List[int] = [0] * (self.bucket_count * 2)
+		self.hits: int = 0
+		self.misses: int = 0
+		self.stores: int = 0
+
+	# clear(): Forgets every stored entry and resets the counters
+	def clear(self) -> None:
+		self.keys = [0] * (self.bucket_count * 2)
+		self.data = [0] * (self.bucket_count * 2)
+		self.hits = 0
+		self.misses = 0
+		self.stores = 0
+
+	# probe(): Looks up a position, returns (depth, flag, score, move) or None. Moves are packed with packMove().
+	def probe(self, key: int) -> Optional[Tuple[int, int, int, int]]:
+		slot = (key % self.bucket_count) << 1
+		keys = self.keys
+		data = self.data
+		if keys[slot] ^ data[slot] == key:
+			packed = data[slot]
+		elif keys[slot + 1] ^ data[slot + 1] == key:
+			packed = data[slot + 1]
+		else:
+			self.misses += 1
+			return None
+
+		self.hits += 1
+		return ((packed >> DEPTH_SHIFT) & DEPTH_MASK, (packed >> FLAG_SHIFT) & FLAG_MASK, (packed & SCORE_MASK) - SCORE_OFFSET, packed >> MOVE_SHIFT)
+
+	# store(): Saves a search result; it replaces the depth-preferred slot if it's at least as deep, otherwise the always-replace slot
+	def store(self, key: int, depth: int, flag: int, score: int, move: int = NO_MOVE) -> None:
+		slot = (key % self.bucket_count) << 1
+		packed = (score + SCORE_OFFSET) | (min(depth, DEPTH_MASK) << DEPTH_SHIFT) | (flag << FLAG_SHIFT) | (move << MOVE_SHIFT)
+		keys = self.keys
+		data = self.data
+		self.stores += 1
+
+		stored_key = keys[slot] ^ data[slot]
+		if stored_key == key or depth >= (data[slot] >> DEPTH_SHIFT) & DEPTH_MASK:
+			# Keep a displaced, different position around in the always-replace slot
+			if stored_key != key and data[slot] != 0:
+				keys[slot + 1] = keys[slot]
+				data[slot + 1] = data[slot]
+			keys[slot] = key ^ packed
+			data[slot] = packed
+		else:
+			keys[slot + 1] = key ^ packed
+			data[slot + 1] = packed
+
+	# hitRate(): Fraction of probes that found their position
+	def hitRate(self) -> float:
+		probes = self.hits + self.misses
+		return self.hits / probes if probes else 0
+
+	# usage(): Fraction of slots that are filled
+	def usage(self) -> float:
+		return sum(1 for packed in self.data if packed != 0) / len(self.data)
+
+	# memoryBytes(): The approximate memory budget the table was sized to
+	def memoryBytes(self) -> int:
+		return len(self.keys) * ENTRY_BYTES
@@ -0,0 +1,198 @@
+# worker.py: Runs the computer opponent in a background process that the frame loop polls, so the window never waits on a search.
+# A search can be cancelled at any time, and while the human thinks the worker ponders on the reply it expects.
+# Usage: py -m src.worker [frames] [--think SECONDS] compares frame times with the engine searching in the frame loop and in the worker.
+# Author: Julien Devol
+
+import argparse
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+from typing import Optional, Tuple
+from src.position import Position
+from src.engine import Engine, SearchResult
+from src.frametimes import FrameHistogram
+
+# Kinds of job the worker runs
+SEARCH: str = "search" # Find a move to play
+PONDER: str = "ponder" # Search the position the human is expected to leave, only to fill the transposition table
+PONDER_TIME_LIMIT: float = 60 # Seconds a ponder search runs at most, so a human who walks away doesn't keep every core busy
+
+# _workerMain(): Runs in the worker process; searches every job it's sent until it receives None.
+# Jobs with an id at or below cancelled are skipped, or stop at their next clock check if they're already running.
+def _workerMain(jobs, results, cancelled, workers: int, tt_megabytes: float,
+				tablebase_directory: Optional[str], book_path: Optional[str]) -> None:
+	signal.signal(signal.SIGTERM, signal.SIG_DFL) # Forked from the game, the worker inherits PyGame's SIGTERM handler, which would make terminate() a no-op
+	from src.tablebase import Tablebases
+	from src.book import OpeningBook
+	tablebases = Tablebases(tablebase_directory) if tablebase_directory is not None else None
+	book = OpeningBook(book_path) if book_path is not None else None
+	if workers > 1:
+		from src.parallel import ParallelEngine
+		engine = ParallelEngine(workers, tt_megabytes, tablebases, book, cancelled)
+	else:
+		engine = Engine(tt_megabytes, tablebases, book)
+
+	job_id = 0
+	engine.stop_check = lambda: job_id <= cancelled.value
+	while True:
+		job = jobs.get()
+		if job is None:
+			break
+		job_id, kind, packed, time_limit = job
+		if job_id <= cancelled.value:
+			continue
+
+		if workers > 1:
+			engine.search_id = job_id # Lets the pool workers stop mid-depth when this job is cancelled
+		position = Position.unpack(packed)
+		result = engine.search(position, time_limit)
+		reply = None
+		if kind == SEARCH and result.best_move is not None:
+			reply = engine.expectedReply(position, result.best_move)
+		results.put((job_id, kind, result, reply))
+
+	if workers > 1:
+		engine.close()
+
+class EngineWorker:
+	# __init__(): Constructor, starts the worker process. Its engine, and so its transposition table, lives as long as the worker.
+	# More than one search worker makes the background process run a ParallelEngine pool of its own.
+	def __init__(self, workers: int = 1, tt_megabytes: float = 16, tablebase_directory: Optional[str] = None, book_path: Optional[str] = None) -> None:
+		self.jobs = multiprocessing.Queue()
+		self.results = multiprocessing.Queue()
+		self.cancelled = multiprocessing.Value('i', 0, lock = False) # Highest job id that has been cancelled
+		self.process = multiprocessing.Process(target = _workerMain, name = "engine-worker",
+											   args = (self.jobs, self.results, self.cancelled, workers, tt_megabytes, tablebase_directory, book_path),
+											   daemon = workers <= 1) # A daemon process dies with the window, but it can't start a pool of its own
+		self.process.start()
+
+		self.last_id: int = 0
+		self.current_id: Optional[int] = None # The job whose result is still wanted
+		self.current_kind: Optional[str] = None
+		self.pondered_key: Optional[int] = None # Zobrist key of the position pondered on, until the human moves
+		self.ponder_hits: int = 0
+		self.ponder_misses: int = 0
+
+	# thinking: Whether a search for a move is running
+	@property
+	def thinking(self) -> bool:
+		return self.current_kind == SEARCH
+
+	# pondering: Whether the worker is pondering on the human's expected move
+	@property
+	def pondering(self) -> bool:
+		return self.current_kind == PONDER
+
+	# submit(): Cancels whatever the worker is doing and queues a new job for the position
+	def submit(self, kind: str, position: Position, time_limit: Optional[float]) -> None:
+		self.cancel()
+		self.last_id += 1
+		self.jobs.put((self.last_id, kind, position.pack(), time_limit))
+		self.current_id = self.last_id
+		self.current_kind = kind
+
+	# search(): Starts searching the position for a move; poll() returns the result once it's done.
+	# If the human played the expected move, the search starts from the transposition table the ponder search filled.
+	def search(self, position: Position, time_limit: Optional[float] = None) -> None:
+		if self.pondered_key is not None:
+			if self.pondered_key == position.key:
+				self.ponder_hits += 1
+			else:
+				self.ponder_misses += 1
+			self.pondered_key = None
+		self.submit(SEARCH, position, time_limit)
+
+	# ponder(): Searches the position the human is expected to leave the computer until cancelled, for at most PONDER_TIME_LIMIT seconds
+	def ponder(self, position: Position) -> None:
+		self.submit(PONDER, position, PONDER_TIME_LIMIT)
+		self.pondered_key = position.key
+
+	# cancel(): Stops the running job at its next clock check and drops its result
+	def cancel(self) -> None:
+		self.cancelled.value = self.last_id
+		self.current_id = None
+		self.current_kind = None
+
+	# poll(): Returns the (result, expected reply) of the current search once it's done, without waiting; None until then.
+	# Results of cancelled jobs are thrown away here.
+	def poll(self) -> Optional[Tuple[SearchResult, Optional[Tuple[int, int]]]]:
+		while True:
+			try:
+				job_id, kind, result, reply = self.results.get_nowait()
+			except queue.Empty:
+				return None
+
+			if job_id == self.current_id:
+				self.current_id = None
+				self.current_kind = None
+				if kind == SEARCH:
+					return result, reply
+
+	# close(): Cancels any job and stops the worker process
+	def close(self) -> None:
+		self.cancel()
+		self.jobs.put(None)
+		self.process.join(timeout = 2)
+		if self.process.is_alive():
+			self.process.terminate()
+
+# compareFrameTimes(): Draws frames at 60 FPS while the engine searches, first in the frame loop as main.py used to and then in the worker,
+# and prints a frame time histogram for each
+def compareFrameTimes(frames: int = 300, think: float = 1.0, width: int = 1280, height: int = 720) -> None:
+	import pygame
+	from src.camera import Camera
+	from src.game import Board
+
+	pygame.init()
+	screen = pygame.display.set_mode((width, height))
+	camera = Camera(screen)
+	board = Board(screen, camera)
+	clock = pygame.time.Clock()
+	position = Position.initial()
+	search_every = 90 # Frames between searches, about the pace of a quick human
+
+	in_loop = FrameHistogram("search in the frame loop")
+	engine = Engine()
+	clock.tick()
+	for frame in range(frames):
+		if frame % search_every == search_every - 1:
+			engine.search(position, time_limit = think)
+		screen.fill((0, 0, 0))
+		board.draw(camera)
+		pygame.display.flip()
+		in_loop.add(clock.tick(60))
+
+	in_worker = FrameHistogram("search in the worker")
+	worker = EngineWorker()
+	searches = 0
+	clock.tick()
+	for frame in range(frames):
+		if frame % search_every == search_every - 1 and not worker.thinking:
+			worker.search(position, time_limit = think)
+		if worker.poll() is not None:
+			searches += 1
+		screen.fill((0, 0, 0))
+		board.draw(camera)
+		pygame.display.flip()
+		in_worker.add(clock.tick(60))
+	worker.close()
+	pygame.quit()
+
+	print(in_loop.report())
+	print(in_worker.report())
+	print(f"{searches} worker searches finished, {think:g} s each, on {os.cpu_count()} CPU cores")
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description = "Los Alamos engine worker frame time comparison")
+	parser.add_argument("frames", type = int, nargs = "?", default = 300)
+	parser.add_argument("--think", type = float, default = 1.0, help = "seconds every search may take")
+	args = parser.parse_args()
+
+	compareFrameTimes(args.frames, args.think)
+	return 0
+
+if __name__ == "__main__":
+	os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # Doesn't need a window to benchmark
+	sys.exit(main())